@@ -0,0 +1 @@
+"""Shared building blocks used by the order support and health wellness agents."""
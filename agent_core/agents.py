@@ -0,0 +1,344 @@
+"""The triage -> retrieval -> context -> response agents, built for any configured domain.
+
+:class:`Domain` turns a :class:`agent_core.domains.DomainConfig` into the
+agents and pipeline on the process-wide clients: every domain in the process
+shares one HTTP pool, one embedding cache and one LLM client, and has its own
+index handle, keyword rules and response cache.
+
+Importing this module is cheap and has no side effects: LangChain and the
+OpenAI/Pinecone clients are imported when a :class:`Domain` is first built, and
+the process setup (``.env``, logging, the httpx header patch) happens once, in
+:func:`initialize`, at the same point.
+"""
+import asyncio
+import functools
+import os
+import platform
+import sys
+
+from agent_core.clients import get_embeddings, get_lexical_index, get_llm, get_vector_backend, get_vectorstore
+from agent_core.context import ContextAssembler, load_encoding
+from agent_core.pipeline import Pipeline, Step
+from agent_core.response_cache import CachedPipeline, ResponseCache, extract_order_number, identifier_key
+from agent_core.lexical import identifiers
+from agent_core.retrieval import (LEXICAL_SEARCHES, expand_chunks, fuse_results, lexical_documents,
+                                  scored_documents, search_with_fallback)
+from agent_core.sanitize import install_httpx_header_patch
+from agent_core.streaming import stream_run
+from agent_core.sync import read_corpus_version
+from agent_core.telemetry import configure_logging, current_span
+from agent_core.triage import Classification, RuleClassifier, parse_labels
+
+# Per-step timeouts (seconds)
+TRIAGE_TIMEOUT = float(os.environ.get("TRIAGE_TIMEOUT", "15"))
+RETRIEVAL_TIMEOUT = float(os.environ.get("RETRIEVAL_TIMEOUT", "15"))
+RESPONSE_TIMEOUT = float(os.environ.get("RESPONSE_TIMEOUT", "60"))
+
+# Response cache settings (a TTL of 0 disables the cache)
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "600"))
+RESPONSE_CACHE_THRESHOLD = float(os.environ.get("RESPONSE_CACHE_THRESHOLD", "0.95"))
+
+# Named query -> key functions a config can refer to
+PARTITION_FUNCTIONS = {"identifiers": identifier_key, "order_number": extract_order_number}
+
+
+@functools.lru_cache(maxsize=None)
+def initialize():
+    """One-time process setup before the first domain is built (idempotent)."""
+    from dotenv import load_dotenv
+
+    # Load environment variables (a domain's own .env is loaded before it is built)
+    load_dotenv()
+
+    # Leveled logging (LOG_LEVEL, LOG_FORMAT); traces are logged at DEBUG
+    configure_logging()
+
+    # Monkey-patch httpx to handle encoding issues in headers
+    install_httpx_header_patch()
+
+
+def preload_modules():
+    """Import the libraries a domain build needs and load the tokenizer, without creating any client.
+
+    Blocking; the server runs it in a background thread.
+    """
+    import langchain_core.output_parsers  # noqa: F401
+    import langchain_core.prompts  # noqa: F401
+    import langchain_openai  # noqa: F401
+
+    if get_vector_backend() == "local":
+        import agent_core.local_index  # noqa: F401
+    else:
+        import langchain_pinecone  # noqa: F401
+    # tiktoken may download the context encoding on first use
+    load_encoding()
+
+
+class TriageAgent:
+    def __init__(self, llm, labels, prompt, rules=None, default_label=None, max_candidates=2):
+        self.llm = llm
+        self.labels = tuple(labels)
+        self.rules = rules
+        self.default_label = default_label or self.labels[0]
+        self.max_candidates = max_candidates
+        from langchain_core.output_parsers import StrOutputParser
+
+        # Compiled once; each call only fills in the template
+        self.chain = prompt | llm | StrOutputParser()
+
+    async def classify(self, query):
+        """Return a :class:`Classification` whose ``candidates`` drive the retrieval filter."""
+        # Confident keyword matches skip the LLM round trip; ambiguous queries escalate
+        plausible = []
+        if self.rules is not None:
+            match = self.rules.classify(query)
+            if match is not None:
+                current_span().set(method="rules", confidence=match[1])
+                return Classification(match[0], match[1])
+            plausible = self.rules.plausible(query)
+        current_span().set(method="llm")
+        # Only an exact label counts; anything else leaves the category unknown
+        labels = parse_labels(await self.chain.ainvoke({"query": query}), self.labels)
+        if not labels:
+            current_span().set(unparsed=True)
+            return Classification(plausible[0] if plausible else self.default_label, 0.0,
+                                  plausible[:self.max_candidates])
+        candidates = list(dict.fromkeys(labels + plausible))[:self.max_candidates]
+        return Classification(labels[0], round(1 / len(labels), 3), candidates)
+
+
+class RetrievalAgent:
+    def __init__(self, vectorstore, filter_field, rules=None, lookup=None, max_categories=2, category_wait=0.0,
+                 lexical=None, chunk_retrieval="neighbors", chunk_neighbors=1):
+        self.vectorstore = vectorstore
+        self.lexical = lexical
+        self.chunk_retrieval = chunk_retrieval
+        self.chunk_neighbors = chunk_neighbors
+        self.filter_field = filter_field
+        self.rules = rules
+        self.lookup = lookup
+        self.max_categories = max_categories
+        self.category_wait = category_wait
+
+    async def _categories(self, query, triage_result):
+        """Labels to filter on: a confident keyword match, else the triage candidates, else the keyword guesses."""
+        match = self.rules.classify(query) if self.rules is not None else None
+        if match is not None:
+            return [match[0]]
+        if triage_result is not None:
+            try:
+                category = await asyncio.wait_for(triage_result(), self.category_wait)
+            except asyncio.TimeoutError:
+                current_span().set(category_wait_timeout=True)
+            else:
+                # A failed triage resolves to a plain "unknown" label, which has no candidates
+                return list(getattr(category, "candidates", ()))
+        return self.rules.plausible(query)[:self.max_categories] if self.rules is not None else []
+
+    async def retrieve(self, query, triage_result=None):
+        """``triage_result`` returns an awaitable for the triage result; embedding runs while it resolves."""
+        documents = await self._search(query, triage_result)
+        # Chunks of long records come back as their parent record or merged with the neighbouring chunks
+        expanded = await expand_chunks(self.vectorstore, documents, self.chunk_retrieval, self.chunk_neighbors)
+        if expanded is not documents:
+            current_span().set(chunk_hits=sum(1 for doc in documents if "parent_id" in doc.metadata),
+                               results=len(expanded))
+        return expanded
+
+    async def _search(self, query, triage_result):
+        # Questions about a known order number are answered from the exact lookup index
+        if self.lookup is not None:
+            records = await self.lookup.find(query)
+            if records:
+                from langchain_core.documents import Document
+
+                current_span().set(source="lookup", results=len(records))
+                return [Document(page_content=r["text"], metadata=r["metadata"]) for r in records]
+        if self.lexical is not None:
+            await asyncio.to_thread(self.lexical.refresh)
+            # A tracking code or order number names its documents outright: no embedding needed
+            terms = identifiers(query)
+            hits = self.lexical.exact(terms, top_k=5, query=query) if terms else []
+            if hits:
+                LEXICAL_SEARCHES.inc(mode="exact")
+                current_span().set(source="lexical_exact", results=len(hits))
+                return lexical_documents(hits)
+        # Embed once; the vector is reused by the fallback search
+        embedded_query = await self.vectorstore._embedding.aembed_query(query)
+        categories = await self._categories(query, triage_result)
+        current_span().set(categories=categories)
+        # Every plausible label goes into one $in filter; an unknown category searches everything
+        filter = {self.filter_field: {"$in": categories}} if categories else None
+        if self.lexical is None:
+            return scored_documents(await search_with_fallback(self.vectorstore, embedded_query, k=5, filter=filter))
+        # Vector and BM25 searches run concurrently, then their rankings are fused
+        vector_results, lexical_results = await asyncio.gather(
+            search_with_fallback(self.vectorstore, embedded_query, k=5, filter=filter),
+            asyncio.to_thread(self.lexical.search, query, 5, filter),
+        )
+        LEXICAL_SEARCHES.inc(mode="hybrid")
+        current_span().set(lexical_results=len(lexical_results))
+        return fuse_results(vector_results, lexical_results, limit=5)
+
+
+class ResponseAgent:
+    def __init__(self, llm, prompt):
+        self.llm = llm
+        from langchain_core.output_parsers import StrOutputParser
+
+        # Compiled once; each call only fills in the template
+        self.chain = prompt | llm | StrOutputParser()
+
+    def _inputs(self, query, context):
+        context_text = "\n".join([doc.page_content for doc in context])
+        return {"query": query, "context": context_text or "No specific data available"}
+
+    async def generate(self, query, context, on_token=None):
+        """Return the full response; ``on_token`` (if given) is called with each streamed token."""
+        if on_token is None:
+            return await self.chain.ainvoke(self._inputs(query, context))
+        parts = []
+        async for token in self.stream(query, context):
+            on_token(token)
+            parts.append(token)
+        return "".join(parts)
+
+    async def stream(self, query, context):
+        """Yield response tokens as the LLM produces them."""
+        async for token in self.chain.astream(self._inputs(query, context)):
+            if token:
+                yield token
+
+
+def build_pipeline(triage_agent, retrieval_agent, response_agent, context_assembler, name="pipeline", reraise=None):
+    """Triage and retrieval run concurrently; the response waits on the assembled context only.
+
+    ``reraise`` is passed to :class:`agent_core.pipeline.Pipeline`.
+    """
+
+    def retrieve(run):
+        # Retrieval embeds the query while triage runs, then (if the domain allows it) waits on its categories
+        triage_result = (lambda: run.result("triage")) if retrieval_agent.category_wait > 0 else None
+        return retrieval_agent.retrieve(run.inputs["query"], triage_result)
+
+    return Pipeline([
+        # A slow or failed triage resolves to "unknown", which retrieval treats as "search every category"
+        Step("triage", lambda run: triage_agent.classify(run.inputs["query"]),
+             timeout=TRIAGE_TIMEOUT, optional=True, default="unknown"),
+        Step("retrieve", retrieve, timeout=RETRIEVAL_TIMEOUT),
+        # Score threshold, dedup and token budget over the retrieved documents
+        Step("context", lambda run: context_assembler.assemble(run.results["retrieve"]), after=["retrieve"]),
+        Step("respond",
+             lambda run: response_agent.generate(
+                 run.inputs["query"], run.results["context"], on_token=run.inputs.get("on_token")),
+             after=["context"], timeout=RESPONSE_TIMEOUT),
+    ], name=name, reraise=reraise)
+
+
+class Domain:
+    """A configured domain's shared components; :meth:`create_pipeline` wires them together."""
+
+    def __init__(self, config):
+        from langchain_core.prompts import ChatPromptTemplate
+
+        initialize()
+        self.config = config
+        self.name = config.name
+        self.index_name = config.index_name
+        # Initialize components (shared with any other domain loaded into the same process)
+        self.embeddings = get_embeddings()
+        self.vectorstore = get_vectorstore(config.index_name)
+        self.llm = get_llm()
+        self.rules = RuleClassifier(config.triage_rules) if config.triage_rules else None
+        # BM25 index over the same documents, kept current by the ingester
+        self.lexical = get_lexical_index(config.index_name) if config.hybrid else None
+        self.lookup = None
+        if config.lookup == "order_number":
+            from agent_core.lookup import OrderLookup
+
+            # Exact order-number index built from the same CSV the ingester reads
+            self.lookup = OrderLookup(config.data_path)
+        elif config.lookup is not None:
+            raise ValueError(f"Domain {config.name!r}: unknown lookup {config.lookup!r}")
+        # Prompts are parsed once per domain rather than on every call
+        self.triage_prompt = ChatPromptTemplate.from_template(config.triage_prompt)
+        self.response_prompt = ChatPromptTemplate.from_template(config.response_prompt)
+
+    def create_pipeline(self, reraise=None):
+        """Pipeline over this domain's shared components; used by main(), the server and the batch runner.
+
+        The batch runner passes ``reraise=is_retryable`` so rate limits and server
+        errors in the optional triage step reach its retry loop and rate limiter.
+        """
+        config = self.config
+        pipeline = build_pipeline(
+            TriageAgent(self.llm, config.labels, self.triage_prompt, rules=self.rules,
+                        default_label=config.default_label, max_candidates=config.max_filter_categories),
+            RetrievalAgent(self.vectorstore, config.filter_field, rules=self.rules, lookup=self.lookup,
+                           max_categories=config.max_filter_categories, category_wait=config.category_wait,
+                           lexical=self.lexical, chunk_retrieval=config.chunk_retrieval,
+                           chunk_neighbors=config.chunk_neighbors),
+            ResponseAgent(self.llm, self.response_prompt),
+            ContextAssembler(),
+            name=config.name,
+            reraise=reraise,
+        )
+        if RESPONSE_CACHE_TTL <= 0:
+            return pipeline
+        cache = ResponseCache(
+            self.embeddings.aembed_query,
+            threshold=RESPONSE_CACHE_THRESHOLD,
+            ttl=RESPONSE_CACHE_TTL,
+            # e.g. the order number is part of the key so "#1234" never answers "#1235"
+            partition_fn=PARTITION_FUNCTIONS.get(config.cache_partition),
+            # Cached answers are dropped once the ingester changes the index
+            version_fn=lambda: read_corpus_version(config.index_name),
+        )
+        return CachedPipeline(pipeline, cache)
+
+
+async def run_query(domain, query, stream=False):
+    """Answer one query with ``domain`` and print the result (the agent scripts' entry point)."""
+    pipeline = domain.create_pipeline()
+
+    if stream:
+        # Print tokens as they arrive instead of waiting for the full completion
+        print("Response: ", end="", flush=True)
+        async for event in stream_run(pipeline, query=query):
+            if event[0] == "token":
+                print(event[1], end="", flush=True)
+            else:
+                _, run, metrics = event
+        print()
+        print(f"Category: {run.results['triage']}")
+        print(f"Timings: {run.timings}")
+        print(f"Time to first token: {metrics['ttft_ms']} ms, total: {metrics['total_ms']} ms")
+        return
+
+    run = await pipeline.run(query=query)
+
+    print(f"Category: {run.results['triage']}")
+    print(f"Context: {run.results['context']}")
+    print(f"Response: {run.results['respond']}")
+    print(f"Timings: {run.timings}")
+
+
+def main(config_path, argv=None):
+    """Run a domain's example query (or the query given on the command line); ``--stream`` streams tokens."""
+    from dotenv import load_dotenv
+
+    from agent_core.domains import DomainConfig
+
+    argv = sys.argv[1:] if argv is None else argv
+    config = DomainConfig.from_file(config_path)
+    load_dotenv(os.path.join(config.base_dir, ".env"))
+    domain = Domain(config)
+    words = [arg for arg in argv if not arg.startswith("--")]
+    query = " ".join(words) or domain.config.example_query
+    if not query:
+        raise SystemExit(f"No query given and {config_path} has no example_query")
+    coroutine = run_query(domain, query, stream="--stream" in argv)
+    if platform.system() == "Emscripten":
+        asyncio.ensure_future(coroutine)
+    else:
+        asyncio.run(coroutine)
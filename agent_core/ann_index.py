@@ -0,0 +1,358 @@
+"""Approximate nearest-neighbour engine for the local backend: IVF lists over compressed vectors.
+
+A brute-force scan reads every 6 KB float32 vector on every query, which does
+not scale to millions of records. :class:`IVFVectorIndex` keeps the same files,
+API and filter semantics as :class:`~agent_core.local_index.LocalVectorIndex`
+and adds an index on top:
+
+- k-means splits the vectors into ``nlist`` inverted lists (``ANN_NLIST``,
+  default ``4 * sqrt(rows)``); a query only scans the ``nprobe`` lists whose
+  centroids are closest (``ANN_NPROBE``, default ``16``).
+- The scan reads compressed codes instead of the vectors: each vector's
+  residual from its list's centroid, in ``int8`` scalar quantization (one
+  byte per dimension, 4x smaller) or ``pq`` product quantization
+  (``ANN_PQ_SUBVECTORS`` bytes per vector, default ``96``, 64x smaller for
+  1536 dimensions), chosen with ``ANN_QUANTIZATION``.
+- The ``rerank`` best candidates by approximate score (``ANN_RERANK``, default
+  ``100``) are re-scored exactly against the float32 vectors, so returned
+  scores are true cosine similarities and only those rows are read from disk.
+  PQ codes rank candidates coarsely enough that this window, not ``nprobe``,
+  bounds recall (see ``benchmarks/bench_ann.py``); int8 is limited by ``nprobe``.
+- Metadata filters are applied to the candidates before scoring (the same
+  cached ``type``/``category`` masks as the exact index). A filter matching
+  few rows (``ANN_EXACT_ROWS``, default ``2000``) is answered by an exact scan
+  of just those rows, and a filtered search probes further lists until it has
+  enough candidates.
+
+Training happens when the index is saved with at least ``ANN_MIN_ROWS`` rows
+(default ``20000``), and again once it has grown ``ANN_RETRAIN_GROWTH`` times
+(default ``4``) past its training size; between retrains new and changed rows
+are encoded with the existing centroids and codebooks. Until then every query
+is exact. Besides ``vectors.npy`` and ``records.json`` the index directory
+holds ``codes.npy`` and ``lists.npy`` (both memory-mapped on load) and
+``ann.npz`` (centroids and codebooks), written last so readers never pair new
+codes with old records; an ``ann.npz`` older than ``records.json`` (e.g. after
+the exact engine wrote the index) is ignored until the next save.
+"""
+import os
+
+import numpy as np
+
+from agent_core.local_index import DEFAULT_FILTER_FIELDS, LocalVectorIndex, _locked
+
+ANN_NLIST = int(os.environ.get("ANN_NLIST", "0"))
+ANN_NPROBE = int(os.environ.get("ANN_NPROBE", "16"))
+ANN_QUANTIZATION = os.environ.get("ANN_QUANTIZATION", "int8").lower()
+ANN_PQ_SUBVECTORS = int(os.environ.get("ANN_PQ_SUBVECTORS", "96"))
+ANN_RERANK = int(os.environ.get("ANN_RERANK", "100"))
+ANN_EXACT_ROWS = int(os.environ.get("ANN_EXACT_ROWS", "2000"))
+ANN_MIN_ROWS = int(os.environ.get("ANN_MIN_ROWS", "20000"))
+ANN_RETRAIN_GROWTH = float(os.environ.get("ANN_RETRAIN_GROWTH", "4"))
+ANN_TRAIN_SAMPLE = int(os.environ.get("ANN_TRAIN_SAMPLE", "50000"))
+
+# Rows per block when encoding or scoring, to bound temporary float32 copies
+_BLOCK = 16384
+
+
+def _assign(data, centroids, block=_BLOCK):
+    """Index of the nearest (Euclidean) centroid for each row of ``data``."""
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), block):
+        chunk = np.asarray(data[start:start + block], dtype=np.float32)
+        out[start:start + len(chunk)] = np.argmax(chunk @ centroids.T - half_norms, axis=1)
+    return out
+
+
+def _kmeans(data, k, iterations=10, seed=0):
+    """Lloyd's k-means; empty clusters keep their previous centroid."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assignments = _assign(data, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        present = np.flatnonzero(counts)
+        starts = (np.cumsum(counts) - counts)[present]
+        sums = np.add.reduceat(data[np.argsort(assignments, kind="stable")], starts, axis=0)
+        centroids[present] = sums / counts[present, None]
+    return centroids
+
+
+class ScalarQuantizer:
+    """One signed byte per dimension, scaled by the dimension's largest magnitude in the training sample."""
+
+    name = "int8"
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.code_size = len(scale)
+
+    @classmethod
+    def train(cls, sample):
+        scale = np.abs(sample).max(axis=0) / 127
+        scale[scale == 0] = 1.0
+        return cls(scale.astype(np.float32))
+
+    def encode(self, vectors):
+        return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+
+    def prepare(self, query):
+        return query * self.scale
+
+    def scores(self, codes, prepared):
+        return codes.astype(np.float32) @ prepared
+
+    def arrays(self):
+        return {"scale": self.scale}
+
+
+class ProductQuantizer:
+    """``subvectors`` bytes per vector: each slice of the vector is replaced by the nearest of 256 centroids."""
+
+    name = "pq"
+
+    def __init__(self, codebooks):
+        self.codebooks = codebooks
+        self.code_size = len(codebooks)
+        self._offsets = np.arange(self.code_size) * codebooks.shape[1]
+
+    @classmethod
+    def train(cls, sample, subvectors):
+        if sample.shape[1] % subvectors:
+            raise ValueError(f"ANN_PQ_SUBVECTORS ({subvectors}) must divide the dimension ({sample.shape[1]})")
+        k = min(256, len(sample))
+        return cls(np.stack([_kmeans(part, k) for part in np.split(sample, subvectors, axis=1)]))
+
+    def encode(self, vectors):
+        parts = np.split(np.asarray(vectors, dtype=np.float32), self.code_size, axis=1)
+        return np.stack([_assign(part, codebook) for part, codebook in zip(parts, self.codebooks)],
+                        axis=1).astype(np.uint8)
+
+    def prepare(self, query):
+        # Score of every sub-centroid against its slice of the query, flattened for one gather per code
+        return np.einsum("mkd,md->mk", self.codebooks, query.reshape(self.code_size, -1)).ravel()
+
+    def scores(self, codes, prepared):
+        return prepared[codes + self._offsets].sum(axis=1)
+
+    def arrays(self):
+        return {"codebooks": self.codebooks}
+
+
+QUANTIZERS = {ScalarQuantizer.name: ScalarQuantizer, ProductQuantizer.name: ProductQuantizer}
+
+
+class IVFVectorIndex(LocalVectorIndex):
+    """:class:`LocalVectorIndex` searched through IVF lists and quantized codes; see the module docstring."""
+
+    def __init__(self, path, dimension=1536, filter_fields=DEFAULT_FILTER_FIELDS, nlist=ANN_NLIST,
+                 nprobe=ANN_NPROBE, quantization=ANN_QUANTIZATION, pq_subvectors=ANN_PQ_SUBVECTORS,
+                 rerank=ANN_RERANK, exact_rows=ANN_EXACT_ROWS, min_rows=ANN_MIN_ROWS):
+        if quantization not in QUANTIZERS:
+            raise ValueError(f"Unknown ANN quantization {quantization!r}; expected one of {sorted(QUANTIZERS)}")
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.quantization = quantization
+        self.pq_subvectors = pq_subvectors
+        self.rerank = rerank
+        self.exact_rows = exact_rows
+        self.min_rows = min_rows
+        self._codes_path = os.path.join(path, "codes.npy")
+        self._lists_path = os.path.join(path, "lists.npy")
+        self._ann_path = os.path.join(path, "ann.npz")
+        super().__init__(path, dimension, filter_fields)
+
+    def _reset(self):
+        super()._reset()
+        self.centroids = None
+        self.quantizer = None
+        self.codes = None
+        self.assignments = None
+        self.trained_rows = 0
+        self._ann_mtime = None
+        self._lists = None
+
+    @property
+    def trained(self):
+        return self.quantizer is not None
+
+    @_locked
+    def refresh(self):
+        loaded = self._loaded_mtime
+        super().refresh()
+        try:
+            ann_mtime = os.stat(self._ann_path).st_mtime
+        except OSError:
+            return
+        if self._loaded_mtime != loaded or ann_mtime != self._ann_mtime:
+            self._load_ann(ann_mtime)
+
+    def _load_ann(self, ann_mtime):
+        self._ann_mtime = ann_mtime
+        self.centroids = self.quantizer = self.codes = self.assignments = None
+        self._lists = None
+        if self._loaded_mtime is None or ann_mtime < self._loaded_mtime:
+            return  # Written for an older version of the records: search exactly until the next save
+        with np.load(self._ann_path) as ann:
+            name = str(ann["quantization"])
+            quantizer = (ScalarQuantizer(ann["scale"]) if name == ScalarQuantizer.name
+                         else ProductQuantizer(ann["codebooks"]))
+            centroids = ann["centroids"]
+            trained_rows = int(ann["trained_rows"])
+        codes = np.load(self._codes_path, mmap_mode="r")
+        assignments = np.load(self._lists_path, mmap_mode="r")
+        if len(codes) != len(self.ids) or len(assignments) != len(self.ids):
+            return
+        self.centroids, self.quantizer, self.trained_rows = centroids, quantizer, trained_rows
+        self.codes, self.assignments = codes, assignments
+
+    @_locked
+    def save(self):
+        self._flush_pending()
+        if len(self.ids) >= self.min_rows and (
+                not self.trained or len(self.ids) > ANN_RETRAIN_GROWTH * self.trained_rows):
+            self.train()
+        super().save()
+        if not self.trained:
+            return
+        tmp_codes = os.path.join(self.path, "codes.tmp.npy")
+        np.save(tmp_codes, np.asarray(self.codes))
+        os.replace(tmp_codes, self._codes_path)
+        tmp_lists = os.path.join(self.path, "lists.tmp.npy")
+        np.save(tmp_lists, np.asarray(self.assignments))
+        os.replace(tmp_lists, self._lists_path)
+        tmp_ann = os.path.join(self.path, "ann.tmp.npz")
+        np.savez(tmp_ann, quantization=self.quantizer.name, centroids=self.centroids,
+                 trained_rows=self.trained_rows, **self.quantizer.arrays())
+        os.replace(tmp_ann, self._ann_path)
+        self._ann_mtime = os.stat(self._ann_path).st_mtime
+
+    @_locked
+    def train(self):
+        """Fit the centroids and quantizer on a sample of the rows, then encode every row."""
+        self._flush_pending()
+        rows = len(self.ids)
+        sample_rows = np.sort(np.random.default_rng(0).choice(rows, min(rows, ANN_TRAIN_SAMPLE), replace=False))
+        sample = np.asarray(self.matrix[sample_rows], dtype=np.float32)
+        nlist = min(self.nlist or int(4 * np.sqrt(rows)), len(sample))
+        self.centroids = _kmeans(sample, nlist)
+        residuals = sample - self.centroids[_assign(sample, self.centroids)]
+        if self.quantization == ProductQuantizer.name:
+            self.quantizer = ProductQuantizer.train(residuals, self.pq_subvectors)
+        else:
+            self.quantizer = ScalarQuantizer.train(residuals)
+        dtype = np.uint8 if self.quantization == ProductQuantizer.name else np.int8
+        self.codes = np.empty((rows, self.quantizer.code_size), dtype=dtype)
+        self.assignments = np.empty(rows, dtype=np.int32)
+        self._encode(np.arange(rows))
+        self.trained_rows = rows
+
+    def _encode(self, rows):
+        if not isinstance(self.codes, np.ndarray) or not self.codes.flags.writeable:
+            self.codes = np.array(self.codes)
+            self.assignments = np.array(self.assignments)
+        for start in range(0, len(rows), _BLOCK):
+            block = rows[start:start + _BLOCK]
+            vectors = np.asarray(self.matrix[block], dtype=np.float32)
+            assignments = self.assignments[block] = _assign(vectors, self.centroids)
+            self.codes[block] = self.quantizer.encode(vectors - self.centroids[assignments])
+        self._lists = None
+
+    def _flush_pending(self):
+        added = len(self._pending)
+        super()._flush_pending()
+        if added and self.trained:
+            self.codes = np.concatenate([self.codes, np.zeros((added, self.codes.shape[1]), self.codes.dtype)])
+            self.assignments = np.concatenate([self.assignments, np.zeros(added, np.int32)])
+            self._encode(np.arange(len(self.ids) - added, len(self.ids)))
+
+    @_locked
+    def upsert(self, vectors, **kwargs):
+        vectors = list(vectors)
+        super().upsert(vectors, **kwargs)
+        if self.trained:
+            # New rows are encoded when flushed; replaced ones (possibly several times in one batch) here
+            self._flush_pending()
+            self._encode(np.array(sorted({self.rows[vector["id"]] for vector in vectors}), dtype=np.int64))
+
+    @_locked
+    def delete(self, ids, **kwargs):
+        ids = list(ids)
+        self._flush_pending()
+        doomed = [self.rows[vector_id] for vector_id in ids if vector_id in self.rows]
+        super().delete(ids, **kwargs)
+        if doomed and self.trained:
+            keep = np.ones(len(self.codes), dtype=bool)
+            keep[doomed] = False
+            self.codes = np.asarray(self.codes)[keep]
+            self.assignments = np.asarray(self.assignments)[keep]
+            self._lists = None
+
+    def _inverted_lists(self):
+        """Rows grouped by list (``order``) and each list's ``offsets`` into it."""
+        if self._lists is None:
+            assignments = np.asarray(self.assignments)
+            counts = np.bincount(assignments, minlength=len(self.centroids))
+            self._lists = (np.argsort(assignments, kind="stable"), np.concatenate([[0], np.cumsum(counts)]))
+        return self._lists
+
+    def _exact(self, query, rows, top_k):
+        if not len(rows):
+            return []
+        rows = np.sort(rows)  # Sequential reads from the memory map
+        scores = np.asarray(self.matrix[rows], dtype=np.float32) @ query
+        top_k = min(top_k, len(rows))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[rows[i]], float(scores[i]), self.texts[rows[i]], self.metadatas[rows[i]]) for i in top]
+
+    def _approximate(self, query, rows, centroid_scores):
+        # Score of the row's centroid plus the score of its quantized residual
+        prepared = self.quantizer.prepare(query)
+        assignments = np.asarray(self.assignments)
+        return np.concatenate([
+            centroid_scores[assignments[block]] + self.quantizer.scores(np.asarray(self.codes[block]), prepared)
+            for block in (rows[start:start + _BLOCK] for start in range(0, len(rows), _BLOCK))])
+
+    def candidates(self, centroid_scores, wanted, mask=None, nprobe=None):
+        """Rows in the ``nprobe`` lists closest to the query (more, until ``wanted`` rows pass ``mask``)."""
+        order, offsets = self._inverted_lists()
+        half_norms = 0.5 * np.einsum("ij,ij->i", self.centroids, self.centroids)
+        probe_order = np.argsort(half_norms - centroid_scores)
+        nprobe = nprobe or self.nprobe
+        found, total = [], 0
+        for probed, lst in enumerate(probe_order, 1):
+            rows = order[offsets[lst]:offsets[lst + 1]]
+            if mask is not None:
+                rows = rows[mask[rows]]
+            found.append(rows)
+            total += len(rows)
+            if probed >= nprobe and total >= wanted:
+                break
+        return np.concatenate(found)
+
+    @_locked
+    def query(self, vector, top_k=5, filter=None, nprobe=None, rerank=None):
+        """Like :meth:`LocalVectorIndex.query`, approximately; ``nprobe``/``rerank`` override the index's."""
+        self._flush_pending()
+        if not self.trained or not self.ids or top_k <= 0:
+            return super().query(vector, top_k=top_k, filter=filter)
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        mask = None
+        if filter:
+            mask = self._filter_mask(filter)
+            allowed = int(mask.sum())
+            if not allowed:
+                return []
+            if allowed <= self.exact_rows:
+                return self._exact(query, np.flatnonzero(mask), top_k)
+        wanted = max(top_k, rerank if rerank is not None else self.rerank)
+        centroid_scores = self.centroids @ query
+        rows = self.candidates(centroid_scores, wanted, mask, nprobe)
+        if len(rows) > wanted:
+            approximate = self._approximate(query, rows, centroid_scores)
+            rows = rows[np.argpartition(-approximate, wanted - 1)[:wanted]]
+        return self._exact(query, rows, top_k)
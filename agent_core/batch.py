@@ -0,0 +1,323 @@
+"""Answer a file of questions with one agent, concurrently, writing JSONL in input order.
+
+Run from the repository root::
+
+    python -m agent_core.batch --agent order --input order_support_agent/questions.txt --output answers.jsonl
+
+The input is a text file with one question per line (surrounding quotes are
+stripped) or JSONL with a ``query`` (or ``question``) and optional ``id`` per
+line; ``-`` reads stdin. Questions are read in batches, and each batch's query
+embeddings are fetched in one request (warming the shared embedding cache)
+while earlier questions are still being answered. Identical questions (after
+the response cache's normalization) are answered once. At most
+``--concurrency`` pipelines run at a time; the limit halves whenever OpenAI
+rate-limits us and recovers one slot at a time after successes, and retryable
+failures are retried with backoff (honouring ``Retry-After``), including those
+of the triage step, which interactive queries would answer as "unknown". Its OpenAI calls
+run at batch priority, so a server sharing the process keeps serving
+interactive queries first.
+
+Each output line is the server's query payload plus the record ``id`` (and
+``duplicate_of`` or ``error`` where relevant), written as soon as every earlier
+record is done. The output file doubles as the checkpoint: with ``--resume``
+the records already in it are skipped and new results are appended.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import sys
+import time
+
+from agent_core.clients import disable_sdk_retries
+from agent_core.ingestion import is_rate_limited, is_retryable, retry_after
+from agent_core.response_cache import normalize_query
+from agent_core.scheduler import BATCH, call_priority
+from agent_core.domains import get_registry
+from agent_core.server import run_payload
+from agent_core.telemetry import configure_logging, counter, get_logger
+
+logger = get_logger(__name__)
+
+BATCH_QUERIES = counter("agent_batch_queries_total", "Batch questions written, by outcome", ("status",))
+
+
+def _text_records(lines):
+    for line in lines:
+        query = line.strip().strip('"').strip()
+        if query:
+            yield {"query": query}
+
+
+def _jsonl_records(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            logger.warning("Skipping invalid JSON on line %d", number)
+            continue
+        query = entry.get("query", entry.get("question")) if isinstance(entry, dict) else None
+        if not isinstance(query, str) or not query.strip():
+            logger.warning("Skipping line %d without a 'query'", number)
+            continue
+        yield {"id": entry.get("id"), "query": query.strip()}
+
+
+def read_questions(lines, fmt="auto", path=""):
+    """Yield ``{"id", "query"}`` records; ids default to the 1-based record number."""
+    if fmt == "auto":
+        fmt = "jsonl" if path.endswith((".jsonl", ".ndjson")) else "text"
+    records = _jsonl_records(lines) if fmt == "jsonl" else _text_records(lines)
+    for number, record in enumerate(records, 1):
+        if record.get("id") is None:
+            record["id"] = number
+        yield record
+
+
+def completed_records(path):
+    """Count the complete records already in ``path`` and truncate any partially written last line."""
+    if not os.path.exists(path):
+        return 0
+    count = 0
+    valid_bytes = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                json.loads(line)
+            except ValueError:
+                break
+            count += 1
+            valid_bytes += len(line)
+    if valid_bytes != os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return count
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that halves on rate limiting and grows back by one per ``limit`` successes (AIMD)."""
+
+    def __init__(self, max_concurrency, min_concurrency=1):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = self.max_concurrency
+        self.active = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def __aexit__(self, *exc_info):
+        async with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_concurrency:
+            self._successes = 0
+            self.limit += 1
+
+    def on_rate_limited(self):
+        self._successes = 0
+        limit = max(self.min_concurrency, self.limit // 2)
+        if limit < self.limit:
+            logger.warning("Rate limited; concurrency %d -> %d", self.limit, limit)
+            self.limit = limit
+
+
+class BatchRunner:
+    """Runs one agent pipeline over a stream of questions; see the module docstring."""
+
+    def __init__(self, pipeline, agent, embed_documents=None, concurrency=8, embed_batch_size=100,
+                 max_retries=5, base_delay=1.0, max_delay=30.0):
+        self.pipeline = pipeline
+        self.agent = agent
+        self.embed_documents = embed_documents
+        self.limiter = AdaptiveLimiter(concurrency)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Enough read-ahead that the next batch is embedded while the current one runs
+        self.max_pending = self.embed_batch_size + 4 * concurrency
+        self.stats = {"records": 0, "unique": 0, "duplicates": 0, "errors": 0, "retries": 0}
+        self._answers = {}
+
+    async def _answer(self, query):
+        attempt = 0
+        while True:
+            async with self.limiter:
+                try:
+                    run = await self.pipeline.run(query=query)
+                except Exception as e:
+                    error = e
+                else:
+                    self.limiter.on_success()
+                    return run
+            if is_rate_limited(error):
+                self.limiter.on_rate_limited()
+            if attempt >= self.max_retries or not is_retryable(error):
+                raise error
+            delay = retry_after(error)
+            if delay is None:
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            attempt += 1
+            self.stats["retries"] += 1
+            logger.debug("Query failed (%r); retry %d/%d in %.2fs", error, attempt, self.max_retries, delay)
+            await asyncio.sleep(delay)
+
+    async def _prefetch_embeddings(self, batch):
+        """Embed the batch's new questions in one request so the pipelines find them cached."""
+        if self.embed_documents is None:
+            return
+        queries = list(dict.fromkeys(record["query"] for record in batch
+                                     if normalize_query(record["query"]) not in self._answers))
+        if not queries:
+            return
+        try:
+            await self.embed_documents(queries)
+        except Exception as e:
+            # Not fatal: each pipeline embeds its own query on a cache miss
+            logger.warning("Batch embedding of %d questions failed: %s", len(queries), e)
+
+    def _submit(self, record):
+        key = normalize_query(record["query"])
+        first = self._answers.get(key)
+        if first is not None:
+            self.stats["duplicates"] += 1
+            return record, first[0], first[1]
+        task = asyncio.create_task(self._answer(record["query"]))
+        self._answers[key] = (record["id"], task)
+        self.stats["unique"] += 1
+        return record, None, task
+
+    async def _result(self, record, duplicate_of, task):
+        try:
+            run = await task
+        except Exception as e:
+            self.stats["errors"] += 1
+            BATCH_QUERIES.inc(status="error")
+            result = {"id": record["id"], "agent": self.agent, "query": record["query"],
+                      "error": f"{type(e).__name__}: {e}"}
+        else:
+            BATCH_QUERIES.inc(status="duplicate" if duplicate_of is not None else "ok")
+            result = {"id": record["id"], **run_payload(self.agent, record["query"], run)}
+        if duplicate_of is not None:
+            result["duplicate_of"] = duplicate_of
+        return result
+
+    async def run(self, records, write):
+        """Answer ``records`` (an iterable of ``{"id", "query"}``), calling ``write(result)`` in input order."""
+        started = time.perf_counter()
+        pending = collections.deque()
+        batch = []
+
+        async def drain(limit):
+            while len(pending) > limit:
+                write(await self._result(*pending.popleft()))
+
+        async def submit(batch):
+            await self._prefetch_embeddings(batch)
+            for record in batch:
+                pending.append(self._submit(record))
+                self.stats["records"] += 1
+            await drain(self.max_pending)
+
+        try:
+            for record in records:
+                batch.append(record)
+                if len(batch) >= self.embed_batch_size:
+                    await submit(batch)
+                    batch = []
+            if batch:
+                await submit(batch)
+            await drain(0)
+        finally:
+            for _, _, task in pending:
+                task.cancel()
+        elapsed = time.perf_counter() - started
+        self.stats.update(
+            elapsed_s=round(elapsed, 3),
+            questions_per_sec=round(self.stats["records"] / elapsed, 2) if elapsed > 0 else 0.0,
+            final_concurrency=self.limiter.limit,
+        )
+        return self.stats
+
+
+async def run_file(args):
+    from agent_core.clients import close_clients
+
+    domain = get_registry().get(args.agent)
+    runner = BatchRunner(
+        # Retryable failures of the optional triage step are retried here rather than labelled "unknown"
+        domain.create_pipeline(reraise=is_retryable), args.agent,
+        embed_documents=domain.embeddings.aembed_documents,
+        concurrency=args.concurrency,
+        embed_batch_size=args.embed_batch_size,
+        max_retries=args.max_retries,
+    )
+    skip = completed_records(args.output) if args.resume else 0
+    if skip:
+        logger.info("Resuming after %d completed records in %s", skip, args.output)
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    if args.output == "-":
+        sink = sys.stdout
+    else:
+        sink = open(args.output, "a" if args.resume else "w", encoding="utf-8")
+
+    def write(result):
+        sink.write(json.dumps(result) + "\n")
+        # Every finished line is a checkpoint for --resume
+        sink.flush()
+
+    try:
+        records = read_questions(source, args.format, args.input)
+        for _ in range(skip):
+            if next(records, None) is None:
+                break
+        with call_priority(BATCH):
+            stats = await runner.run(records, write)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+        await close_clients()
+    logger.info("Batch finished", extra={"stats": {**stats, "resumed_after": skip}})
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions with one agent.")
+    parser.add_argument("--agent", required=True, choices=get_registry().names())
+    parser.add_argument("--input", required=True, help="Question file (text or JSONL), or - for stdin")
+    parser.add_argument("--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("--format", choices=("auto", "text", "jsonl"), default="auto",
+                        help="Input format; auto picks JSONL for .jsonl/.ndjson files")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("BATCH_CONCURRENCY", "8")))
+    parser.add_argument("--embed-batch-size", type=int, default=int(os.environ.get("BATCH_EMBED_SIZE", "100")),
+                        help="Questions read and embedded per request")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--resume", action="store_true", help="Skip records already written to --output")
+    args = parser.parse_args()
+    if args.resume and args.output == "-":
+        parser.error("--resume needs an --output file")
+    configure_logging()
+    # Failed queries are retried here with backoff; SDK retries underneath would multiply them
+    disable_sdk_retries()
+    asyncio.run(run_file(args))
+
+
+if __name__ == "__main__":
+    main()
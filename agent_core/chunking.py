@@ -0,0 +1,97 @@
+"""Token-aware chunking of long records, and merging chunks back at retrieval time.
+
+A record whose text fits in ``max_tokens`` is ingested as-is, under its own ID,
+so short CSV rows (all of today's data) are unaffected. A longer one is split
+into windows of whole words, each at most ``max_tokens`` tokens long and
+repeating up to ``overlap`` tokens from the end of the previous window, so no
+embedding input exceeds one window and text cut at a boundary still has its
+surrounding words in the next chunk.
+
+Chunk ``n`` of record ``R`` gets the ID ``R#n`` and the record's metadata (so
+category filters still apply) plus ``parent_id``, ``chunk``, ``chunks`` and
+``start`` (the chunk's character offset in the parent text). Retrieval searches
+the chunks; :func:`merge_chunks` stitches fetched chunks of one parent back into
+one text using those offsets, dropping the overlaps (see
+:func:`agent_core.retrieval.expand_chunks`).
+
+Tokens are counted with the embedding model's encoding (``CHUNK_ENCODING``,
+default ``cl100k_base``), or estimated like :mod:`agent_core.context` does when
+tiktoken cannot load it.
+"""
+import os
+import re
+
+from agent_core.context import count_tokens
+
+CHUNK_TOKENS = int(os.environ.get("CHUNK_TOKENS", "400"))
+CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", "50"))
+CHUNK_ENCODING = os.environ.get("CHUNK_ENCODING", "cl100k_base")
+
+# Metadata keys chunking adds; a merged parent drops the per-chunk ones
+CHUNK_FIELDS = ("parent_id", "chunk", "chunks", "start")
+
+_WORD = re.compile(r"\S+")
+
+
+def split_text(text, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP, encoding=CHUNK_ENCODING):
+    """``(start, end)`` character spans of the chunks of ``text`` (one span if it fits in ``max_tokens``)."""
+    # A token spans at least one character, so short texts need no tokenizer at all
+    if len(text) <= max_tokens or count_tokens(text, encoding) <= max_tokens:
+        return [(0, len(text))]
+    words = [(match.start(), match.end()) for match in _WORD.finditer(text)]
+    # Counted word by word (with the leading space, as the tokenizer sees it), which errs on the long side
+    costs = [count_tokens(text[words[i - 1][1] if i else 0:end], encoding) for i, (_, end) in enumerate(words)]
+    spans = []
+    first = 0
+    while first < len(words):
+        last, total = first, 0
+        # Always take one word, even if it alone exceeds the budget
+        while last < len(words) and (last == first or total + costs[last] <= max_tokens):
+            total += costs[last]
+            last += 1
+        spans.append((words[first][0], words[last - 1][1]))
+        if last >= len(words):
+            break
+        # Step back over up to ``overlap`` tokens of trailing words, but always move forward
+        next_first, shared = last, 0
+        while next_first - 1 > first and shared + costs[next_first - 1] <= overlap:
+            next_first -= 1
+            shared += costs[next_first]
+        first = next_first
+    return spans
+
+
+def chunk_record(record, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP, encoding=CHUNK_ENCODING):
+    """The sync records (``{"id", "text", "metadata"}``) for ``record``: itself, or its chunks."""
+    if not max_tokens:
+        return [record]
+    text = record["text"]
+    spans = split_text(text, max_tokens, overlap, encoding)
+    if len(spans) == 1:
+        return [record]
+    return [
+        {"id": f"{record['id']}#{n}", "text": text[start:end],
+         "metadata": {**record["metadata"], "parent_id": record["id"], "chunk": n, "chunks": len(spans),
+                      "start": start}}
+        for n, (start, end) in enumerate(spans)
+    ]
+
+
+def chunk_ids(parent_id, indices):
+    return [f"{parent_id}#{n}" for n in indices]
+
+
+def merge_chunks(chunks):
+    """One text from chunks of a single parent, as ``(chunk, start, text)`` triples: overlaps dropped, gaps marked."""
+    merged = []
+    previous = end = None
+    for n, start, text in sorted(chunks):
+        if end is None:
+            merged.append(text)
+        elif start < end:
+            merged.append(text[end - start:])
+        else:
+            # Consecutive chunks without overlap are only separated by whitespace; others skip text
+            merged.append((" " if n == previous + 1 else " ... ") + text)
+        previous, end = n, max(end or 0, start + len(text))
+    return "".join(merged)
@@ -0,0 +1,310 @@
+"""Process-wide HTTP/OpenAI/Pinecone clients.
+
+Every agent module and ingester loaded into the same process gets the same
+instances: one async httpx client (HTTP/2 when ``h2`` is installed, keep-alive
+otherwise) carries all OpenAI embedding and chat traffic, and each Pinecone
+index has a single handle. The long-running server therefore keeps one warm
+connection pool per service instead of paying a TLS handshake per agent or run.
+That transport also routes every OpenAI request through the shared
+:class:`agent_core.scheduler.CallScheduler` (coalescing, rate limits, priorities).
+"""
+import os
+
+from agent_core.telemetry import counter, current_span, token_usage_callback
+
+_clients = {}
+
+# Repository root: default paths of the state files shared by the ingesters and the agents are
+# anchored here, so an ingest script run from an agent folder and a server run from the root agree
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+HTTP_RETRIES = counter("agent_http_retries_total", "OpenAI requests that were retries of a failed attempt")
+
+# Connection pool sizing for the shared OpenAI HTTP client
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "60"))
+
+# Connections Pinecone's (thread-based, synchronous) client keeps per index
+PINECONE_POOL_SIZE = int(os.environ.get("PINECONE_POOL_SIZE", "16"))
+
+# Retries the OpenAI SDK makes by itself; processes with their own retry loop (the
+# ingesters and the batch runner) turn them off with disable_sdk_retries()
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "2"))
+_sdk = {"max_retries": OPENAI_MAX_RETRIES}
+
+# LangChain splits over-long query texts with tiktoken, which downloads its encoding
+# on first use; set to 0 to send texts as-is (e.g. offline against a fake server)
+EMBEDDING_CTX_CHECK = os.environ.get("EMBEDDING_CTX_CHECK", "1") != "0"
+
+
+def _shared(key, build):
+    if key not in _clients:
+        _clients[key] = build()
+    return _clients[key]
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _metered_transport_class():
+    import httpx
+
+    class MeteredTransport(httpx.AsyncBaseTransport):
+        """Wraps the pooled transport to count requests and new connections (i.e. handshakes).
+
+        JSON requests go through ``scheduler`` first; non-streamed responses are
+        read in full there so coalesced callers can each get a copy.
+        """
+
+        def __init__(self, transport, max_connections, scheduler=None):
+            self.transport = transport
+            self.max_connections = max_connections
+            self.scheduler = scheduler
+            self.requests = 0
+            self.retries = 0
+            self.errors = 0
+            self.connections_opened = 0
+            self.peak_active = 0
+            self._seen = set()
+
+        def _connections(self):
+            pool = getattr(self.transport, "_pool", None)
+            return list(getattr(pool, "connections", []))
+
+        def _observe(self):
+            connections = self._connections()
+            for connection in connections:
+                if id(connection) not in self._seen:
+                    self._seen.add(id(connection))
+                    self.connections_opened += 1
+            self._seen &= {id(connection) for connection in connections}
+            active = sum(1 for connection in connections if not connection.is_idle())
+            self.peak_active = max(self.peak_active, active)
+
+        async def handle_async_request(self, request):
+            from agent_core.scheduler import parse_request
+
+            try:
+                key, body = parse_request(request.method, request.url, request.content)
+            except httpx.RequestNotRead:
+                key, body = None, None
+            if self.scheduler is None or body is None:
+                return await self._send(request)
+
+            async def send():
+                response = await self._send(request)
+                if key is None:
+                    return response.status_code, response.headers, response
+                try:
+                    content = b"".join([chunk async for chunk in response.aiter_raw()])
+                finally:
+                    await response.aclose()
+                return response.status_code, response.headers, content
+
+            status, headers, payload = await self.scheduler.call(body, send, key)
+            if key is None:
+                return payload
+            return httpx.Response(status, headers=headers, content=payload, request=request)
+
+        async def _send(self, request):
+            self.requests += 1
+            current = current_span()
+            current.add("http_requests")
+            # The OpenAI SDK numbers its own retry attempts in this header
+            if request.headers.get("x-stainless-retry-count", "0") != "0":
+                self.retries += 1
+                HTTP_RETRIES.inc()
+                current.add("retries")
+            try:
+                return await self.transport.handle_async_request(request)
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self._observe()
+
+        async def aclose(self):
+            await self.transport.aclose()
+
+        def stats(self):
+            connections = self._connections()
+            active = sum(1 for connection in connections if not connection.is_idle())
+            http2 = sum(1 for connection in connections if "HTTP/2" in connection.info())
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "errors": self.errors,
+                "connections_opened": self.connections_opened,
+                "open": len(connections),
+                "active": active,
+                "idle": len(connections) - active,
+                "http2": http2,
+                "peak_active": self.peak_active,
+                "max_connections": self.max_connections,
+                "utilization": round(active / self.max_connections, 3) if self.max_connections else 0.0,
+                "requests_per_connection": round(self.requests / self.connections_opened, 2)
+                if self.connections_opened else 0.0,
+            }
+
+    return MeteredTransport
+
+
+def disable_sdk_retries():
+    """Build OpenAI clients without SDK retries, so a caller's own backoff is the only retry layer.
+
+    Call it before the first client is created (clients are shared once built).
+    """
+    _sdk["max_retries"] = 0
+
+
+def get_scheduler():
+    """The :class:`agent_core.scheduler.CallScheduler` every OpenAI request goes through."""
+    from agent_core.scheduler import CallScheduler
+
+    return _shared("scheduler", CallScheduler)
+
+
+def get_http_client():
+    """The async httpx client shared by every OpenAI call in the process."""
+    import httpx
+
+    def build():
+        http2 = _http2_available()
+        limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                              max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                              keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+        transport = _metered_transport_class()(
+            httpx.AsyncHTTPTransport(http2=http2, limits=limits), HTTP_MAX_CONNECTIONS, get_scheduler())
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=10.0),
+            headers={"User-Agent": "python-openai/1.0.0"},  # Simple ASCII user agent
+        )
+
+    return _shared("http", build)
+
+
+def get_openai():
+    """Raw ``openai.AsyncOpenAI`` client on the shared connection pool (used by the ingesters)."""
+    import openai
+
+    return _shared("openai", lambda: openai.AsyncOpenAI(
+        api_key=os.environ["OPENAI_API_KEY"], http_client=get_http_client(), max_retries=_sdk["max_retries"]))
+
+
+def get_embedding_cache():
+    from agent_core.embedding_cache import EmbeddingCache
+
+    return _shared("embedding_cache", lambda: EmbeddingCache(
+        os.environ.get("EMBEDDING_CACHE_PATH", os.path.join(ROOT, ".embedding_cache.sqlite"))))
+
+
+def get_embeddings():
+    """Query embeddings, fronted by the persistent cache shared with ingestion."""
+    from langchain_openai import OpenAIEmbeddings
+    from agent_core.embedding_cache import CachedEmbeddings
+
+    return _shared("embeddings", lambda: CachedEmbeddings(
+        OpenAIEmbeddings(api_key=os.environ["OPENAI_API_KEY"], http_async_client=get_http_client(),
+                         check_embedding_ctx_length=EMBEDDING_CTX_CHECK, max_retries=_sdk["max_retries"]),
+        get_embedding_cache()))
+
+
+def get_llm(model="gpt-4o-mini", temperature=0):
+    from langchain_openai import ChatOpenAI
+
+    # stream_usage makes streamed completions report token counts too
+    return _shared(("llm", model, temperature), lambda: ChatOpenAI(
+        model=model, temperature=temperature, api_key=os.environ["OPENAI_API_KEY"],
+        http_async_client=get_http_client(), max_retries=_sdk["max_retries"], stream_usage=True,
+        callbacks=[token_usage_callback(model)]))
+
+
+def get_vector_backend():
+    """``pinecone`` (default) or ``local`` for the in-process NumPy index."""
+    return os.environ.get("VECTOR_BACKEND", "pinecone").lower()
+
+
+def get_pinecone():
+    from pinecone import Pinecone
+
+    return _shared("pinecone", lambda: Pinecone(api_key=os.environ["PINECONE_API_KEY"]))
+
+
+def local_index_path(index_name):
+    """Directory of a local index (``LOCAL_INDEX_DIR``, default ``.local_index/`` at the repository root)."""
+    return os.path.join(os.environ.get("LOCAL_INDEX_DIR", os.path.join(ROOT, ".local_index")), index_name)
+
+
+def open_local_index(index_name):
+    """The local index, searched exactly or, with ``LOCAL_INDEX_ENGINE=ivf``, through :mod:`agent_core.ann_index`."""
+    if os.environ.get("LOCAL_INDEX_ENGINE", "exact").lower() == "ivf":
+        from agent_core.ann_index import IVFVectorIndex
+
+        return IVFVectorIndex(local_index_path(index_name))
+    from agent_core.local_index import LocalVectorIndex
+
+    return LocalVectorIndex(local_index_path(index_name))
+
+
+def get_index(index_name):
+    """The single index handle (Pinecone ``Index`` or :class:`LocalVectorIndex`) for an index name."""
+    if get_vector_backend() == "local":
+        return _shared(("local_index", index_name), lambda: open_local_index(index_name))
+    return _shared(("index", index_name), lambda: get_pinecone().Index(
+        index_name, pool_threads=PINECONE_POOL_SIZE, connection_pool_maxsize=PINECONE_POOL_SIZE))
+
+
+def get_lexical_index(index_name):
+    """The BM25 index kept next to a vector index (``LEXICAL_INDEX_DIR``, default ``.lexical_index/`` at the root)."""
+    from agent_core.lexical import LexicalIndex
+
+    directory = os.environ.get("LEXICAL_INDEX_DIR", os.path.join(ROOT, ".lexical_index"))
+    return _shared(("lexical_index", index_name), lambda: LexicalIndex(os.path.join(directory, f"{index_name}.json")))
+
+
+def get_vectorstore(index_name):
+    if get_vector_backend() == "local":
+        from agent_core.local_index import LocalVectorStore
+
+        return _shared(("vectorstore", index_name), lambda: LocalVectorStore(
+            get_index(index_name), get_embeddings()))
+
+    from langchain_pinecone import PineconeVectorStore
+
+    # Built on the shared index handle rather than a second client of its own
+    return _shared(("vectorstore", index_name), lambda: PineconeVectorStore(
+        index=get_index(index_name), embedding=get_embeddings()))
+
+
+def pool_stats():
+    """Connection-pool utilization for the shared HTTP client (empty until it is created)."""
+    client = _clients.get("http")
+    if client is None:
+        return {}
+    stats = client._transport.stats()
+    stats["http2_enabled"] = _http2_available()
+    return stats
+
+
+def scheduler_stats():
+    """Coalescing and per-model rate-limit state (empty until the scheduler is created)."""
+    scheduler = _clients.get("scheduler")
+    return scheduler.stats() if scheduler is not None else {}
+
+
+async def close_clients():
+    """Release pooled connections and the cache file; used on shutdown."""
+    for key, client in list(_clients.items()):
+        if key == "http":
+            await client.aclose()
+        elif key == "embedding_cache":
+            client.close()
+    _clients.clear()
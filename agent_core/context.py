@@ -0,0 +1,145 @@
+"""Context assembly between retrieval and the response prompt.
+
+Retrieval hands over up to ``k`` documents, best first, carrying their
+similarity in ``metadata["score"]`` (exact lookups have no score; lexical hits
+carry a BM25 score in ``metadata["bm25"]`` instead of, or besides, it). The
+assembler keeps retrieval's order and then:
+
+- drops vector-only hits scoring below ``CONTEXT_MIN_SCORE`` (cosine similarity);
+- drops near-duplicates, i.e. documents whose word-shingle Jaccard similarity to
+  one already kept is at least ``CONTEXT_DEDUP_THRESHOLD``;
+- skips any document that would take the total past ``CONTEXT_MAX_TOKENS`` and
+  keeps going, so a shorter one further down can still fit; the first document
+  is truncated to the budget instead if nothing has been kept yet.
+
+Tokens are counted with the chat model's tiktoken encoding (``CONTEXT_ENCODING``,
+default ``o200k_base`` for gpt-4o-mini). When the encoding cannot be loaded
+(tiktoken fetches it on first use, which fails offline) a four-characters-per-token
+estimate is used instead. The encoding is loaded in a worker thread (by the
+server's background warm-up, or on the first assembly), never on the event loop.
+"""
+import asyncio
+import functools
+import os
+import re
+
+from agent_core.telemetry import counter, current_span, get_logger
+
+logger = get_logger(__name__)
+
+CONTEXT_MAX_TOKENS = int(os.environ.get("CONTEXT_MAX_TOKENS", "1500"))
+CONTEXT_MIN_SCORE = float(os.environ.get("CONTEXT_MIN_SCORE", "0.5"))
+CONTEXT_DEDUP_THRESHOLD = float(os.environ.get("CONTEXT_DEDUP_THRESHOLD", "0.9"))
+CONTEXT_ENCODING = os.environ.get("CONTEXT_ENCODING", "o200k_base")
+
+CONTEXT_DOCUMENTS = counter("agent_context_documents_total", "Retrieved documents by context assembly outcome",
+                            ("outcome",))
+
+_WORD = re.compile(r"\w+")
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(name):
+    if not name:
+        return None
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning("Tokenizer %s unavailable (%s); estimating token counts", name, e)
+        return None
+
+
+def load_encoding(encoding=None):
+    """Load (and cache) the tokenizer; blocking, since tiktoken may download it on first use."""
+    return _encoding(encoding if encoding is not None else CONTEXT_ENCODING)
+
+
+def count_tokens(text, encoding=None):
+    """Number of tokens in ``text`` for the chat model (estimated without the tokenizer)."""
+    enc = _encoding(encoding if encoding is not None else CONTEXT_ENCODING)
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode_ordinary(text))
+
+
+def truncate_tokens(text, max_tokens, encoding=None):
+    """The longest prefix of ``text`` that fits in ``max_tokens``."""
+    enc = _encoding(encoding if encoding is not None else CONTEXT_ENCODING)
+    if enc is None:
+        return text[:max_tokens * 4]
+    tokens = enc.encode_ordinary(text)
+    return text if len(tokens) <= max_tokens else enc.decode(tokens[:max_tokens])
+
+
+def _shingles(text, size=3):
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _relevant(doc, min_score):
+    # Exact lookups and lexical matches are relevant by construction; only the similarity of a vector-only hit
+    # is thresholded
+    score = doc.metadata.get("score")
+    return score is None or "bm25" in doc.metadata or score >= min_score
+
+
+class ContextAssembler:
+    """Filters, deduplicates and budgets retrieved documents; see the module docstring."""
+
+    def __init__(self, max_tokens=CONTEXT_MAX_TOKENS, min_score=CONTEXT_MIN_SCORE,
+                 dedup_threshold=CONTEXT_DEDUP_THRESHOLD, encoding=None):
+        self.max_tokens = max_tokens
+        self.min_score = min_score
+        self.dedup_threshold = dedup_threshold
+        self.encoding = encoding
+        self._encoding_loaded = False
+
+    def select(self, documents):
+        """The documents to put in the prompt, best first."""
+        kept = []
+        kept_shingles = []
+        used = 0
+        stats = {"low_score": 0, "duplicate": 0, "over_budget": 0}
+        for doc in documents:
+            if not _relevant(doc, self.min_score):
+                stats["low_score"] += 1
+                continue
+            shingles = _shingles(doc.page_content)
+            if any(_jaccard(shingles, other) >= self.dedup_threshold for other in kept_shingles):
+                stats["duplicate"] += 1
+                continue
+            tokens = count_tokens(doc.page_content, self.encoding)
+            if used + tokens > self.max_tokens:
+                if kept:
+                    stats["over_budget"] += 1
+                    continue
+                # A single oversized document is cut to the budget rather than dropped
+                text = truncate_tokens(doc.page_content, self.max_tokens, self.encoding)
+                doc = doc.model_copy(update={"page_content": text})
+                tokens = count_tokens(text, self.encoding)
+                current_span().set(context_truncated=True)
+            kept.append(doc)
+            kept_shingles.append(shingles)
+            used += tokens
+        for outcome, count in stats.items():
+            if count:
+                CONTEXT_DOCUMENTS.inc(count, outcome=outcome)
+        CONTEXT_DOCUMENTS.inc(len(kept), outcome="kept")
+        current_span().set(candidates=len(documents), kept=len(kept), context_tokens=used,
+                           **{key: count for key, count in stats.items() if count})
+        return kept
+
+    async def assemble(self, documents):
+        """Pipeline step wrapper around :meth:`select`."""
+        if not self._encoding_loaded:
+            await asyncio.to_thread(load_encoding, self.encoding)
+            self._encoding_loaded = True
+        return self.select(documents)
@@ -0,0 +1,225 @@
+"""Agent domains declared by config, discovered cheaply and built on first use.
+
+A domain is one JSON file (conventionally ``domain.json`` in the agent's folder)::
+
+    {
+      "name": "order",
+      "index_name": "support-data",
+      "data_path": "order_data.csv",
+      "schema": "keyed",
+      "labels": ["order", "return"],
+      "filter_field": "type",
+      "triage_rules": {"return": [["\\\\breturn", 2]], "order": [["\\\\border", 1]]}
+    }
+
+Required keys are ``name``, ``index_name``, ``data_path``, ``schema`` and
+``labels``. The others are optional:
+
+- ``filter_field``: the metadata field retrieval filters on (default ``category``).
+- ``triage_rules``: label -> ``[pattern, weight]`` pairs for the keyword fast path.
+- ``triage_prompt`` and ``response_prompt``: LangChain templates over ``{query}``
+  (and ``{context}``).
+- ``default_label``: the label an unparseable LLM triage falls back to.
+- ``max_filter_categories`` and ``category_wait``: how many labels one filter may
+  span and how long retrieval waits for an LLM triage (``0`` means never wait).
+- ``lookup``: ``"order_number"`` enables the exact order lookup.
+- ``cache_partition``: the part of a query that must match exactly for a cached
+  answer to be reused: ``"identifiers"`` (every order number, tracking code or
+  other identifier in it) or ``"order_number"``.
+- ``hybrid``: also keep a BM25 index of the documents (:mod:`agent_core.lexical`),
+  fuse it with vector search and answer identifier queries from it directly.
+- ``chunk_tokens`` and ``chunk_overlap``: records longer than ``chunk_tokens``
+  tokens are ingested as overlapping chunks (see :mod:`agent_core.chunking`;
+  ``0`` disables chunking).
+- ``chunk_retrieval`` and ``chunk_neighbors``: what a chunk hit returns, either
+  its whole ``"parent"`` record or the hit merged with ``chunk_neighbors``
+  chunks either side (``"neighbors"``, the default).
+- ``questions`` and ``example_query``: sample inputs.
+
+Paths are relative to the config file, and ``<NAME>_DATA_PATH`` overrides
+``data_path`` (e.g. ``ORDER_DATA_PATH``). ``schema`` is ``keyed`` (an
+``id,text,metadata`` CSV whose metadata carries the filter field) or ``labeled``
+(a ``category,content`` CSV).
+
+``DOMAINS_PATH`` lists config files or directories (separated by ``os.pathsep``)
+to search; by default every ``*/domain.json`` under the repository root is used.
+Discovery only reads the JSON files. The clients, index handles and pipeline of
+a domain are built the first time it is asked for, so startup cost does not grow
+with the number of domains, and every built domain shares the process-wide
+clients and caches from :mod:`agent_core.clients`.
+"""
+import asyncio
+import glob
+import json
+import os
+import threading
+
+from agent_core.chunking import CHUNK_OVERLAP, CHUNK_TOKENS
+from agent_core.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CONFIG_FILENAME = "domain.json"
+
+SCHEMAS = ("keyed", "labeled")
+REQUIRED_KEYS = ("name", "index_name", "data_path", "schema", "labels")
+
+DEFAULT_RESPONSE_PROMPT = "Respond to: {query} using context: {context}"
+
+# Defaults for domains that don't set their own retrieval filter limits
+MAX_FILTER_CATEGORIES = int(os.environ.get("MAX_FILTER_CATEGORIES", "2"))
+CATEGORY_WAIT = float(os.environ.get("CATEGORY_WAIT", "2"))
+
+CHUNK_RETRIEVAL_MODES = ("neighbors", "parent")
+CHUNK_NEIGHBORS = int(os.environ.get("CHUNK_NEIGHBORS", "1"))
+
+
+def _quoted_list(labels):
+    quoted = [f"'{label}'" for label in labels]
+    return quoted[0] if len(quoted) == 1 else f"{', '.join(quoted[:-1])}, or {quoted[-1]}"
+
+
+class DomainConfig:
+    """One domain's declaration; see the module docstring for the keys."""
+
+    def __init__(self, data, base_dir=ROOT, path=None):
+        missing = [key for key in REQUIRED_KEYS if not data.get(key)]
+        if missing:
+            raise ValueError(f"Domain config {path or data.get('name')!r} is missing {', '.join(missing)}")
+        if data["schema"] not in SCHEMAS:
+            raise ValueError(f"Domain {data['name']!r}: schema must be one of {', '.join(SCHEMAS)}")
+        self.path = path
+        self.base_dir = base_dir
+        self.name = data["name"]
+        self.index_name = data["index_name"]
+        self.schema = data["schema"]
+        self.labels = tuple(data["labels"])
+        self.filter_field = data.get("filter_field", "category")
+        self.triage_rules = {label: [tuple(rule) for rule in rules]
+                             for label, rules in data.get("triage_rules", {}).items()}
+        unknown = set(self.triage_rules) - set(self.labels)
+        if unknown:
+            raise ValueError(f"Domain {self.name!r}: triage rules for unknown labels {', '.join(sorted(unknown))}")
+        self.triage_prompt = data.get(
+            "triage_prompt", f"Classify this query into {_quoted_list(self.labels)}: {{query}}")
+        self.response_prompt = data.get("response_prompt", DEFAULT_RESPONSE_PROMPT)
+        self.default_label = data.get("default_label", self.labels[0])
+        self.max_filter_categories = int(data.get("max_filter_categories", MAX_FILTER_CATEGORIES))
+        self.category_wait = float(data.get("category_wait", CATEGORY_WAIT))
+        self.lookup = data.get("lookup")
+        self.cache_partition = data.get("cache_partition")
+        self.hybrid = bool(data.get("hybrid", False))
+        self.chunk_tokens = int(data.get("chunk_tokens", CHUNK_TOKENS))
+        self.chunk_overlap = int(data.get("chunk_overlap", CHUNK_OVERLAP))
+        self.chunk_retrieval = data.get("chunk_retrieval", "neighbors")
+        if self.chunk_retrieval not in CHUNK_RETRIEVAL_MODES:
+            raise ValueError(f"Domain {self.name!r}: chunk_retrieval must be one of "
+                             f"{', '.join(CHUNK_RETRIEVAL_MODES)}")
+        self.chunk_neighbors = int(data.get("chunk_neighbors", CHUNK_NEIGHBORS))
+        self.example_query = data.get("example_query")
+        self.data_path = os.environ.get(f"{self.name.upper()}_DATA_PATH") or self._resolve(data["data_path"])
+        self.questions_path = self._resolve(data["questions"]) if data.get("questions") else None
+
+    def _resolve(self, path):
+        return path if os.path.isabs(path) else os.path.join(self.base_dir, path)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        path = os.path.abspath(path)
+        return cls(data, base_dir=os.path.dirname(path), path=path)
+
+    def __repr__(self):
+        return f"DomainConfig({self.name!r}, index={self.index_name!r})"
+
+
+def config_paths(search_path=None):
+    """Config files named by ``search_path`` (``DOMAINS_PATH`` by default), in a stable order."""
+    search_path = search_path if search_path is not None else os.environ.get("DOMAINS_PATH", "")
+    entries = [entry for entry in search_path.split(os.pathsep) if entry] or [ROOT]
+    paths = []
+    for entry in entries:
+        if os.path.isdir(entry):
+            paths.extend(sorted(glob.glob(os.path.join(entry, "*", CONFIG_FILENAME))))
+            if os.path.isfile(os.path.join(entry, CONFIG_FILENAME)):
+                paths.append(os.path.join(entry, CONFIG_FILENAME))
+        else:
+            paths.append(entry)
+    return paths
+
+
+def discover(search_path=None):
+    """Map domain name -> :class:`DomainConfig` for every config on the search path."""
+    configs = {}
+    for path in config_paths(search_path):
+        config = DomainConfig.from_file(path)
+        if config.name in configs:
+            raise ValueError(f"Domain {config.name!r} is declared by both {configs[config.name].path} and {path}")
+        configs[config.name] = config
+    return configs
+
+
+class DomainRegistry:
+    """The configured domains; each is built once, on first use, and then reused."""
+
+    def __init__(self, configs):
+        self.configs = dict(configs)
+        self._domains = {}
+        self._lock = threading.Lock()
+        self._build_lock = None
+
+    def names(self):
+        return sorted(self.configs)
+
+    def loaded(self):
+        return dict(self._domains)
+
+    def get(self, name):
+        """The built :class:`agent_core.agents.Domain` for ``name`` (KeyError if not configured)."""
+        domain = self._domains.get(name)
+        if domain is not None:
+            return domain
+        config = self.configs[name]
+        with self._lock:
+            if name not in self._domains:
+                from dotenv import load_dotenv
+
+                # The domain folder's .env (API keys, overrides) applies before its clients are created
+                load_dotenv(os.path.join(config.base_dir, ".env"))
+                from agent_core.agents import Domain
+
+                logger.info("Loading domain %s", name)
+                self._domains[name] = Domain(config)
+        return self._domains[name]
+
+    async def aget(self, name):
+        """:meth:`get` for the event loop: a first-time build (imports, index load) runs in a thread."""
+        domain = self._domains.get(name)
+        if domain is not None:
+            return domain
+        if name not in self.configs:
+            raise KeyError(name)
+        if self._build_lock is None:
+            self._build_lock = asyncio.Lock()
+        # One build at a time: concurrent first requests wait for it instead of repeating it
+        async with self._build_lock:
+            if name not in self._domains:
+                await asyncio.to_thread(self.get, name)
+        return self._domains[name]
+
+
+_registry = None
+
+
+def get_registry():
+    """The process-wide registry over ``DOMAINS_PATH`` (discovered on first call)."""
+    global _registry
+    if _registry is None:
+        _registry = DomainRegistry(discover())
+    return _registry
+
+
+def get_domain(name):
+    return get_registry().get(name)
@@ -0,0 +1,272 @@
+"""Persistent embedding cache shared by the ingesters and the agents.
+
+Vectors are stored as float32 blobs in SQLite, keyed by model name plus
+normalized text, with an in-memory LRU in front and a size bound on disk.
+"""
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+
+from agent_core.telemetry import counter, current_span, span
+
+EMBEDDING_CACHE_LOOKUPS = counter("agent_embedding_cache_lookups_total", "Embedding cache lookups by outcome",
+                                  ("result",))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Normalization used for cache keys: NFC, case-folded, whitespace collapsed."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip().casefold()
+
+
+def cache_key(model, text):
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-level (memory LRU + SQLite) embedding store with hit/miss counters.
+
+    The ``a``-prefixed methods serve memory hits on the event loop and run any
+    SQLite work in a worker thread. Memory hits refresh the on-disk
+    ``last_used`` in batches (with the next disk access, or every
+    ``touch_batch`` hits), so the entries used most are not the first evicted.
+    """
+
+    def __init__(self, path, max_entries=200_000, memory_entries=4096, touch_batch=256):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.touch_batch = touch_batch
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._touched = {}
+        # _lock guards the memory LRU and counters (held briefly, also on the event loop); _db_lock the connection
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _from_memory(self, keys):
+        found = {}
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self._touched[key] = now
+        return found
+
+    def _write_touched(self):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if touched:
+            self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                   [(used, key) for key, used in touched.items()])
+
+    def _load(self, keys):
+        """Read ``keys`` from SQLite and write back pending ``last_used`` updates (blocking)."""
+        found = {}
+        now = time.time()
+        with self._db_lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            with self._lock:
+                for key, vector in found.items():
+                    self._remember(key, vector)
+                    self._touched[key] = now
+                self.disk_hits += len(found)
+            self._write_touched()
+            self._conn.commit()
+        return found
+
+    def _needs_disk(self, keys, found):
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        return missing, bool(missing) or len(self._touched) >= self.touch_batch
+
+    def _results(self, keys, found):
+        results = [found.get(key) for key in keys]
+        hit_count = sum(1 for r in results if r is not None)
+        with self._lock:
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        EMBEDDING_CACHE_LOOKUPS.inc(hit_count, result="hit")
+        EMBEDDING_CACHE_LOOKUPS.inc(len(results) - hit_count, result="miss")
+        current = current_span()
+        current.add("embedding_cache_hits", hit_count)
+        current.add("embedding_cache_misses", len(results) - hit_count)
+        return results
+
+    def get_many(self, model, texts):
+        """Return one cached vector (or None) per text."""
+        keys = [cache_key(model, t) for t in texts]
+        found = self._from_memory(keys)
+        missing, disk = self._needs_disk(keys, found)
+        if disk:
+            found.update(self._load(missing))
+        return self._results(keys, found)
+
+    async def aget_many(self, model, texts):
+        """:meth:`get_many` without blocking the event loop on SQLite."""
+        keys = [cache_key(model, t) for t in texts]
+        found = self._from_memory(keys)
+        missing, disk = self._needs_disk(keys, found)
+        if disk:
+            found.update(await asyncio.to_thread(self._load, missing))
+        return self._results(keys, found)
+
+    def _rows(self, model, texts, vectors):
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = cache_key(model, text)
+                self._remember(key, list(vector))
+                rows.append((key, model, array("f", vector).tobytes(), now))
+        return rows
+
+    def _store(self, rows):
+        keys = list(dict.fromkeys(row[0] for row in rows))
+        with self._db_lock:
+            existing = 0
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                existing += self._conn.execute(
+                    f"SELECT COUNT(*) FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchone()[0]
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._count += len(keys) - existing
+            self._evict()
+            self._conn.commit()
+
+    def put_many(self, model, texts, vectors):
+        self._store(self._rows(model, texts, vectors))
+
+    async def aput_many(self, model, texts, vectors):
+        """:meth:`put_many` without blocking the event loop on SQLite."""
+        await asyncio.to_thread(self._store, self._rows(model, texts, vectors))
+
+    def _evict(self):
+        if self._count <= self.max_entries:
+            return
+        # Other processes may share the file: recount before deleting anything
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            self.evictions += excess
+            self._count -= excess
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self):
+        with self._db_lock:
+            self._write_touched()
+            self._conn.commit()
+            self._conn.close()
+
+
+def _split(vectors, texts):
+    misses = [i for i, v in enumerate(vectors) if v is None]
+    return misses, [texts[i] for i in misses]
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain ``Embeddings`` wrapper that consults an :class:`EmbeddingCache` first."""
+
+    def __init__(self, embeddings, cache, model=None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model or getattr(embeddings, "model", "default")
+
+    def embed_documents(self, texts):
+        vectors = self.cache.get_many(self.model, texts)
+        misses, miss_texts = _split(vectors, texts)
+        if miss_texts:
+            fresh = self.embeddings.embed_documents(miss_texts)
+            self.cache.put_many(self.model, miss_texts, fresh)
+            for i, vector in zip(misses, fresh):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text):
+        vector = self.cache.get_many(self.model, [text])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put_many(self.model, [text], [vector])
+        return vector
+
+    async def aembed_documents(self, texts):
+        vectors = await self.cache.aget_many(self.model, texts)
+        misses, miss_texts = _split(vectors, texts)
+        if miss_texts:
+            fresh = await self.embeddings.aembed_documents(miss_texts)
+            await self.cache.aput_many(self.model, miss_texts, fresh)
+            for i, vector in zip(misses, fresh):
+                vectors[i] = vector
+        return vectors
+
+    async def aembed_query(self, text):
+        with span("embed_query"):
+            vector = (await self.cache.aget_many(self.model, [text]))[0]
+            if vector is None:
+                vector = await self.embeddings.aembed_query(text)
+                await self.cache.aput_many(self.model, [text], [vector])
+        return vector
+
+
+def cached_embedder(cache, model, embed_batch):
+    """Wrap an async ``embed_batch`` callable (see agent_core.ingestion) with the cache."""
+    async def embed(texts):
+        vectors = await cache.aget_many(model, texts)
+        misses, miss_texts = _split(vectors, texts)
+        if miss_texts:
+            fresh = await embed_batch(miss_texts)
+            await cache.aput_many(model, miss_texts, fresh)
+            for i, vector in zip(misses, fresh):
+                vectors[i] = vector
+        return vectors
+    return embed
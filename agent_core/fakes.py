@@ -0,0 +1,203 @@
+"""Local stand-ins for the OpenAI API and a Pinecone index.
+
+They let the ingestion and retrieval code run offline, with configurable latency
+and injected rate-limit failures, so behaviour and throughput can be measured
+without credentials. :class:`FakeOpenAIServer` speaks the OpenAI HTTP protocol
+(embeddings and chat completions, streamed or not), so the real clients and
+connection pool can be pointed at it via ``OPENAI_BASE_URL``.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import time
+
+import numpy as np
+
+
+class FakeRateLimitError(Exception):
+    """Mimics an OpenAI/Pinecone error carrying an HTTP status."""
+
+    def __init__(self, status_code=429, message="rate limited"):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def fake_vector_array(text, dimension=1536):
+    """Deterministic float32 unit vector derived from the text, so equal texts embed equally."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    values = np.random.default_rng(seed).uniform(-1.0, 1.0, dimension).astype(np.float32)
+    return values / (np.linalg.norm(values) or 1.0)
+
+
+def fake_vector(text, dimension=1536):
+    return fake_vector_array(text, dimension).tolist()
+
+
+class FakeEmbeddings:
+    """Async embedding endpoint with per-request latency and optional failure injection."""
+
+    def __init__(self, dimension=1536, latency=0.0, per_item_latency=0.0, failure_rate=0.0, seed=0):
+        self.dimension = dimension
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.inputs = 0
+        self._rng = random.Random(seed)
+
+    async def embed_batch(self, texts):
+        self.calls += 1
+        await asyncio.sleep(self.latency + self.per_item_latency * len(texts))
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise FakeRateLimitError()
+        self.inputs += len(texts)
+        return [fake_vector(t, self.dimension) for t in texts]
+
+
+class FakeIndex:
+    """In-memory vector store with Pinecone's ``upsert``/``delete``/``fetch`` shape."""
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.vectors = {}
+        self.upsert_calls = 0
+        self._rng = random.Random(seed)
+
+    async def upsert_batch(self, vectors):
+        self.upsert_calls += 1
+        await asyncio.sleep(self.latency)
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise FakeRateLimitError(status_code=503, message="service unavailable")
+        self.upsert(vectors)
+
+    def upsert(self, vectors):
+        for vector in vectors:
+            self.vectors[vector["id"]] = vector
+
+    def delete(self, ids):
+        for vector_id in ids:
+            self.vectors.pop(vector_id, None)
+
+    def fetch(self, ids):
+        return {vector_id: self.vectors[vector_id] for vector_id in ids if vector_id in self.vectors}
+
+
+class FakeOpenAIServer:
+    """OpenAI-compatible HTTP server for ``/v1/embeddings`` and ``/v1/chat/completions``.
+
+    ``embed_latency`` is added per embeddings request, ``chat_latency`` before the
+    first chat token and ``token_latency`` between streamed tokens. Every answer
+    is ``response_tokens`` tokens long. A ``failure_rate`` share of chat requests
+    is rejected with 429 and a short ``Retry-After``, like a rate-limited account.
+    """
+
+    def __init__(self, dimension=1536, embed_latency=0.0, chat_latency=0.0, token_latency=0.0,
+                 response_tokens=40, failure_rate=0.0, host="127.0.0.1", port=0, seed=0):
+        self.dimension = dimension
+        self.embed_latency = embed_latency
+        self.chat_latency = chat_latency
+        self.token_latency = token_latency
+        self.response_tokens = response_tokens
+        self.failure_rate = failure_rate
+        self.host = host
+        self.port = port
+        self.requests = {"embeddings": 0, "chat": 0, "embedded_inputs": 0, "rate_limited": 0}
+        self._runner = None
+        self._rng = random.Random(seed)
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self):
+        from aiohttp import web
+
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v1/embeddings", self._embeddings)
+        app.router.add_post("/v1/chat/completions", self._chat)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _embeddings(self, request):
+        from aiohttp import web
+
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        if inputs and isinstance(inputs[0], int):
+            inputs = [inputs]  # A single pre-tokenized input
+        self.requests["embeddings"] += 1
+        self.requests["embedded_inputs"] += len(inputs)
+        await asyncio.sleep(self.embed_latency)
+        data = []
+        for i, item in enumerate(inputs):
+            # Token-id inputs (as LangChain sends them) hash like their text would
+            vector = fake_vector_array(item if isinstance(item, str) else json.dumps(item), self.dimension)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(len(item) if isinstance(item, list) else len(item.split()) for item in inputs)
+        return web.json_response({"object": "list", "data": data, "model": body.get("model", "fake"),
+                                  "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    def _tokens(self):
+        return [f"token{i} " for i in range(self.response_tokens)]
+
+    async def _chat(self, request):
+        from aiohttp import web
+
+        body = await request.json()
+        self.requests["chat"] += 1
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            self.requests["rate_limited"] += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status=429, headers={"Retry-After": "0.05"})
+        created = int(time.time())
+        model = body.get("model", "fake")
+        await asyncio.sleep(self.chat_latency)
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in body.get("messages", []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": self.response_tokens,
+                 "total_tokens": prompt_tokens + self.response_tokens}
+        if not body.get("stream"):
+            await asyncio.sleep(self.token_latency * self.response_tokens)
+            return web.json_response({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(self._tokens())}}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(delta, finish_reason=None):
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+
+        for i, token in enumerate(self._tokens()):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            await send({"role": "assistant", "content": token} if i == 0 else {"content": token})
+        await send({}, finish_reason="stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": [], "usage": usage}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
@@ -0,0 +1,215 @@
+"""Ingest a configured domain's CSV into its index.
+
+Run from the repository root (or through an agent folder's ingest script)::
+
+    python -m agent_core.ingest --domain order [--rebuild] [--data other.csv]
+
+The CSV is read in chunks that worker processes parse, clean and validate
+(``keyed`` or ``labeled`` schema, see :mod:`agent_core.domains`), a bounded
+number ahead of the upload. Only rows that are new or changed since the last run
+(per the manifest) are embedded, and vectors for rows that disappeared are
+deleted. Rows longer than the domain's ``chunk_tokens`` are embedded as
+overlapping chunks (see :mod:`agent_core.chunking`). ``--rebuild`` drops the index first. Hybrid domains also maintain their
+BM25 index (:mod:`agent_core.lexical`) from the same records and deletions.
+Embedding calls run at batch priority (see :mod:`agent_core.scheduler`).
+"""
+import argparse
+import asyncio
+import csv
+import functools
+import os
+import platform
+import sys
+
+from agent_core.chunking import chunk_record
+from agent_core.clients import (ROOT, close_clients, disable_sdk_retries, get_embedding_cache, get_index,
+                                get_lexical_index, get_openai, get_pinecone, get_vector_backend, pool_stats)
+from agent_core.ingestion import openai_embedder, parallel_map, pinecone_writer
+from agent_core.records import clean_health_chunk, clean_order_chunk, iter_csv_chunks
+from agent_core.sanitize import install_httpx_header_patch
+from agent_core.scheduler import BATCH, call_priority
+from agent_core.sync import incremental_sync, prepare_index, stable_id
+from agent_core.telemetry import configure_logging, get_logger
+
+logger = get_logger(__name__)
+
+# Ingestion settings (manifest location, by default at the repository root, and batching knobs)
+MANIFEST_PATH = os.environ.get("INGEST_MANIFEST_PATH", os.path.join(ROOT, ".ingest_manifest.json"))
+EMBED_MODEL = "text-embedding-ada-002"
+EMBED_BATCH_SIZE = int(os.environ.get("INGEST_EMBED_BATCH_SIZE", "100"))
+UPSERT_BATCH_SIZE = int(os.environ.get("INGEST_UPSERT_BATCH_SIZE", "100"))
+INGEST_CONCURRENCY = int(os.environ.get("INGEST_CONCURRENCY", "4"))
+INGEST_CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", "1000"))
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", str(os.cpu_count() or 1)))
+
+CHUNK_CLEANERS = {"keyed": clean_order_chunk, "labeled": clean_health_chunk}
+
+
+def _keyed_record(record):
+    # Stable vector ID from the row key rather than the row position; Pinecone metadata values must be strings
+    metadata = {str(key): value if isinstance(value, str) else str(value) for key, value in record["metadata"].items()}
+    return {"id": stable_id(key=record["id"]), "text": record["text"], "metadata": metadata}
+
+
+def _labeled_record(record):
+    # Labeled CSVs have no row key, so IDs come from the content itself
+    return {"id": stable_id(text=record["text"]), "text": record["text"], "metadata": record["metadata"]}
+
+
+def _prepare_chunk(schema, max_tokens, overlap, chunk):
+    """Clean one CSV chunk into sync records, splitting long texts; runs in a worker process."""
+    records, skipped = CHUNK_CLEANERS[schema](chunk)
+    to_record = _keyed_record if schema == "keyed" else _labeled_record
+    return [piece for record in records for piece in chunk_record(to_record(record), max_tokens, overlap)], skipped
+
+
+async def read_records(config, path=None, chunksize=INGEST_CHUNK_SIZE, workers=INGEST_WORKERS):
+    """Yield lists of sync records (``{"id", "text", "metadata"}``), one per CSV chunk, in file order."""
+    prepare = functools.partial(_prepare_chunk, config.schema, config.chunk_tokens, config.chunk_overlap)
+    chunks = iter_csv_chunks(path or config.data_path, chunksize)
+    async for records, skipped in parallel_map(prepare, chunks, workers=workers):
+        if skipped:
+            logger.warning("Skipping %d invalid rows", len(skipped), extra={"rows": skipped})
+        if records:
+            yield records
+
+
+async def sync_records(config, records, manifest):
+    """Incrementally sync ``records`` (an async iterable) into the domain's index; returns the sync summary."""
+    from agent_core.embedding_cache import cached_embedder
+
+    index = get_index(config.index_name)
+    # Shared OpenAI client on the process-wide, keep-alive connection pool
+    embed = cached_embedder(get_embedding_cache(), EMBED_MODEL, openai_embedder(get_openai(), EMBED_MODEL))
+    upsert_batch, delete_batch = pinecone_writer(index)
+    lexical = get_lexical_index(config.index_name) if config.hybrid else None
+    if lexical is not None:
+        records = _indexed_lexically(records, lexical)
+        delete_vectors = delete_batch
+
+        async def delete_batch(ids):
+            await delete_vectors(ids)
+            lexical.delete(ids)
+
+    try:
+        # Interactive queries in the same process are served ahead of ingestion traffic
+        with call_priority(BATCH):
+            return await incremental_sync(
+                records,
+                manifest,
+                embed,
+                upsert_batch,
+                delete_batch,
+                embed_batch_size=EMBED_BATCH_SIZE,
+                upsert_batch_size=UPSERT_BATCH_SIZE,
+                max_concurrency=INGEST_CONCURRENCY,
+            )
+    finally:
+        if get_vector_backend() == "local":
+            index.save()
+        if lexical is not None:
+            lexical.save()
+
+
+async def _indexed_lexically(records, lexical):
+    # Every record read goes through the BM25 index (unchanged ones are skipped there),
+    # so it also catches up on rows the manifest already considers embedded
+    async for record in records:
+        lexical.upsert([record])
+        yield record
+
+
+async def ingest(config, path=None, rebuild=False):
+    """Read, clean and sync the domain's CSV; returns the sync summary (None if nothing was read)."""
+    path = path or config.data_path
+    if get_vector_backend() == "pinecone":
+        get_pinecone()
+    # Track what is already embedded so re-runs only touch new/changed rows;
+    # the index is only dropped on an explicit full rebuild, otherwise it is synced in place
+    manifest = prepare_index(config.index_name, MANIFEST_PATH, rebuild=rebuild)
+    if rebuild and config.hybrid:
+        get_lexical_index(config.index_name).clear()
+    try:
+        chunks = read_records(config, path)
+        first_chunk = await anext(chunks, None)
+        if not first_chunk:
+            await chunks.aclose()
+            logger.error("No valid documents to ingest!")
+            return None
+
+        read = 0
+
+        async def records():
+            nonlocal read
+            chunk = first_chunk
+            while chunk is not None:
+                read += len(chunk)
+                logger.info("Read %d %s documents (%d so far)", len(chunk), config.name, read)
+                for record in chunk:
+                    yield record
+                chunk = await anext(chunks, None)
+
+        summary = await sync_records(config, records(), manifest)
+        logger.info("Ingestion stats", extra={"stats": summary})
+        logger.info("Embedding cache", extra={"stats": get_embedding_cache().stats()})
+        logger.info("HTTP pool", extra={"stats": pool_stats()})
+        logger.info("Ingested %d/%d %s documents", summary["embedded"] + summary["unchanged"], read, config.name)
+        if get_vector_backend() == "pinecone":
+            await asyncio.sleep(5)  # Ensure index updates
+        return summary
+    except FileNotFoundError:
+        logger.error("'%s' not found!", path)
+    except csv.Error as e:
+        logger.error("CSV parsing failed: %s. Check file format.", e)
+    except Exception as e:
+        logger.exception("Error during ingestion: %s", e)
+    return None
+
+
+async def run(config, path=None, rebuild=False):
+    try:
+        return await ingest(config, path, rebuild)
+    finally:
+        await close_clients()
+
+
+def main(config_path=None, argv=None):
+    """CLI entry point; the agent folders' ingest scripts pass their own ``domain.json``."""
+    from dotenv import load_dotenv
+
+    from agent_core.domains import DomainConfig, get_registry
+
+    parser = argparse.ArgumentParser(description="Ingest a domain's CSV into its vector index.")
+    if config_path is None:
+        parser.add_argument("--domain", required=True, help="Domain name, or the path of a domain.json")
+    parser.add_argument("--data", help="CSV to ingest instead of the domain's data_path")
+    parser.add_argument("--rebuild", action="store_true", help="Drop and rebuild the index")
+    args = parser.parse_args(argv)
+
+    if config_path is None:
+        if os.path.isfile(args.domain):
+            config_path = args.domain
+        elif args.domain in get_registry().configs:
+            config_path = get_registry().configs[args.domain].path
+        else:
+            parser.error(f"unknown domain: {args.domain}")
+    config = DomainConfig.from_file(config_path)
+    load_dotenv(os.path.join(config.base_dir, ".env"))
+    load_dotenv()
+    configure_logging()
+    # Monkey-patch httpx to handle encoding issues in headers
+    install_httpx_header_patch()
+    # BatchIngestor retries failed calls itself; SDK retries underneath would multiply them
+    disable_sdk_retries()
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(encoding="utf-8")
+
+    coroutine = run(config, args.data, args.rebuild)
+    if platform.system() == "Emscripten":
+        asyncio.ensure_future(coroutine)
+    else:
+        asyncio.run(coroutine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""Batched, retrying embed-and-upsert machinery shared by the ingesters and the batch runner.
+
+:class:`BatchIngestor` embeds records in concurrent batches and upserts them
+while later batches are embedded, retrying transient failures with jittered
+backoff; :func:`parallel_map` cleans CSV chunks in worker processes.
+"""
+import asyncio
+import collections
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from agent_core.telemetry import counter, get_logger, histogram
+
+logger = get_logger(__name__)
+
+INGEST_DOCS = counter("agent_ingest_docs_total", "Documents upserted by the ingesters")
+INGEST_FAILED = counter("agent_ingest_failed_total", "Documents that failed to embed or upsert", ("stage",))
+INGEST_RETRIES = counter("agent_ingest_retries_total", "Retried embedding/upsert calls", ("stage",))
+INGEST_CALL_SECONDS = histogram("agent_ingest_call_seconds", "Latency of successful embedding/upsert calls",
+                                ("stage",))
+
+
+# HTTP statuses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUSES = {408, 409, 429}
+
+
+def _status_of(exc):
+    """Return the HTTP status attached to an OpenAI or Pinecone exception, if any."""
+    for attr in ("status_code", "status"):
+        status = getattr(exc, attr, None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def _transient_errors():
+    """Exception types for dropped connections and timeouts, including the SDKs' own wrappers."""
+    import httpx
+    import openai
+
+    # APITimeoutError is an APIConnectionError; neither carries a status
+    return asyncio.TimeoutError, ConnectionError, httpx.TransportError, openai.APIConnectionError
+
+
+def is_retryable(exc):
+    """Decide whether a failed embedding/upsert call should be retried."""
+    if isinstance(exc, _transient_errors()):
+        return True
+    status = _status_of(exc)
+    return status is not None and (status in RETRYABLE_STATUSES or status >= 500)
+
+
+def is_rate_limited(exc):
+    """True for HTTP 429 (too many requests) errors."""
+    return _status_of(exc) == 429
+
+
+def retry_after(exc):
+    """Read a Retry-After header (seconds) from the exception's response, if present."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class IngestStats:
+    """Counters and per-stage latencies collected during one ingestion run."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.docs = 0
+        self.failed = 0
+        self.batches = 0
+        self.retries = 0
+        self.latencies = {"embed": [], "upsert": []}
+
+    @property
+    def elapsed(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    @property
+    def docs_per_sec(self):
+        return self.docs / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        stages = {}
+        for stage, values in self.latencies.items():
+            stages[stage] = {
+                "calls": len(values),
+                "p50_ms": round(_percentile(values, 50) * 1000, 2),
+                "p95_ms": round(_percentile(values, 95) * 1000, 2),
+                "max_ms": round(max(values) * 1000, 2) if values else 0.0,
+            }
+        return {
+            "docs": self.docs,
+            "failed": self.failed,
+            "batches": self.batches,
+            "retries": self.retries,
+            "elapsed_s": round(self.elapsed, 3),
+            "docs_per_sec": round(self.docs_per_sec, 2),
+            "stages": stages,
+        }
+
+
+def _batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def aiterate(items):
+    """Iterate a plain or async iterable with ``async for``."""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def _abatched(items, size):
+    batch = []
+    async for item in aiterate(items):
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def prefetch(iterable, max_pending=2):
+    """Consume a blocking iterable (e.g. a chunked CSV reader) in a worker thread.
+
+    At most ``max_pending`` items are read ahead of the consumer, so the producer
+    keeps parsing the next chunk while the current one is being uploaded but never
+    runs away from it. Exceptions raised by the iterable surface in the consumer.
+    """
+    iterator = iter(iterable)
+    done = object()
+    queue = asyncio.Queue(maxsize=max(1, max_pending))
+
+    async def produce():
+        while True:
+            try:
+                item = await asyncio.to_thread(next, iterator, done)
+            except Exception as e:
+                await queue.put((None, e))
+                return
+            await queue.put((item, None))
+            if item is done:
+                return
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item, error = await queue.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        producer.cancel()
+
+
+async def parallel_map(fn, chunks, workers=None, max_pending=None):
+    """Apply ``fn`` to each chunk in a pool of worker processes, yielding results in input order.
+
+    ``chunks`` is a blocking iterable read in a worker thread (see :func:`prefetch`);
+    ``fn`` must be a picklable module-level function. ``workers`` defaults to the
+    CPU count; at most ``max_pending`` (default two per worker) chunks are
+    submitted ahead of the consumer. With one worker, chunks are processed in a
+    thread instead.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        async for result in prefetch(map(fn, chunks)):
+            yield result
+        return
+    max_pending = max_pending or workers * 2
+    loop = asyncio.get_running_loop()
+    # Workers start from a clean interpreter: forking a process that runs an event loop and
+    # client threads can copy held locks into the child
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+    pending = collections.deque()
+    try:
+        async for chunk in prefetch(chunks, max_pending=max_pending):
+            pending.append(loop.run_in_executor(pool, fn, chunk))
+            if len(pending) >= max_pending:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class BatchIngestor:
+    """Embed and upsert records in batches, overlapping the two stages.
+
+    ``embed_batch`` is an async callable taking a list of texts and returning one
+    vector per text; ``upsert_batch`` is an async callable taking a list of
+    Pinecone-style vector dicts. Records are dicts with ``id``, ``text`` and
+    ``metadata`` keys, given as a list or a (possibly async) iterable that is
+    only read as fast as batches can be embedded. Up to ``max_concurrency``
+    embedding batches are in flight at once while finished batches are upserted
+    in ``upsert_batch_size`` chunks.
+    """
+
+    def __init__(self, embed_batch, upsert_batch, embed_batch_size=100, upsert_batch_size=100,
+                 max_concurrency=4, upsert_concurrency=2, max_retries=5, base_delay=1.0,
+                 max_delay=30.0, on_upserted=None):
+        self.embed_batch = embed_batch
+        self.upsert_batch = upsert_batch
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.upsert_batch_size = max(1, upsert_batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.upsert_concurrency = max(1, upsert_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_upserted = on_upserted
+
+    async def _call(self, stage, fn, payload, stats):
+        """Invoke one stage call, retrying retryable failures with jittered exponential backoff."""
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                result = await fn(payload)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = retry_after(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                attempt += 1
+                stats.retries += 1
+                INGEST_RETRIES.inc(stage=stage)
+                logger.warning("%s call failed (%s); retry %d/%d in %.2fs", stage, e, attempt, self.max_retries, delay)
+                await asyncio.sleep(delay)
+                continue
+            elapsed = time.perf_counter() - start
+            stats.latencies[stage].append(elapsed)
+            INGEST_CALL_SECONDS.observe(elapsed, stage=stage)
+            return result
+
+    async def _embed(self, batch, queue, stats):
+        try:
+            vectors = await self._call("embed", self.embed_batch, [r["text"] for r in batch], stats)
+            if len(vectors) != len(batch):
+                raise ValueError(f"expected {len(batch)} embeddings, got {len(vectors)}")
+        except Exception as e:
+            logger.error("Failed to embed batch of %d documents: %s", len(batch), e)
+            stats.failed += len(batch)
+            INGEST_FAILED.inc(len(batch), stage="embed")
+            return
+        items = [
+            {"id": r["id"], "values": v, "metadata": {"text": r["text"], **r.get("metadata", {})}}
+            for r, v in zip(batch, vectors)
+        ]
+        await queue.put(items)
+
+    async def _embed_stage(self, records, queue, stats):
+        slots = asyncio.Semaphore(self.max_concurrency)
+        tasks = set()
+        try:
+            async for batch in _abatched(records, self.embed_batch_size):
+                await slots.acquire()
+                stats.batches += 1
+                task = asyncio.create_task(self._embed(batch, queue, stats))
+                task.add_done_callback(lambda _: slots.release())
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except BaseException:
+            # The record source failed: abandon the batches still in flight
+            for task in tasks:
+                task.cancel()
+            raise
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def _upsert_stage(self, queue, stats):
+        while True:
+            items = await queue.get()
+            if items is None:
+                return
+            for chunk in _batched(items, self.upsert_batch_size):
+                try:
+                    await self._call("upsert", self.upsert_batch, chunk, stats)
+                except Exception as e:
+                    logger.error("Failed to upsert %d vectors: %s", len(chunk), e)
+                    stats.failed += len(chunk)
+                    INGEST_FAILED.inc(len(chunk), stage="upsert")
+                    continue
+                stats.docs += len(chunk)
+                INGEST_DOCS.inc(len(chunk))
+                if self.on_upserted is not None:
+                    self.on_upserted([item["id"] for item in chunk])
+
+    async def run(self, records, stats=None):
+        """Ingest ``records`` and return an :class:`IngestStats` for the run (or add to ``stats``)."""
+        stats = stats or IngestStats()
+        queue = asyncio.Queue(maxsize=self.max_concurrency)
+        upserters = [asyncio.create_task(self._upsert_stage(queue, stats))
+                     for _ in range(self.upsert_concurrency)]
+        try:
+            await self._embed_stage(records, queue, stats)
+            for _ in upserters:
+                await queue.put(None)
+            await asyncio.gather(*upserters)
+        finally:
+            for task in upserters:
+                task.cancel()
+        stats.finished = time.perf_counter()
+        return stats
+
+
+def openai_embedder(client, model):
+    """Adapt an ``openai.AsyncOpenAI`` client to the ``embed_batch`` callable shape."""
+    async def embed_batch(texts):
+        # One request embeds the whole batch; results come back tagged with their input index
+        response = await client.embeddings.create(input=texts, model=model)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    return embed_batch
+
+
+def pinecone_writer(index):
+    """Return async ``(upsert_batch, delete_batch)`` callables for a Pinecone index handle."""
+    async def upsert_batch(vectors):
+        # The Pinecone client is synchronous, so keep it off the event loop
+        await asyncio.to_thread(index.upsert, vectors=vectors)
+
+    async def delete_batch(ids):
+        await asyncio.to_thread(index.delete, ids=ids)
+
+    return upsert_batch, delete_batch
@@ -0,0 +1,234 @@
+"""Local BM25 inverted index for exact-token retrieval next to the vector index.
+
+Order questions hinge on exact tokens (order numbers, tracking codes) that
+embeddings blur. The ingesters keep one :class:`LexicalIndex` per vector index
+in step with it: every row read is upserted (unchanged texts are skipped) and
+deleted rows are removed, so the index is updated incrementally rather than
+rebuilt. It lives in memory as postings (term -> {doc id: term frequency}) and
+is saved as ``<LEXICAL_INDEX_DIR>/<index>.json`` holding the documents; running
+agents reload it when the ingester saves a newer version.
+
+Text is lower-cased and split into alphanumeric tokens, so "#1234" and
+"tracking: XYZ" yield the terms ``1234`` and ``xyz``. Identifiers in a query
+(tokens with a digit, ``#`` numbers, and upper-case codes in mixed-case text)
+can be matched exactly with :meth:`LexicalIndex.exact`.
+"""
+import collections
+import json
+import math
+import os
+import re
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_RAW_TOKEN = re.compile(r"#?[A-Za-z0-9]+")
+
+# Too common in questions to say anything about the document
+STOPWORDS = frozenset(
+    "a an and are can do does for from has have how i in is it my of on or the to was what when where "
+    "which who why will with you your".split())
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+def identifiers(query):
+    """The exact-match identifier terms in ``query``: ``#`` numbers, tokens with digits, upper-case codes."""
+    mixed_case = any(ch.islower() for ch in query)
+    found = []
+    for raw in _RAW_TOKEN.findall(query):
+        token = raw.lstrip("#")
+        if raw.startswith("#") or any(ch.isdigit() for ch in token) or (
+                mixed_case and len(token) >= 3 and token.isupper()):
+            found.append(token.lower())
+    return list(dict.fromkeys(found))
+
+
+def matches_filter(metadata, filter):
+    """Evaluate the subset of Pinecone's filter language the agents use against one metadata dict."""
+    for field, condition in filter.items():
+        if field == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if field == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        value = metadata.get(field)
+        for op, operand in condition.items():
+            if op == "$eq":
+                ok = value == operand
+            elif op == "$ne":
+                ok = value != operand
+            elif op == "$in":
+                ok = value in operand
+            elif op == "$nin":
+                ok = value not in operand
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            if not ok:
+                return False
+    return True
+
+
+# The in-memory index: docs (id -> (text, metadata, length)), postings (term -> {id: tf}) and the
+# summed length. refresh() swaps in a new one with a single assignment and every search reads the
+# reference once, so a search overlapping a reload never mixes the two versions
+_State = collections.namedtuple("_State", "docs postings total_length")
+
+
+def _empty():
+    return _State({}, {}, 0)
+
+
+def _add(state, doc_id, text, metadata):
+    counts = {}
+    for term in tokenize(text):
+        counts[term] = counts.get(term, 0) + 1
+    length = sum(counts.values())
+    state.docs[doc_id] = (text, metadata, length)
+    for term, tf in counts.items():
+        state.postings.setdefault(term, {})[doc_id] = tf
+    return state._replace(total_length=state.total_length + length)
+
+
+def _remove(state, doc_id):
+    text, _, length = state.docs.pop(doc_id)
+    for term in set(tokenize(text)):
+        postings = state.postings.get(term)
+        if postings is not None:
+            postings.pop(doc_id, None)
+            if not postings:
+                del state.postings[term]
+    return state._replace(total_length=state.total_length - length)
+
+
+class LexicalIndex:
+    """BM25 (``k1``, ``b``) over ``{"id", "text", "metadata"}`` records; see the module docstring."""
+
+    def __init__(self, path, k1=1.2, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._loaded_mtime = None
+        self._state = _empty()
+        self.refresh()
+
+    def __len__(self):
+        return len(self._state.docs)
+
+    def refresh(self):
+        """(Re)load from disk if another process saved a newer version."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        with open(self.path, encoding="utf-8") as f:
+            records = json.load(f)
+        state = _empty()
+        for doc_id, text, metadata in zip(records["ids"], records["texts"], records["metadatas"]):
+            state = _add(state, doc_id, text, metadata)
+        # Built aside and swapped in with one assignment: a search running in another thread keeps the state it
+        # started with
+        self._state = state
+        self._loaded_mtime = mtime
+
+    def save(self):
+        """Persist atomically (write to a temporary file, then rename)."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        docs = self._state.docs
+        ids = list(docs)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "texts": [docs[i][0] for i in ids],
+                       "metadatas": [docs[i][1] for i in ids]}, f)
+        os.replace(tmp, self.path)
+        self._loaded_mtime = os.stat(self.path).st_mtime
+
+    def clear(self):
+        self._state = _empty()
+
+    def upsert(self, records):
+        """Add or replace records; a record whose text and metadata are unchanged is left alone."""
+        state = self._state
+        changed = 0
+        for record in records:
+            doc_id = record["id"]
+            metadata = {key: value for key, value in (record.get("metadata") or {}).items() if key != "text"}
+            existing = state.docs.get(doc_id)
+            if existing is not None:
+                if existing[0] == record["text"] and existing[1] == metadata:
+                    continue
+                state = _remove(state, doc_id)
+            state = _add(state, doc_id, record["text"], metadata)
+            changed += 1
+        self._state = state
+        return changed
+
+    def delete(self, ids):
+        state = self._state
+        for doc_id in ids:
+            if doc_id in state.docs:
+                state = _remove(state, doc_id)
+        self._state = state
+
+    @staticmethod
+    def _result(state, doc_id, score):
+        text, metadata, _ = state.docs[doc_id]
+        return doc_id, score, text, metadata
+
+    @staticmethod
+    def _allowed(state, doc_id, filter):
+        return not filter or matches_filter(state.docs[doc_id][1], filter)
+
+    def _scores(self, state, query, candidates=None):
+        """BM25 score per document for the query's terms (limited to ``candidates`` if given)."""
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term not in STOPWORDS]
+        n = len(state.docs)
+        if not terms or not n:
+            return {}
+        avg_length = state.total_length / n
+        scores = {}
+        for term in terms:
+            postings = state.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                if candidates is not None and doc_id not in candidates:
+                    continue
+                length = state.docs[doc_id][2]
+                norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+        return scores
+
+    def search(self, query, top_k=5, filter=None):
+        """Up to ``top_k`` ``(id, bm25_score, text, metadata)`` tuples, best first."""
+        state = self._state
+        ranked = sorted(self._scores(state, query).items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for doc_id, score in ranked:
+            if self._allowed(state, doc_id, filter):
+                results.append(self._result(state, doc_id, round(score, 4)))
+                if len(results) >= top_k:
+                    break
+        return results
+
+    def exact(self, terms, top_k=5, filter=None, query=None):
+        """Documents containing every one of ``terms``, ranked by BM25 on ``query`` (or the terms)."""
+        state = self._state
+        postings = [state.postings.get(term) for term in terms]
+        if not postings or not all(postings):
+            return []
+        # Intersect starting from the rarest term
+        postings.sort(key=len)
+        ids = {doc_id for doc_id in postings[0] if all(doc_id in p for p in postings[1:])}
+        ids = {doc_id for doc_id in ids if self._allowed(state, doc_id, filter)}
+        scores = self._scores(state, query or " ".join(terms), ids)
+        order = sorted(ids, key=lambda doc_id: scores.get(doc_id, 0.0), reverse=True)[:top_k]
+        return [self._result(state, doc_id, round(scores.get(doc_id, 0.0), 4)) for doc_id in order]
@@ -0,0 +1,270 @@
+"""In-process NumPy vector index, usable in place of Pinecone.
+
+Vectors live in one contiguous, L2-normalized float32 matrix, so cosine search is
+a single matrix-vector product followed by ``argpartition`` for the top k.
+Metadata filters on the indexed fields (``type``/``category`` by default) are
+precomputed boolean masks. On disk an index is a directory holding
+``vectors.npy`` (memory-mapped on load, so opening is instant) and
+``records.json`` (ids, texts, metadata).
+
+:class:`LocalVectorIndex` has Pinecone's ``upsert``/``delete`` shape so the
+ingesters can write to it, and :class:`LocalVectorStore` exposes the LangChain
+vector-store methods the agents use. Queries run in worker threads while the
+index may be reloaded, so every public method holds the index's lock: a query
+never sees the records of one version next to the vectors of another.
+"""
+import functools
+import json
+import os
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+DEFAULT_FILTER_FIELDS = ("type", "category")
+
+
+def _locked(method):
+    """Run ``method`` holding the index's lock (re-entrant, so overrides can call ``super()``)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class LocalVectorIndex:
+    def __init__(self, path, dimension=1536, filter_fields=DEFAULT_FILTER_FIELDS):
+        self.path = path
+        self.dimension = dimension
+        self.filter_fields = tuple(filter_fields)
+        self._vectors_path = os.path.join(path, "vectors.npy")
+        self._records_path = os.path.join(path, "records.json")
+        self._loaded_mtime = None
+        self._lock = threading.RLock()
+        self._reset()
+        self.refresh()
+
+    def _reset(self):
+        self.matrix = np.zeros((0, self.dimension), dtype=np.float32)
+        self.ids = []
+        self.texts = []
+        self.metadatas = []
+        self.rows = {}
+        self._pending = []
+        self._masks = {}
+
+    @_locked
+    def __len__(self):
+        self._flush_pending()
+        return len(self.ids)
+
+    @_locked
+    def refresh(self):
+        """(Re)load from disk if another process saved a newer version."""
+        try:
+            mtime = os.stat(self._records_path).st_mtime
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        with open(self._records_path, encoding="utf-8") as f:
+            records = json.load(f)
+        self._reset()
+        self.dimension = records["dimension"]
+        self.ids = records["ids"]
+        self.texts = records["texts"]
+        self.metadatas = records["metadatas"]
+        self.rows = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self.matrix = np.load(self._vectors_path, mmap_mode="r")
+        self._loaded_mtime = mtime
+
+    @_locked
+    def save(self):
+        """Persist atomically; readers holding the old memory map keep a valid view."""
+        self._flush_pending()
+        os.makedirs(self.path, exist_ok=True)
+        tmp_vectors = os.path.join(self.path, "vectors.tmp.npy")
+        np.save(tmp_vectors, np.ascontiguousarray(self.matrix, dtype=np.float32))
+        os.replace(tmp_vectors, self._vectors_path)
+        tmp_records = f"{self._records_path}.tmp"
+        with open(tmp_records, "w", encoding="utf-8") as f:
+            json.dump({"dimension": self.dimension, "ids": self.ids, "texts": self.texts,
+                       "metadatas": self.metadatas}, f)
+        os.replace(tmp_records, self._records_path)
+        self._loaded_mtime = os.stat(self._records_path).st_mtime
+
+    def _writable(self):
+        if not self.matrix.flags.writeable:
+            self.matrix = np.array(self.matrix, dtype=np.float32)
+
+    def _flush_pending(self):
+        if not self._pending:
+            return
+        new_rows = _normalize_rows(np.asarray(self._pending, dtype=np.float32))
+        self.matrix = np.vstack([self.matrix, new_rows]) if len(self.matrix) else new_rows
+        self._pending = []
+
+    @_locked
+    def upsert(self, vectors, **kwargs):
+        """Insert or replace Pinecone-style ``{"id", "values", "metadata"}`` dicts."""
+        for vector in vectors:
+            metadata = dict(vector.get("metadata") or {})
+            text = metadata.pop("text", "")
+            row = self.rows.get(vector["id"])
+            if row is None:
+                self.rows[vector["id"]] = len(self.ids)
+                self.ids.append(vector["id"])
+                self.texts.append(text)
+                self.metadatas.append(metadata)
+                self._pending.append(vector["values"])
+            else:
+                self._flush_pending()
+                self._writable()
+                self.matrix[row] = _normalize_rows(np.asarray([vector["values"]], dtype=np.float32))[0]
+                self.texts[row] = text
+                self.metadatas[row] = metadata
+        self._masks = {}
+
+    @_locked
+    def delete(self, ids, **kwargs):
+        doomed = {self.rows[vector_id] for vector_id in ids if vector_id in self.rows}
+        if not doomed:
+            return
+        self._flush_pending()
+        keep = np.array([row not in doomed for row in range(len(self.ids))], dtype=bool)
+        self.matrix = np.asarray(self.matrix)[keep]
+        self.ids = [v for row, v in enumerate(self.ids) if row not in doomed]
+        self.texts = [t for row, t in enumerate(self.texts) if row not in doomed]
+        self.metadatas = [m for row, m in enumerate(self.metadatas) if row not in doomed]
+        self.rows = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self._masks = {}
+
+    @_locked
+    def fetch(self, ids):
+        """``(id, text, metadata)`` for each of ``ids`` present in the index, without duplicates."""
+        rows = [self.rows[vector_id] for vector_id in dict.fromkeys(ids) if vector_id in self.rows]
+        return [(self.ids[row], self.texts[row], self.metadatas[row]) for row in rows]
+
+    def _value_mask(self, field, value):
+        """Boolean mask of rows whose ``field`` equals ``value``; indexed fields are cached."""
+        key = (field, value)
+        if key in self._masks:
+            return self._masks[key]
+        mask = np.fromiter((m.get(field) == value for m in self.metadatas), dtype=bool, count=len(self.metadatas))
+        if field in self.filter_fields:
+            self._masks[key] = mask
+        return mask
+
+    def _filter_mask(self, filter):
+        """Evaluate the subset of Pinecone's filter language the agents use."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, condition in filter.items():
+            if field == "$and":
+                for sub in condition:
+                    mask &= self._filter_mask(sub)
+                continue
+            if field == "$or":
+                any_mask = np.zeros(len(self.ids), dtype=bool)
+                for sub in condition:
+                    any_mask |= self._filter_mask(sub)
+                mask &= any_mask
+                continue
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, operand in condition.items():
+                if op == "$eq":
+                    mask &= self._value_mask(field, operand)
+                elif op == "$ne":
+                    mask &= ~self._value_mask(field, operand)
+                elif op in ("$in", "$nin"):
+                    any_mask = np.zeros(len(self.ids), dtype=bool)
+                    for value in operand:
+                        any_mask |= self._value_mask(field, value)
+                    mask &= any_mask if op == "$in" else ~any_mask
+                else:
+                    raise ValueError(f"Unsupported filter operator: {op}")
+        return mask
+
+    @_locked
+    def query(self, vector, top_k=5, filter=None):
+        """Return up to ``top_k`` ``(id, score, text, metadata)`` tuples by cosine similarity."""
+        self._flush_pending()
+        if not self.ids:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = self.matrix @ query
+        if filter:
+            mask = self._filter_mask(filter)
+            if not mask.any():
+                return []
+            scores = np.where(mask, scores, -np.inf)
+            top_k = min(top_k, int(mask.sum()))
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i]), self.texts[i], self.metadatas[i]) for i in top]
+
+
+class LocalVectorStore(VectorStore):
+    """LangChain vector store over a :class:`LocalVectorIndex` (same filter semantics as Pinecone)."""
+
+    def __init__(self, index, embedding):
+        self.index = index
+        self._embedding = embedding
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [f"doc_{len(self.index) + i + 1}" for i in range(len(texts))]
+        vectors = self._embedding.embed_documents(texts)
+        self.index.upsert([
+            {"id": vector_id, "values": vector, "metadata": {"text": text, **metadata}}
+            for vector_id, vector, text, metadata in zip(ids, vectors, texts, metadatas)
+        ])
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        self.index.delete(ids or [])
+
+    def get_by_ids(self, ids, /):
+        self.index.refresh()
+        return [Document(id=vector_id, page_content=text, metadata=dict(metadata))
+                for vector_id, text, metadata in self.index.fetch(ids)]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        self.index.refresh()
+        return [
+            (Document(id=vector_id, page_content=text, metadata=dict(metadata)), score)
+            for vector_id, score, text, metadata in self.index.query(embedding, top_k=k, filter=filter)
+        ]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k=k, filter=filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path=".local_index/default", **kwargs):
+        store = cls(LocalVectorIndex(path), embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        store.index.save()
+        return store
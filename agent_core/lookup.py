@@ -0,0 +1,75 @@
+"""Exact order-number lookup so direct order questions skip vector search."""
+import asyncio
+import os
+import re
+import time
+
+from agent_core.records import clean_order_chunk, iter_csv_chunks
+from agent_core.response_cache import extract_order_number
+from agent_core.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds between checks of the CSV's modification time (reloads run in a worker thread)
+LOOKUP_CHECK_INTERVAL = float(os.environ.get("LOOKUP_CHECK_INTERVAL", "5"))
+
+_ORDER_IN_TEXT = re.compile(r"order\s*#\s*(\d+)", re.IGNORECASE)
+
+
+class OrderLookup:
+    """Maps order numbers (parsed from rows like "Order #1234 ...") to their records.
+
+    Records are cleaned and sanitized exactly as the ingester stores them, and
+    only rows that mention an order number are kept. At most every
+    ``check_interval`` seconds a query starts a background check of the CSV's
+    modification time; a changed file is re-read in a worker thread and the new
+    index swapped in whole, so the index follows re-ingests without a restart
+    and without blocking the event loop.
+    """
+
+    def __init__(self, csv_path, check_interval=LOOKUP_CHECK_INTERVAL):
+        self.csv_path = csv_path
+        self.check_interval = check_interval
+        self.by_number = {}
+        self._mtime = None
+        self._checked = time.monotonic()
+        self._reload = None
+        self.refresh()
+
+    def refresh(self):
+        """(Re)build the index if the CSV changed since the last load (blocking)."""
+        try:
+            mtime = os.stat(self.csv_path).st_mtime
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        by_number = {}
+        for chunk in iter_csv_chunks(self.csv_path):
+            records, _ = clean_order_chunk(chunk)
+            for record in records:
+                for number in set(_ORDER_IN_TEXT.findall(record["text"])):
+                    by_number.setdefault(number, []).append(record)
+        self.by_number = by_number
+        self._mtime = mtime
+
+    def _schedule_refresh(self):
+        now = time.monotonic()
+        if self._reload is not None or now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        self._reload = asyncio.ensure_future(asyncio.to_thread(self.refresh))
+        self._reload.add_done_callback(self._reloaded)
+
+    def _reloaded(self, task):
+        self._reload = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Reloading order lookup from %s failed: %s", self.csv_path, task.exception())
+
+    async def find(self, query):
+        """Records for the order number the query mentions (empty if none or unknown)."""
+        number = extract_order_number(query)
+        if number is None:
+            return []
+        self._schedule_refresh()
+        return self.by_number.get(number, [])
@@ -0,0 +1,142 @@
+"""A small DAG runner for agent steps.
+
+Each step is an async callable taking a :class:`PipelineRun`. Steps listed in
+``after`` must finish before a step starts; any other step's result can also be
+awaited mid-step with ``await run.result(name)``, which lets e.g. retrieval start
+embedding while triage is still running and pick up the category once it lands.
+Independent steps run concurrently, each with an optional timeout, and a failing
+required step cancels everything still in flight. A caller that retries runs
+itself can pass ``reraise`` so that matching errors (e.g. rate limits) fail
+the run even from optional steps instead of being replaced by their default.
+
+Each run is traced (see :mod:`agent_core.telemetry`): the run is the root span
+and every step a child span, so anything a step records on ``current_span()``
+(token counts, cache hits, fallbacks) ends up in that step's span.
+"""
+import asyncio
+import time
+
+from agent_core.telemetry import get_logger, span, trace
+
+logger = get_logger(__name__)
+
+
+class Step:
+    """One node of a :class:`Pipeline`.
+
+    ``optional`` steps that fail or time out resolve to ``default`` instead of
+    failing the whole run.
+    """
+
+    def __init__(self, name, fn, after=(), timeout=None, optional=False, default=None):
+        self.name = name
+        self.fn = fn
+        self.after = tuple(after)
+        self.timeout = timeout
+        self.optional = optional
+        self.default = default
+
+
+class PipelineRun:
+    """State for one execution: inputs, per-step futures and timings."""
+
+    def __init__(self, inputs, step_names):
+        self.inputs = inputs
+        self.timings = {}
+        self._started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        self._futures = {name: loop.create_future() for name in step_names}
+
+    async def result(self, name):
+        """Wait for (and return) another step's result."""
+        return await asyncio.shield(self._futures[name])
+
+    @property
+    def results(self):
+        return {name: f.result() for name, f in self._futures.items()
+                if f.done() and not f.cancelled() and f.exception() is None}
+
+    def _elapsed_ms(self):
+        return round((time.perf_counter() - self._started) * 1000, 2)
+
+
+class Pipeline:
+    def __init__(self, steps, name="pipeline", reraise=None):
+        self.name = name
+        self.reraise = reraise
+        self.steps = {}
+        for step in steps:
+            if step.name in self.steps:
+                raise ValueError(f"Duplicate step name: {step.name}")
+            self.steps[step.name] = step
+        for step in steps:
+            for dep in step.after:
+                if dep not in self.steps:
+                    raise ValueError(f"Step '{step.name}' depends on unknown step '{dep}'")
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        state = {}
+
+        def visit(name):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Dependency cycle through step '{name}'")
+            state[name] = "visiting"
+            for dep in self.steps[name].after:
+                visit(dep)
+            state[name] = "done"
+
+        for name in self.steps:
+            visit(name)
+
+    async def _run_step(self, step, run):
+        future = run._futures[step.name]
+        for dep in step.after:
+            await run.result(dep)
+        with span(step.name) as step_span:
+            start = run._elapsed_ms()
+            status = "ok"
+            try:
+                if step.timeout is not None:
+                    value = await asyncio.wait_for(step.fn(run), step.timeout)
+                else:
+                    value = await step.fn(run)
+            except asyncio.CancelledError:
+                status = "cancelled"
+                future.cancel()
+                raise
+            except Exception as e:
+                status = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                if not step.optional or (status == "error" and self.reraise is not None and self.reraise(e)):
+                    future.set_exception(e)
+                    raise
+                logger.warning("Optional step '%s' failed (%s): %r", step.name, status, e)
+                value = step.default
+            finally:
+                end = run._elapsed_ms()
+                run.timings[step.name] = {"start_ms": start, "duration_ms": round(end - start, 2), "status": status}
+                step_span.status = status
+        future.set_result(value)
+        return value
+
+    async def run(self, **inputs):
+        """Execute every step and return the :class:`PipelineRun` with results and timings."""
+        with trace(self.name):
+            run = PipelineRun(inputs, self.steps)
+            # Tasks are created inside the trace, so each step's span nests under it
+            tasks = [asyncio.create_task(self._run_step(step, run), name=step.name) for step in self.steps.values()]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                for future in run._futures.values():
+                    if not future.done():
+                        future.cancel()
+                    elif not future.cancelled():
+                        future.exception()  # Mark retrieved so asyncio doesn't warn
+                raise
+        return run
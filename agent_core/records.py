@@ -0,0 +1,128 @@
+"""Streaming, tolerant parsing of the ingestion CSVs.
+
+Order texts contain unquoted commas ("Order #1234 shipped on 06/12/2025,
+tracking: XYZ"), so a row is read as: first field is the ``id``, the last field
+is the JSON ``metadata`` object, and everything in between is the ``text``.
+
+Files are split into fixed-size chunks of raw rows so ingestion memory stays
+flat however large the export is. The ``clean_*_chunk`` functions turn one chunk
+into records; they are side-effect free module-level functions so they can run
+in worker processes. Metadata is parsed as JSON (or a Python dict literal) and
+never evaluated.
+"""
+import ast
+import csv
+import json
+
+from agent_core.sanitize import sanitize
+
+
+def parse_metadata(value):
+    """Parse a metadata cell into a dict; None if it is not a dict literal."""
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        try:
+            parsed = ast.literal_eval(value.strip())
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def parse_order_fields(fields):
+    """Turn one raw CSV row (list of fields) into ``{"id", "text", "metadata"}``, or None.
+
+    A trailing field that looks like an object (``{...}``) but does not parse
+    makes the whole row invalid rather than being folded into the text.
+    """
+    if len(fields) < 2:
+        return None
+    row_id = fields[0].strip()
+    metadata = {}
+    text_fields = fields[1:]
+    if len(fields) >= 3:
+        parsed = parse_metadata(fields[-1])
+        if parsed is not None:
+            metadata = parsed
+            text_fields = fields[1:-1]
+        elif fields[-1].strip().startswith("{"):
+            return None
+    text = ",".join(text_fields).strip()
+    if not text:
+        return None
+    return {"id": row_id, "text": text, "metadata": metadata}
+
+
+def iter_csv_chunks(path, chunksize=1000, encoding="utf-8"):
+    """Yield ``(header, rows)`` with up to ``chunksize`` raw field lists per chunk."""
+    with open(path, encoding=encoding, newline="") as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader, [])]
+        rows = []
+        for fields in reader:
+            if not fields:
+                continue
+            rows.append(fields)
+            if len(rows) >= chunksize:
+                yield header, rows
+                rows = []
+        if rows:
+            yield header, rows
+
+
+def iter_order_rows(path, encoding="utf-8"):
+    """Yield parsed rows from an order CSV with an ``id,text,metadata`` header."""
+    for _, rows in iter_csv_chunks(path, encoding=encoding):
+        for fields in rows:
+            row = parse_order_fields(fields)
+            if row is not None:
+                yield row
+
+
+def clean_order_chunk(chunk):
+    """Parse and sanitize one ``(header, rows)`` order chunk; returns ``(records, skipped_rows)``."""
+    _, rows = chunk
+    records = []
+    skipped = []
+    for fields in rows:
+        row = parse_order_fields(fields)
+        text = sanitize(row["text"]) if row is not None else ""
+        if not text:
+            skipped.append(fields)
+            continue
+        metadata = {
+            sanitize(key): sanitize(value) if isinstance(value, str) else value
+            for key, value in row["metadata"].items()
+        }
+        records.append({"id": row["id"], "text": text, "metadata": metadata})
+    return records, skipped
+
+
+def clean_health_chunk(chunk):
+    """Validate one ``(header, rows)`` health chunk with column operations; returns ``(records, skipped_rows)``.
+
+    Unquoted commas in the content spill into extra fields, which are folded
+    back into the last column.
+    """
+    import pandas as pd
+
+    header, rows = chunk
+    width = len(header)
+    rows = [fields[:width - 1] + [",".join(fields[width - 1:])] if len(fields) > width else fields
+            for fields in rows]
+    df = pd.DataFrame(rows, columns=header)
+    content = df["content"].fillna("").astype(str).str.strip()
+    # Handle split content in an extra column
+    if "content_1" in df:
+        extra = df["content_1"].fillna("").astype(str).str.strip()
+        content = (content + " " + extra).str.strip()
+    category = df["category"]
+    valid = (content != "") & category.map(lambda value: isinstance(value, str) and bool(value.strip())).astype(bool)
+    records = [
+        {"text": text, "metadata": {"category": label}}
+        for text, label in zip(content[valid], category[valid].str.strip())
+    ]
+    skipped = [rows[i] for i in df.index[~valid]]
+    return records, skipped
@@ -0,0 +1,257 @@
+"""Semantic response cache in front of the triage -> retrieval -> response pipeline.
+
+Lookups try an exact match on the normalized query first, then the nearest
+cached query by embedding cosine similarity above a threshold. Entries expire
+after a TTL and the whole cache is dropped when the ingesters bump the corpus
+version (see :func:`agent_core.sync.bump_corpus_version`). A partition key
+(e.g. every identifier in the query) is part of every key, so "#1234" and
+"#1235", or two tracking codes, can never answer each other. Only runs that completed without a fallback are stored.
+"""
+import re
+import time
+
+from agent_core.lexical import identifiers
+from agent_core.telemetry import counter, span, trace
+
+RESPONSE_CACHE_LOOKUPS = counter("agent_response_cache_lookups_total", "Response cache lookups by outcome",
+                                 ("result",))
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_ORDER_NUMBER = re.compile(r"#\s*(\d+)|\border\s+(?:number\s+|no\.?\s*)?(\d+)", re.IGNORECASE)
+_QUOTES = str.maketrans({"’": "'", "‘": "'", "“": '"', "”": '"'})
+
+
+def normalize_query(query):
+    """Lower-case, drop punctuation, collapse whitespace ("#1234" and "1234" match)."""
+    query = _PUNCTUATION.sub(" ", query.translate(_QUOTES).replace("'", "").casefold())
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+def extract_order_number(query):
+    """Order number referenced by the query ("#1234", "order 1234"), or None."""
+    match = _ORDER_NUMBER.search(query)
+    if not match:
+        return None
+    return match.group(1) or match.group(2)
+
+
+def identifier_key(query):
+    """Every identifier in the query (order numbers, tracking codes...), sorted and joined; None if there are none."""
+    found = identifiers(query)
+    return " ".join(sorted(found)) if found else None
+
+
+class CachedRun:
+    """Stand-in for :class:`agent_core.pipeline.PipelineRun` when the answer came from the cache."""
+
+    def __init__(self, inputs, results, kind, elapsed_ms, similarity=None):
+        self.inputs = inputs
+        self.results = dict(results)
+        timing = {"start_ms": 0.0, "duration_ms": elapsed_ms, "status": f"{kind}_hit"}
+        if similarity is not None:
+            timing["similarity"] = round(similarity, 4)
+        self.timings = {"cache": timing}
+
+
+class _Partition:
+    """Keys and unit vectors of one partition; rows ``[0, len(keys))`` of a growable matrix are live."""
+
+    def __init__(self):
+        self.keys = []
+        self._rows = {}
+        self._matrix = None
+
+    def add(self, key, vector):
+        import numpy as np
+
+        n = len(self.keys)
+        if self._matrix is None:
+            self._matrix = np.empty((16, len(vector)), dtype=np.float32)
+        elif n == len(self._matrix):
+            grown = np.empty((2 * n, self._matrix.shape[1]), dtype=np.float32)
+            grown[:n] = self._matrix
+            self._matrix = grown
+        self._matrix[n] = vector
+        self._rows[key] = n
+        self.keys.append(key)
+
+    def remove(self, key):
+        # The last row moves into the hole, so live rows stay contiguous
+        index = self._rows.pop(key)
+        last = len(self.keys) - 1
+        if index != last:
+            self._matrix[index] = self._matrix[last]
+            self.keys[index] = self.keys[last]
+            self._rows[self.keys[index]] = index
+        self.keys.pop()
+
+    def nearest(self, vector):
+        if not self.keys:
+            return None, 0.0
+        import numpy as np
+
+        scores = self._matrix[:len(self.keys)] @ vector
+        best = int(np.argmax(scores))
+        return self.keys[best], float(scores[best])
+
+
+class ResponseCache:
+    """Exact + approximate (cosine) cache of pipeline results with TTL and corpus-version invalidation.
+
+    ``embed_query`` is an async callable returning a query vector; ``partition_fn``
+    maps a query to the part of the key that must match exactly; ``version_fn``
+    returns the current corpus version and is polled at most every
+    ``version_check_interval`` seconds.
+    """
+
+    def __init__(self, embed_query, threshold=0.95, ttl=600.0, max_entries=10_000,
+                 partition_fn=None, version_fn=None, version_check_interval=5.0):
+        self.embed_query = embed_query
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.partition_fn = partition_fn or (lambda query: None)
+        self.version_fn = version_fn
+        self.version_check_interval = version_check_interval
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.skipped = 0
+        self._entries = {}
+        self._partitions = {}
+        self._version = version_fn() if version_fn else None
+        self._version_checked = time.monotonic()
+
+    def _check_version(self):
+        if self.version_fn is None:
+            return
+        now = time.monotonic()
+        if now - self._version_checked < self.version_check_interval:
+            return
+        self._version_checked = now
+        version = self.version_fn()
+        if version != self._version:
+            self._version = version
+            self.invalidate()
+
+    def invalidate(self):
+        self._entries.clear()
+        self._partitions.clear()
+        self.invalidations += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._partitions[key[0]].remove(key)
+
+    @staticmethod
+    def _unit(vector):
+        # numpy is imported on first use so importing the agents stays cheap
+        import numpy as np
+
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def lookup(self, query):
+        """Return ``(results, kind, similarity)`` for a cached answer, or None."""
+        self._check_version()
+        key = (self.partition_fn(query), normalize_query(query))
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry["expires"] > now:
+                self.exact_hits += 1
+                RESPONSE_CACHE_LOOKUPS.inc(result="exact")
+                return entry["results"], "exact", None
+            self._drop(key)
+        partition = self._partitions.get(key[0])
+        if partition is not None and partition.keys:
+            vector = self._unit(await self.embed_query(query))
+            best, similarity = partition.nearest(vector)
+            if best is not None and similarity >= self.threshold:
+                entry = self._entries[best]
+                if entry["expires"] > now:
+                    self.semantic_hits += 1
+                    RESPONSE_CACHE_LOOKUPS.inc(result="semantic")
+                    return entry["results"], "semantic", similarity
+                self._drop(best)
+        self.misses += 1
+        RESPONSE_CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    async def store(self, query, results):
+        key = (self.partition_fn(query), normalize_query(query))
+        vector = self._unit(await self.embed_query(query))
+        self._drop(key)
+        if len(self._entries) >= self.max_entries:
+            # Dicts keep insertion order, so the first key is the oldest entry
+            self._drop(next(iter(self._entries)))
+        self._entries[key] = {"results": results, "expires": time.monotonic() + self.ttl}
+        self._partitions.setdefault(key[0], _Partition()).add(key, vector)
+
+    def stats(self):
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "invalidations": self.invalidations,
+            "skipped": self.skipped,
+        }
+
+
+# Span attributes the agents set when they answer on a fallback path
+FALLBACK_ATTRIBUTES = ("unparsed", "category_wait_timeout")
+
+
+def _spans(root):
+    for child in root.children:
+        yield child
+        yield from _spans(child)
+
+
+def completed_cleanly(run, root):
+    """Whether ``run`` (traced under ``root``) finished without a failed, timed-out or fallback step."""
+    if any(timing.get("status") != "ok" for timing in run.timings.values()):
+        return False
+    return not any(item.attrs.get(name) for item in _spans(root) for name in FALLBACK_ATTRIBUTES)
+
+
+class CachedPipeline:
+    """Wraps a :class:`agent_core.pipeline.Pipeline`, answering repeat questions from a :class:`ResponseCache`."""
+
+    def __init__(self, pipeline, cache):
+        self.pipeline = pipeline
+        self.cache = cache
+        self.name = getattr(pipeline, "name", "pipeline")
+
+    async def run(self, **inputs):
+        query = inputs["query"]
+        started = time.perf_counter()
+        with trace(self.name) as root:
+            with span("response_cache_lookup") as lookup_span:
+                hit = await self.cache.lookup(query)
+                lookup_span.set(result=hit[1] if hit is not None else "miss")
+            root.set(cache_hit=hit is not None)
+            if hit is not None:
+                results, kind, similarity = hit
+                on_token = inputs.get("on_token")
+                if on_token is not None and results.get("respond"):
+                    on_token(results["respond"])
+                elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+                return CachedRun(inputs, results, kind, elapsed_ms, similarity)
+            run = await self.pipeline.run(**inputs)
+            # A degraded answer (e.g. triage fell back to "unknown") would otherwise be served for the whole TTL
+            if not completed_cleanly(run, root):
+                self.cache.skipped += 1
+                root.set(cache_store="skipped")
+                return run
+            with span("response_cache_store"):
+                await self.cache.store(query, run.results)
+        return run
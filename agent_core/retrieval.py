@@ -0,0 +1,169 @@
+"""Vector search helpers for the agents' RetrievalAgent.
+
+The query is embedded once by the caller and the same vector is reused for the
+filtered search and its unfiltered fallback, so one question costs exactly one
+embedding call and nothing blocks the event loop. For hybrid domains the vector
+hits are merged with BM25 hits from :mod:`agent_core.lexical` by reciprocal rank
+fusion (each list contributes ``1 / (RRF_K + rank)`` per document). Hits on
+chunks of long records are then widened to their parent record or neighbouring
+chunks by :func:`expand_chunks`.
+"""
+import asyncio
+import os
+
+from agent_core.telemetry import counter, span
+
+RRF_K = int(os.environ.get("RRF_K", "60"))
+
+RETRIEVAL_SEARCHES = counter("agent_retrieval_searches_total", "Retrieval searches, by whether a filter was applied",
+                             ("filtered",))
+RETRIEVAL_FALLBACKS = counter("agent_retrieval_fallbacks_total",
+                              "Filtered vector searches that fell back to an unfiltered one")
+VECTOR_QUERIES = counter("agent_vector_queries_total", "Queries sent to the vector store")
+LEXICAL_SEARCHES = counter("agent_lexical_searches_total",
+                           "Hybrid retrievals by outcome: exact identifier hit or fused with vector search", ("mode",))
+
+
+async def search_by_vector(vectorstore, vector, k=5, filter=None):
+    """Return ``(document, score)`` pairs for a precomputed query vector.
+
+    The Pinecone store's own async search opens a fresh asyncio client per call,
+    so the sync search (which reuses the index's pooled connections) runs in a
+    worker thread instead.
+    """
+    VECTOR_QUERIES.inc()
+    return await asyncio.to_thread(
+        vectorstore.similarity_search_by_vector_with_score, vector, k=k, filter=filter
+    )
+
+
+async def search_with_fallback(vectorstore, vector, k=5, filter=None):
+    """Filtered search that falls back to an unfiltered one when nothing matches.
+
+    The fallback rate is ``agent_retrieval_fallbacks_total / agent_retrieval_searches_total{filtered="true"}``.
+    """
+    RETRIEVAL_SEARCHES.inc(filtered=str(bool(filter)).lower())
+    with span("vector_search", k=k, filtered=bool(filter)) as search_span:
+        if not filter:
+            results = await search_by_vector(vectorstore, vector, k)
+        else:
+            results = await search_by_vector(vectorstore, vector, k, filter)
+            search_span.set(fallback=not results)
+            if not results:
+                results = await search_by_vector(vectorstore, vector, k)  # Fallback
+                RETRIEVAL_FALLBACKS.inc()
+        search_span.set(results=len(results))
+    return results
+
+
+def scored_documents(results):
+    """Documents from ``(document, score)`` pairs, each score kept in ``metadata["score"]`` for context assembly."""
+    for doc, score in results:
+        doc.metadata["score"] = round(float(score), 4)
+    return [doc for doc, _ in results]
+
+
+def lexical_documents(results):
+    """Documents from :class:`agent_core.lexical.LexicalIndex` hits, each BM25 score in ``metadata["bm25"]``."""
+    from langchain_core.documents import Document
+
+    return [Document(id=doc_id, page_content=text, metadata={**metadata, "bm25": score})
+            for doc_id, score, text, metadata in results]
+
+
+def _key(doc):
+    return doc.id or doc.page_content
+
+
+def fuse_results(vector_results, lexical_results, limit=5, k=RRF_K):
+    """Reciprocal rank fusion of ``(document, score)`` vector hits and lexical hits; the best ``limit`` documents.
+
+    Documents found by both keep their similarity score and gain the BM25 score,
+    so context assembly can tell a lexical match from a weak vector-only hit.
+    """
+    fused = {}
+    documents = {}
+    for rank, doc in enumerate(scored_documents(vector_results)):
+        documents[_key(doc)] = doc
+        fused[_key(doc)] = 1 / (k + rank + 1)
+    for rank, doc in enumerate(lexical_documents(lexical_results)):
+        key = _key(doc)
+        if key in documents:
+            documents[key].metadata["bm25"] = doc.metadata["bm25"]
+        else:
+            documents[key] = doc
+        fused[key] = fused.get(key, 0.0) + 1 / (k + rank + 1)
+    ranked = sorted(fused, key=fused.get, reverse=True)[:limit]
+    return [documents[key] for key in ranked]
+
+
+def get_documents(vectorstore, ids):
+    """Documents stored under ``ids`` (any order; missing IDs are skipped)."""
+    try:
+        return vectorstore.get_by_ids(ids)
+    except NotImplementedError:
+        from langchain_core.documents import Document
+
+        # PineconeVectorStore has no get_by_ids; fetch from its index, where the text is a metadata field
+        text_key = getattr(vectorstore, "_text_key", "text")
+        vectors = vectorstore.index.fetch(ids=list(ids)).vectors
+        return [Document(id=vector_id, page_content=(vector.metadata or {}).get(text_key, ""),
+                         metadata={k: v for k, v in (vector.metadata or {}).items() if k != text_key})
+                for vector_id, vector in vectors.items()]
+
+
+async def expand_chunks(vectorstore, documents, mode="neighbors", neighbors=1):
+    """Replace chunk hits (see :mod:`agent_core.chunking`) with their parent record or surrounding text.
+
+    ``mode="parent"`` returns each hit chunk's whole parent; ``"neighbors"`` the
+    hit chunks of a parent plus ``neighbors`` chunks either side, merged into
+    one text. Either way a parent appears once, at the rank of its best chunk,
+    keeping the best scores and listing the merged chunk numbers in
+    ``metadata["merged_chunks"]``. Documents that are not chunks pass through.
+    """
+    hits = {}
+    for doc in documents:
+        parent = doc.metadata.get("parent_id")
+        if parent is not None:
+            hits.setdefault(parent, []).append(doc)
+    if not hits:
+        return documents
+    from agent_core.chunking import CHUNK_FIELDS, chunk_ids, merge_chunks
+
+    wanted = {}
+    for parent, chunks in hits.items():
+        count = int(chunks[0].metadata["chunks"])
+        if mode == "parent":
+            indices = range(count)
+        else:
+            indices = {n for doc in chunks for n in range(int(doc.metadata["chunk"]) - neighbors,
+                                                           int(doc.metadata["chunk"]) + neighbors + 1)
+                       if 0 <= n < count}
+        wanted[parent] = chunk_ids(parent, sorted(indices))
+    have = {doc.id: doc for chunks in hits.values() for doc in chunks if doc.id}
+    missing = [vector_id for ids in wanted.values() for vector_id in ids if vector_id not in have]
+    if missing:
+        VECTOR_QUERIES.inc()
+        fetched = await asyncio.to_thread(get_documents, vectorstore, missing)
+        have.update((doc.id, doc) for doc in fetched)
+
+    expanded = []
+    for doc in documents:
+        parent = doc.metadata.get("parent_id")
+        if parent is None:
+            expanded.append(doc)
+            continue
+        chunks = hits.pop(parent, None)
+        if chunks is None:
+            continue  # Already merged at the rank of a better chunk
+        parts = [have[vector_id] for vector_id in wanted[parent] if vector_id in have]
+        text = merge_chunks([(int(part.metadata["chunk"]), int(part.metadata["start"]), part.page_content)
+                             for part in parts])
+        metadata = {key: value for key, value in doc.metadata.items() if key not in CHUNK_FIELDS}
+        for key in ("score", "bm25"):
+            scores = [chunk.metadata[key] for chunk in chunks if key in chunk.metadata]
+            if scores:
+                metadata[key] = max(scores)
+        metadata["merged_chunks"] = sorted(int(part.metadata["chunk"]) for part in parts)
+        expanded.append(doc.model_copy(update={"id": parent, "page_content": text, "metadata": metadata}))
+    return expanded
@@ -0,0 +1,94 @@
+"""Shared text sanitizer for ingestion and outgoing HTTP headers.
+
+``sanitize`` produces exactly what the original per-character ``clean_text``
+did (punctuation replacements, NFC, control characters dropped, ASCII only,
+stripped) without any per-character Python loop: ASCII text (the common case)
+skips straight to one ``bytes.translate`` that deletes control characters, and
+only other text pays for the replacements, NFC and an ASCII encode.
+``sanitize_series`` does the same for a whole pandas column.
+"""
+import unicodedata
+
+# Typographic characters mapped to ASCII look-alikes; everything else non-ASCII is dropped
+REPLACEMENTS = {
+    '\u2014': '--',  # em dash
+    '\u2013': '-',   # en dash
+    '\u2019': "'",   # right single quotation mark
+    '\u2018': "'",   # left single quotation mark
+    '\u201c': '"',   # left double quotation mark
+    '\u201d': '"',   # right double quotation mark
+    '\u2026': '...',  # horizontal ellipsis
+    '\u00a0': ' ',   # non-breaking space
+    '\u00b7': '*',   # middle dot
+    '\u2022': '*',   # bullet
+    '\u2010': '-',   # hyphen
+    '\u2011': '-',   # non-breaking hyphen
+    '\u2012': '-',   # figure dash
+    '\u2015': '--',  # horizontal bar
+}
+
+# The subset the httpx header patch has always applied
+HEADER_REPLACEMENTS = {key: REPLACEMENTS[key] for key in ('\u2014', '\u2013', '\u2019', '\u201c', '\u201d')}
+
+_REPLACEMENT_ITEMS = tuple(REPLACEMENTS.items())
+
+# ASCII control characters (Unicode category Cc) other than tab, newline and carriage return
+_CONTROL_BYTES = bytes(b for b in list(range(0x20)) + [0x7f] if b not in b"\t\n\r")
+
+
+def sanitize(text):
+    """Clean text by replacing typographic characters and dropping anything non-ASCII or non-printable."""
+    if not isinstance(text, str):
+        return str(text)
+    if text.isascii():
+        data = text.encode("ascii")
+    else:
+        # Each replace is one C-level scan; a mapping-based str.translate is slower per character
+        for old, new in _REPLACEMENT_ITEMS:
+            text = text.replace(old, new)
+        # NFC has to run before control characters are removed: they can block composition
+        data = unicodedata.normalize("NFC", text).encode("ascii", errors="ignore")
+    return data.translate(None, _CONTROL_BYTES).decode("ascii").strip()
+
+
+def ascii_only(text):
+    """Drop every non-ASCII character (replaces ``''.join(c for c in s if ord(c) < 128)``)."""
+    return text.encode("ascii", errors="ignore").decode("ascii")
+
+
+def sanitize_header_value(value):
+    """Header-safe version of ``value``: common dashes/quotes mapped, everything else non-ASCII dropped."""
+    if isinstance(value, str) and not value.isascii():
+        for old, new in HEADER_REPLACEMENTS.items():
+            value = value.replace(old, new)
+        value = ascii_only(value)
+    return value
+
+
+def sanitize_series(series):
+    """:func:`sanitize` over a whole pandas column; non-string values become ``str(value)``.
+
+    On object-dtype columns every ``.str`` method is its own Python-level loop, so
+    one fused pass per row beats chaining the replace/normalize/encode steps.
+    """
+    return series.map(sanitize)
+
+
+_header_patch_installed = False
+
+
+def install_httpx_header_patch():
+    """Make httpx tolerate non-ASCII header values (idempotent)."""
+    global _header_patch_installed
+    if _header_patch_installed:
+        return
+    import httpx._models
+
+    original_normalize = httpx._models._normalize_header_value
+
+    def patched_normalize_header_value(value, encoding=None):
+        """Patched version that handles Unicode characters gracefully."""
+        return original_normalize(sanitize_header_value(value), encoding)
+
+    httpx._models._normalize_header_value = patched_normalize_header_value
+    _header_patch_installed = True
@@ -0,0 +1,308 @@
+"""Shared scheduling for OpenAI calls: single-flight, rate limits and priorities.
+
+Every OpenAI request in the process (chat, query embeddings and ingestion
+batches) goes through the shared HTTP transport in :mod:`agent_core.clients`,
+which hands it to one :class:`CallScheduler`:
+
+- Identical concurrent requests (same endpoint and body, not streamed) are
+  coalesced: one is sent and every caller gets a copy of its response.
+- Each model has a requests-per-minute and a tokens-per-minute token bucket
+  (``OPENAI_RPM`` and ``OPENAI_TPM``, overridable per model through
+  ``OPENAI_RATE_LIMITS``, e.g. ``{"gpt-4o-mini": [500, 200000]}``; ``0`` means
+  unlimited). A request's token cost is estimated from its input text (four
+  characters per token) plus its ``max_tokens``.
+- The buckets follow OpenAI's ``x-ratelimit-*`` response headers: the account's
+  real limits apply where they are tighter (or nothing was configured), the
+  reported remaining budget caps what the bucket believes it has, and a 429
+  pauses the model until its ``Retry-After`` (or the reported reset) has
+  passed, so the SDK's own retries wait instead of adding to the storm.
+- Waiting requests are served in priority order, then first come first served:
+  interactive queries (the default) go ahead of :data:`BATCH` work, which the
+  ingesters and the batch runner select with :func:`call_priority`.
+"""
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import re
+import time
+
+from agent_core.telemetry import counter, current_span, gauge, histogram
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# Default per-model limits (0 disables a limit) and per-model overrides
+OPENAI_RPM = float(os.environ.get("OPENAI_RPM", "0"))
+OPENAI_TPM = float(os.environ.get("OPENAI_TPM", "0"))
+OPENAI_RATE_LIMITS = json.loads(os.environ.get("OPENAI_RATE_LIMITS", "{}"))
+
+# Completion tokens assumed for a chat request without max_tokens
+DEFAULT_COMPLETION_TOKENS = int(os.environ.get("OPENAI_DEFAULT_COMPLETION_TOKENS", "256"))
+
+SCHEDULER_QUEUE = gauge("agent_openai_queue_depth", "OpenAI requests waiting for rate-limit budget",
+                        ("model", "priority"))
+SCHEDULER_WAIT = histogram("agent_openai_wait_seconds", "Time OpenAI requests waited for rate-limit budget",
+                           ("model", "priority"))
+SCHEDULER_COALESCED = counter("agent_openai_coalesced_total",
+                              "OpenAI requests answered by an identical request already in flight", ("model",))
+SCHEDULER_RATE_LIMITED = counter("agent_openai_rate_limited_total", "OpenAI 429 responses", ("model",))
+
+_priority = contextvars.ContextVar("openai_call_priority", default=INTERACTIVE)
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+@contextlib.contextmanager
+def call_priority(priority):
+    """Run the enclosed calls (and tasks created inside) at ``priority``."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def parse_duration(value):
+    """Seconds in an OpenAI reset header such as ``"1s"``, ``"6m0s"`` or ``"20ms"`` (None if unparseable)."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    return sum(float(amount) * _UNITS[unit] for amount, unit in parts) if parts else None
+
+
+def _header_float(headers, name):
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _text_length(value):
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, list):
+        return sum(_text_length(item) if not isinstance(item, int) else 4 for item in value)
+    if isinstance(value, dict):
+        return sum(_text_length(item) for key, item in value.items() if key in ("content", "text"))
+    return 0
+
+
+def estimate_tokens(body):
+    """Tokens a request counts against the per-minute budget: its input plus the completion it may produce."""
+    if "messages" in body:
+        completion = body.get("max_completion_tokens") or body.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+        return _text_length(body["messages"]) // 4 + completion
+    return max(1, _text_length(body.get("input", "")) // 4)
+
+
+class TokenBucket:
+    """``capacity`` units refilled at ``capacity`` per minute; a capacity of 0 never limits."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def delay(self, amount, now):
+        """Seconds until ``amount`` units are available (a request larger than the bucket waits for a full one)."""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.capacity)
+
+    def take(self, amount, now):
+        if self.capacity:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def observe(self, limit, remaining, now):
+        """Adopt the limit (if tighter than the configured one) and remaining budget the API reported."""
+        self._refill(now)
+        if limit and (not self.capacity or limit < self.capacity):
+            self.level = min(self.level, limit) if self.capacity else limit
+            self.capacity = limit
+        if remaining is not None and self.capacity:
+            self.level = min(self.level, remaining)
+
+
+class ModelLimiter:
+    """Request and token buckets for one model, with a priority queue of waiting requests."""
+
+    def __init__(self, model, rpm, tpm):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self._waiting = []
+        self._sequence = itertools.count()
+
+    def _delay(self, tokens):
+        now = time.monotonic()
+        return max(self.paused_until - now, self.requests.delay(1, now), self.tokens.delay(tokens, now))
+
+    def _wake(self):
+        # Only the head of the queue can take budget; it re-checks (and sleeps again if it must)
+        if self._waiting and not self._waiting[0][2].done():
+            self._waiting[0][2].set_result(None)
+
+    def _depth(self):
+        for priority, name in PRIORITY_NAMES.items():
+            SCHEDULER_QUEUE.set(sum(1 for waiter in self._waiting if waiter[0] == priority),
+                                model=self.model, priority=name)
+
+    async def acquire(self, tokens, priority=INTERACTIVE):
+        """Wait until this request may be sent; returns the seconds waited."""
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        waiter = [priority, next(self._sequence), loop.create_future()]
+        heapq.heappush(self._waiting, waiter)
+        self._depth()
+        try:
+            while True:
+                delay = self._delay(tokens) if self._waiting[0] is waiter else None
+                if delay is not None and delay <= 0:
+                    now = time.monotonic()
+                    self.requests.take(1, now)
+                    self.tokens.take(tokens, now)
+                    break
+                waiter[2] = loop.create_future()
+                try:
+                    await asyncio.wait_for(waiter[2], delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._waiting.remove(waiter)
+            heapq.heapify(self._waiting)
+            self._depth()
+            self._wake()
+        waited = time.monotonic() - started
+        SCHEDULER_WAIT.observe(waited, model=self.model, priority=PRIORITY_NAMES.get(priority, str(priority)))
+        return waited
+
+    def observe(self, status, headers):
+        """Update the buckets from a response's rate-limit headers."""
+        now = time.monotonic()
+        self.requests.observe(_header_float(headers, "x-ratelimit-limit-requests"),
+                              _header_float(headers, "x-ratelimit-remaining-requests"), now)
+        self.tokens.observe(_header_float(headers, "x-ratelimit-limit-tokens"),
+                            _header_float(headers, "x-ratelimit-remaining-tokens"), now)
+        if status == 429:
+            SCHEDULER_RATE_LIMITED.inc(model=self.model)
+            pause = (_header_float(headers, "retry-after")
+                     or max(parse_duration(headers.get("x-ratelimit-reset-requests")) or 0.0,
+                            parse_duration(headers.get("x-ratelimit-reset-tokens")) or 0.0)
+                     or 1.0)
+            self.paused_until = max(self.paused_until, now + pause)
+        self._wake()
+
+    def stats(self):
+        return {
+            "waiting": len(self._waiting),
+            "rpm": self.requests.capacity,
+            "tpm": self.tokens.capacity,
+            "paused_s": round(max(0.0, self.paused_until - time.monotonic()), 3),
+        }
+
+
+class CallScheduler:
+    """Coalesces and rate-limits OpenAI requests; see the module docstring."""
+
+    def __init__(self, rpm=OPENAI_RPM, tpm=OPENAI_TPM, limits=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.limits = dict(OPENAI_RATE_LIMITS if limits is None else limits)
+        self.limiters = {}
+        self.coalesced = 0
+        self._in_flight = {}
+
+    def limiter(self, model):
+        limiter = self.limiters.get(model)
+        if limiter is None:
+            rpm, tpm = self.limits.get(model, (self.rpm, self.tpm))
+            limiter = self.limiters[model] = ModelLimiter(model, rpm, tpm)
+        return limiter
+
+    async def call(self, body, send, key=None):
+        """Send a request through ``send()``, an async callable returning ``(status, headers, payload)``.
+
+        ``body`` is the parsed JSON request (for the model and the token estimate).
+        Requests with the same ``key`` share one call while it is in flight;
+        ``key=None`` (e.g. a streamed completion) is never shared.
+        """
+        if key is None:
+            return await self._send(body, send)
+        while key in self._in_flight:
+            shared = self._in_flight[key]
+            try:
+                result = await asyncio.shield(shared)
+            except asyncio.CancelledError:
+                if not shared.cancelled():
+                    raise
+                continue  # The leader was cancelled, not this caller: send it ourselves
+            self.coalesced += 1
+            SCHEDULER_COALESCED.inc(model=body.get("model", ""))
+            current_span().add("coalesced")
+            return result
+        shared = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._send(body, send)
+        except asyncio.CancelledError:
+            shared.cancel()
+            raise
+        except Exception as e:
+            shared.set_exception(e)
+            shared.exception()  # Followers re-raise it; don't warn if there are none
+            raise
+        else:
+            shared.set_result(result)
+        finally:
+            del self._in_flight[key]
+        return result
+
+    async def _send(self, body, send):
+        limiter = self.limiter(body.get("model", ""))
+        waited = await limiter.acquire(estimate_tokens(body), _priority.get())
+        if waited > 0.001:
+            current_span().add("rate_limit_wait_ms", round(waited * 1000, 2))
+        status, headers, payload = await send()
+        limiter.observe(status, headers)
+        return status, headers, payload
+
+    def stats(self):
+        return {"coalesced": self.coalesced, "in_flight": len(self._in_flight),
+                "models": {model: limiter.stats() for model, limiter in self.limiters.items()}}
+
+
+def parse_request(method, url, content):
+    """``(key, body)`` for an outgoing request: its coalescing key and parsed JSON body.
+
+    The body is None for anything but a JSON POST (such requests bypass the
+    scheduler); the key is None for streamed requests, which are never shared.
+    """
+    if method != "POST":
+        return None, None
+    try:
+        body = json.loads(content)
+    except ValueError:
+        return None, None
+    if not isinstance(body, dict):
+        return None, None
+    if body.get("stream"):
+        return None, body
+    return hashlib.sha256(str(url).encode("utf-8") + b"\0" + content).hexdigest(), body
@@ -0,0 +1,273 @@
+"""Long-running HTTP service exposing the agents.
+
+Run from the repository root::
+
+    python -m agent_core.server --port 8080 --agents order,health
+
+Agents are the domains declared by ``domain.json`` configs (see
+``agent_core.domains``). Each is built on its first request (or at startup with
+``--preload``) and all of them share the pooled clients from ``agent_core.clients``,
+so a request only pays for its own OpenAI/Pinecone calls and startup cost does
+not grow with the number of domains. Without ``--preload`` the agents' libraries
+are imported in the background once the server is listening.
+
+Endpoints:
+    GET  /health                -> liveness, loaded domains, in-flight/queued counts and response-cache hit rates
+    GET  /metrics               -> Prometheus text format: span latency histograms, token, cache,
+                                   fallback and retry counters (see agent_core.telemetry)
+    POST /agents/{name}/query   -> {"query": "..."} in, category/response/context/timings out
+    POST /agents/{name}/stream  -> same input, server-sent ``token`` events then a ``done`` event
+                                   carrying the full payload plus ttft_ms/total_ms
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+
+from aiohttp import web
+
+from agent_core.clients import close_clients, pool_stats, scheduler_stats
+from agent_core.domains import get_registry
+from agent_core.streaming import stream_run
+from agent_core.telemetry import configure_logging, counter, gauge, get_logger, render_metrics
+
+logger = get_logger(__name__)
+
+REQUESTS = counter("agent_server_requests_total", "Queries handled by the server", ("agent", "endpoint", "status"))
+IN_FLIGHT = gauge("agent_server_in_flight", "Queries currently running")
+QUEUED = gauge("agent_server_queued", "Queries waiting for a concurrency slot")
+HTTP_POOL = gauge("agent_http_pool", "Shared OpenAI HTTP connection pool counters", ("stat",))
+
+
+def run_payload(name, query, run):
+    """JSON-ready result of one pipeline run (shared by the server and the batch runner)."""
+    return {
+        "agent": name,
+        "query": query,
+        "category": run.results.get("triage"),
+        "response": run.results.get("respond"),
+        # The documents that went into the prompt, after context assembly
+        "context": [doc.page_content for doc in run.results.get("context", run.results.get("retrieve", []))],
+        "timings": run.timings,
+    }
+
+
+async def _send_event(response, event, data):
+    await response.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+
+
+def _disconnected(request):
+    return request.transport is None or request.transport.is_closing()
+
+
+class AgentService:
+    """Holds one pipeline per agent (built on first use) and applies admission control to queries."""
+
+    def __init__(self, registry, agents, max_concurrency=32, max_queue=128):
+        self.registry = registry
+        self.agents = tuple(agents)
+        self.pipelines = {}
+        self._builds = {}
+        self.max_queue = max_queue
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.draining = False
+
+    async def health(self, request):
+        status = 503 if self.draining else 200
+        return web.json_response({
+            "status": "draining" if self.draining else "ok",
+            "agents": sorted(self.agents),
+            "loaded": sorted(self.pipelines),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "response_cache": {name: pipeline.cache.stats() for name, pipeline in self.pipelines.items()
+                               if hasattr(pipeline, "cache")},
+            "http_pool": pool_stats(),
+            "openai_scheduler": scheduler_stats(),
+        }, status=status)
+
+    async def metrics(self, request):
+        IN_FLIGHT.set(self.in_flight)
+        QUEUED.set(self.queued)
+        for stat, value in pool_stats().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                HTTP_POOL.set(value, stat=stat)
+        return web.Response(text=render_metrics(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def pipeline(self, name):
+        """The agent's pipeline, building its domain the first time it is asked for."""
+        pipeline = self.pipelines.get(name)
+        if pipeline is not None:
+            return pipeline
+        # Concurrent first requests share one build; shielded so a caller that goes away doesn't cancel it
+        build = self._builds.get(name)
+        if build is None:
+            build = self._builds[name] = asyncio.ensure_future(self._build(name))
+            build.add_done_callback(lambda task: self._built(name, task))
+        return await asyncio.shield(build)
+
+    async def _build(self, name):
+        domain = await self.registry.aget(name)
+        pipeline = self.pipelines[name] = domain.create_pipeline()
+        return pipeline
+
+    def _built(self, name, task):
+        # A failed build is retried by the next request
+        del self._builds[name]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Building agent '%s' failed: %s", name, task.exception())
+
+    async def _parse(self, request):
+        name = request.match_info["name"]
+        if name not in self.agents:
+            raise web.HTTPNotFound(text=f"Unknown agent '{name}'")
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="Request body must be JSON")
+        query = body.get("query") if isinstance(body, dict) else None
+        if not isinstance(query, str) or not query.strip():
+            raise web.HTTPBadRequest(text="'query' must be a non-empty string")
+        return name, await self.pipeline(name), query
+
+    @contextlib.asynccontextmanager
+    async def _admit(self):
+        # Shed load instead of letting the backlog grow without bound
+        if self.draining or self.queued >= self.max_queue:
+            logger.warning("Shedding request: %d queued, draining=%s", self.queued, self.draining)
+            raise web.HTTPServiceUnavailable(text="Server busy, retry later", headers={"Retry-After": "1"})
+        self.queued += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+
+    async def query(self, request):
+        name, pipeline, query = await self._parse(request)
+        async with self._admit():
+            try:
+                run = await pipeline.run(query=query)
+            except asyncio.TimeoutError:
+                REQUESTS.inc(agent=name, endpoint="query", status="timeout")
+                raise web.HTTPGatewayTimeout(text="Agent step timed out")
+            except Exception:
+                REQUESTS.inc(agent=name, endpoint="query", status="error")
+                raise
+        REQUESTS.inc(agent=name, endpoint="query", status="ok")
+        return web.json_response(run_payload(name, query, run))
+
+    async def stream(self, request):
+        """Server-sent events: one ``token`` event per token, then ``done`` (or ``error``)."""
+        name, pipeline, query = await self._parse(request)
+        async with self._admit():
+            response = web.StreamResponse(headers={
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-cache",
+            })
+            await response.prepare(request)
+            status = "ok"
+            error = None
+            try:
+                async for event in stream_run(pipeline, query=query):
+                    if event[0] == "token":
+                        await _send_event(response, "token", event[1])
+                    else:
+                        _, run, metrics = event
+                        await _send_event(response, "done", {**run_payload(name, query, run), **metrics})
+            except asyncio.TimeoutError:
+                status, error = "timeout", "Agent step timed out"
+            except Exception as e:
+                if isinstance(e, ConnectionResetError) and _disconnected(request):
+                    status = "disconnected"
+                else:
+                    status, error = "error", str(e)
+                    logger.exception("Streaming query for agent '%s' failed", name)
+            REQUESTS.inc(agent=name, endpoint="stream", status=status)
+            # Nothing more can be written once the client has gone away
+            if status != "disconnected" and not _disconnected(request):
+                try:
+                    if error is not None:
+                        await _send_event(response, "error", {"error": error})
+                    await response.write_eof()
+                except ConnectionResetError:
+                    pass
+        return response
+
+    async def drain(self, app):
+        """Stop admitting work; aiohttp then waits for in-flight queries to finish."""
+        self.draining = True
+
+
+def _preload_modules():
+    try:
+        from agent_core.agents import preload_modules
+
+        preload_modules()
+    except Exception as e:
+        logger.warning("Background import failed (%s); agents will import on first use", e)
+
+
+def create_app(agent_names, max_concurrency=32, max_queue=128, preload=False, registry=None):
+    service = AgentService(registry or get_registry(), agent_names,
+                           max_concurrency=max_concurrency, max_queue=max_queue)
+    app = web.Application()
+    if preload:
+        async def preload_agents(app):
+            for name in service.agents:
+                await service.pipeline(name)
+
+        app.on_startup.append(preload_agents)
+    else:
+        async def warm_up(app):
+            # /health answers right away; the first query then finds LangChain and the clients already imported
+            app["warm_up"] = asyncio.create_task(asyncio.to_thread(_preload_modules))
+
+        app.on_startup.append(warm_up)
+    app["service"] = service
+    app.router.add_get("/health", service.health)
+    app.router.add_get("/metrics", service.metrics)
+    app.router.add_post("/agents/{name}/query", service.query)
+    app.router.add_post("/agents/{name}/stream", service.stream)
+    app.on_shutdown.append(service.drain)
+    app.on_cleanup.append(lambda app: close_clients())
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the agents over HTTP.")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8080")))
+    parser.add_argument("--agents", default=os.environ.get("AGENTS", ""),
+                        help="Comma-separated agent names to serve (default: every configured domain)")
+    parser.add_argument("--preload", action="store_true", default=os.environ.get("PRELOAD_AGENTS") == "1",
+                        help="Build every agent at startup instead of on its first request")
+    parser.add_argument("--max-concurrency", type=int,
+                        default=int(os.environ.get("SERVER_MAX_CONCURRENCY", "32")))
+    parser.add_argument("--max-queue", type=int, default=int(os.environ.get("SERVER_MAX_QUEUE", "128")))
+    parser.add_argument("--shutdown-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+    configure_logging()
+
+    registry = get_registry()
+    names = [n.strip() for n in args.agents.split(",") if n.strip()] or registry.names()
+    unknown = [n for n in names if n not in registry.configs]
+    if unknown:
+        parser.error(f"unknown agents: {', '.join(unknown)}")
+    app = create_app(names, max_concurrency=args.max_concurrency, max_queue=args.max_queue,
+                     preload=args.preload, registry=registry)
+    # run_app handles SIGINT/SIGTERM and waits up to shutdown_timeout for open requests
+    web.run_app(app, host=args.host, port=args.port, shutdown_timeout=args.shutdown_timeout)
+
+
+if __name__ == "__main__":
+    main()
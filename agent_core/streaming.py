@@ -0,0 +1,36 @@
+"""Token streaming on top of :mod:`agent_core.pipeline`.
+
+The agents' respond step accepts an ``on_token`` callback (passed as a pipeline
+input); :func:`stream_run` turns that into an async generator so callers can
+forward tokens as they arrive while the rest of the DAG runs unchanged.
+"""
+import asyncio
+import time
+
+
+async def stream_run(pipeline, **inputs):
+    """Run ``pipeline`` and yield ``("token", text)`` events, then ``("done", run, metrics)``.
+
+    ``metrics`` holds ``ttft_ms`` (time to first token) and ``total_ms``, both
+    measured from the start of the run. Closing the generator early (e.g. the
+    client went away) cancels the run.
+    """
+    queue = asyncio.Queue()
+    started = time.perf_counter()
+    task = asyncio.create_task(pipeline.run(on_token=queue.put_nowait, **inputs))
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    ttft_ms = None
+    try:
+        while True:
+            token = await queue.get()
+            if token is None:
+                break
+            if ttft_ms is None:
+                ttft_ms = round((time.perf_counter() - started) * 1000, 2)
+            yield ("token", token)
+        run = await task
+        total_ms = round((time.perf_counter() - started) * 1000, 2)
+        yield ("done", run, {"ttft_ms": ttft_ms, "total_ms": total_ms})
+    finally:
+        if not task.done():
+            task.cancel()
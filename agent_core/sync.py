@@ -0,0 +1,206 @@
+"""Incremental index sync: stable vector IDs, a local manifest and a row-level diff.
+
+Instead of dropping and recreating the Pinecone index on every run, the ingesters
+compare the current CSV against a manifest of what was already embedded, embed
+only new or changed rows, delete rows that disappeared, and leave the live index
+serving throughout.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from agent_core.clients import ROOT, get_pinecone, get_vector_backend, local_index_path
+from agent_core.ingestion import BatchIngestor, aiterate
+from agent_core.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+DELETE_BATCH_SIZE = 1000
+
+# Shared stamp file the agents watch to invalidate cached answers after a sync (default at the repository root)
+CORPUS_VERSION_PATH = os.environ.get("CORPUS_VERSION_PATH", os.path.join(ROOT, ".corpus_versions.json"))
+
+
+def content_hash(text, metadata=None):
+    """Hash of everything that ends up in the vector record."""
+    payload = json.dumps({"text": text, "metadata": metadata or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def stable_id(key=None, text=None):
+    """Vector ID from a row key when the CSV has one, otherwise from the content."""
+    if key is not None and str(key).strip():
+        return f"doc_{str(key).strip()}"
+    return "doc_" + hashlib.sha1((text or "").encode("utf-8")).hexdigest()[:16]
+
+
+def ensure_index(pc, index_name, dimension=1536, metric="cosine", cloud="aws", region="us-east-1"):
+    """Create the index if it is missing; return True when it was created."""
+    from pinecone import ServerlessSpec
+
+    if index_name in pc.list_indexes().names():
+        return False
+    pc.create_index(
+        name=index_name,
+        dimension=dimension,
+        metric=metric,
+        spec=ServerlessSpec(cloud=cloud, region=region)
+    )
+    return True
+
+
+def read_corpus_version(index_name, path=None):
+    """Current corpus version stamp for an index (None if it was never synced)."""
+    try:
+        with open(path or CORPUS_VERSION_PATH, encoding="utf-8") as f:
+            return json.load(f).get(index_name)
+    except (OSError, ValueError):
+        return None
+
+
+def bump_corpus_version(index_name, path=None):
+    """Record that the index contents changed; returns the new version stamp."""
+    path = path or CORPUS_VERSION_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            versions = json.load(f)
+    except (OSError, ValueError):
+        versions = {}
+    versions[index_name] = f"{time.time():.6f}"
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(versions, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+    return versions[index_name]
+
+
+def prepare_index(index_name, manifest_path, rebuild=False):
+    """Open the manifest and make sure the index exists on the configured vector backend.
+
+    The index is only dropped when ``rebuild`` is set; a freshly created (or,
+    locally, missing) index starts with an empty manifest so everything gets
+    embedded.
+    """
+    backend = get_vector_backend()
+    manifest = IngestManifest(manifest_path, index_name, backend=backend)
+    if backend == "local":
+        path = local_index_path(index_name)
+        if rebuild:
+            shutil.rmtree(path, ignore_errors=True)
+        # A missing (or deleted) index directory holds nothing, whatever the manifest says
+        if rebuild or not os.path.exists(os.path.join(path, "records.json")):
+            manifest.reset()
+        return manifest
+    pc = get_pinecone()
+    if rebuild and index_name in pc.list_indexes().names():
+        pc.delete_index(index_name)
+    if ensure_index(pc, index_name):
+        manifest.reset()
+    return manifest
+
+
+class IngestManifest:
+    """JSON file mapping vector ID to content hash for each index we ingest into."""
+
+    def __init__(self, path, index_name, backend="pinecone"):
+        self.path = path
+        self.index_name = index_name
+        self._all = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._all = json.load(f)
+        # Each backend keeps its own record of what it holds
+        key = index_name if backend == "pinecone" else f"{backend}:{index_name}"
+        self.entries = self._all.setdefault(key, {})
+
+    def reset(self):
+        self.entries.clear()
+
+    def is_current(self, record):
+        """Stamp ``record`` with its content ``hash``; True if the index already holds that version."""
+        record["hash"] = content_hash(record["text"], record.get("metadata"))
+        return self.entries.get(record["id"]) == record["hash"]
+
+    def missing(self, seen_ids):
+        """IDs recorded in the manifest that are not in ``seen_ids``."""
+        return [vector_id for vector_id in self.entries if vector_id not in seen_ids]
+
+    def mark(self, vector_id, digest):
+        self.entries[vector_id] = digest
+
+    def forget(self, ids):
+        for vector_id in ids:
+            self.entries.pop(vector_id, None)
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._all, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+async def incremental_sync(records, manifest, embed_batch, upsert_batch, delete_batch, **ingest_options):
+    """Bring the index in line with ``records``, embedding only what changed.
+
+    ``records`` may be a list or a (possibly async) iterable; it is diffed against
+    the manifest as it streams in, so embedding starts with the first changed
+    record. Vectors for IDs that did not appear are deleted only once the whole
+    input has been read. An ID that repeats keeps its last row, as with a single
+    upsert of the whole file. Returns a summary dict; the manifest is saved even
+    if some batches fail, and only vectors that were actually upserted are
+    recorded in it.
+    """
+    summary = {"embedded": 0, "deleted": 0, "unchanged": 0, "failed": 0}
+    seen = set()
+    digests = {}
+    repeats = {}
+
+    async def changed_records():
+        async for record in aiterate(records):
+            if record["id"] in seen:
+                repeats[record["id"]] = record
+                continue
+            seen.add(record["id"])
+            if manifest.is_current(record):
+                summary["unchanged"] += 1
+                continue
+            digests[record["id"]] = record["hash"]
+            yield record
+
+    def changed_repeats():
+        # Diffed against the manifest as the first pass left it, i.e. against what the index now holds
+        for record in repeats.values():
+            if not manifest.is_current(record):
+                digests[record["id"]] = record["hash"]
+                yield record
+
+    def on_upserted(ids):
+        for vector_id in ids:
+            manifest.mark(vector_id, digests[vector_id])
+
+    try:
+        ingestor = BatchIngestor(embed_batch, upsert_batch, on_upserted=on_upserted, **ingest_options)
+        stats = await ingestor.run(changed_records())
+        if repeats:
+            # Batches upsert concurrently, so the last row of a repeated ID gets a pass of its own,
+            # after every earlier row has landed
+            logger.warning("%d IDs repeat in the input; syncing their last rows", len(repeats))
+            await ingestor.run(changed_repeats(), stats)
+        if stats.batches:
+            summary.update(embedded=stats.docs, failed=stats.failed, stats=stats.summary())
+        removed = manifest.missing(seen)
+        logger.info("Sync for '%s': %d new/changed, %d removed, %d unchanged",
+                    manifest.index_name, len(digests), len(removed), summary["unchanged"])
+        # Deletes go last so replaced rows never leave a gap in the serving index
+        for start in range(0, len(removed), DELETE_BATCH_SIZE):
+            chunk = removed[start:start + DELETE_BATCH_SIZE]
+            await delete_batch(chunk)
+            manifest.forget(chunk)
+            summary["deleted"] += len(chunk)
+    finally:
+        manifest.save()
+        if summary["embedded"] or summary["deleted"]:
+            bump_corpus_version(manifest.index_name)
+    return summary
@@ -0,0 +1,334 @@
+"""Leveled logging, Prometheus-style metrics and per-request tracing.
+
+Logging: modules log through ``get_logger(__name__)``; :func:`configure_logging`
+sets the level from ``LOG_LEVEL`` (default ``INFO``) and the format from
+``LOG_FORMAT`` (``text`` or ``json``, one object per line). Messages use lazy
+``%s`` arguments and structured data goes in ``extra`` (serialized only when a
+record is actually emitted), so a disabled level costs one level check.
+
+Metrics: a process-wide registry of counters, gauges and histograms rendered in
+the Prometheus text format by :func:`render_metrics` (served at ``/metrics``).
+
+Tracing: ``with trace(name)`` opens the root span of a request (or joins the one
+already open) and ``with span(name)`` nests a timed child under the current
+span; asyncio tasks inherit the current span, so pipeline steps running
+concurrently land under the same root. Spans carry attributes (token counts,
+cache hits, fallback flags, retries), every span duration is observed in the
+``agent_span_seconds`` histogram, and a finished trace is logged as one record
+on the ``agent_core.trace`` logger at DEBUG level.
+"""
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def get_logger(name):
+    return logging.getLogger(name)
+
+
+def _extras(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class TextFormatter(logging.Formatter):
+    """``LEVEL name: message key=value ...`` with structured extras as compact JSON."""
+
+    def __init__(self):
+        super().__init__("%(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        extras = _extras(record)
+        if extras:
+            line += " " + " ".join(f"{key}={json.dumps(value, default=str)}" for key, value in extras.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: timestamp, level, logger, message and any extras."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_extras(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_configured = False
+
+
+def configure_logging(level=None, fmt=None):
+    """Attach a stderr handler to the root logger (idempotent; an existing handler is left alone)."""
+    global _configured
+    if _configured:
+        return
+    root = logging.getLogger()
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+        root.addHandler(handler)
+    root.setLevel(level or LOG_LEVEL)
+    # Keep third-party chatter (httpx and aiohttp log every request at INFO) out of our logs
+    for name in ("httpx", "httpcore", "openai", "aiohttp.access"):
+        logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
+    _configured = True
+
+
+# Metrics
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        for key, value in sorted(self._values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(self.labelnames, labels)] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def samples(self):
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                yield (f"{self.name}_bucket",
+                       _format_labels(self.labelnames, key, [("le", _format_value(bound))]), cumulative)
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), series["sum"]
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), series["count"]
+
+
+_metrics = {}
+
+
+def _register(cls, name, help, labelnames=(), **kwargs):
+    # Re-registering returns the existing metric, so modules can declare theirs at import time
+    if name not in _metrics:
+        _metrics[name] = cls(name, help, labelnames, **kwargs)
+    return _metrics[name]
+
+
+def counter(name, help, labelnames=()):
+    return _register(Counter, name, help, labelnames)
+
+
+def gauge(name, help, labelnames=()):
+    return _register(Gauge, name, help, labelnames)
+
+
+def histogram(name, help, labelnames=(), buckets=Histogram.DEFAULT_BUCKETS):
+    return _register(Histogram, name, help, labelnames, buckets=buckets)
+
+
+def render_metrics():
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for name, metric in sorted(_metrics.items()):
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        lines.extend(f"{sample}{labels} {_format_value(value)}" for sample, labels, value in metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+SPAN_SECONDS = histogram("agent_span_seconds", "Duration of traced spans (requests and their steps)",
+                         ("span", "status"))
+LLM_TOKENS = counter("agent_llm_tokens_total", "Tokens reported by the chat model", ("model", "type"))
+LLM_CALLS = counter("agent_llm_calls_total", "Chat model calls", ("model",))
+
+
+# Tracing
+
+class Span:
+    """One timed unit of work with attributes and child spans."""
+
+    __slots__ = ("name", "attrs", "children", "status", "started", "duration")
+
+    def __init__(self, name, attrs=None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.children = []
+        self.status = "ok"
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key, amount=1):
+        """Increment a numeric attribute (token counts, retries, ...)."""
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def to_dict(self):
+        entry = {"name": self.name, "status": self.status,
+                 "duration_ms": round((self.duration or 0.0) * 1000, 2), **self.attrs}
+        if self.children:
+            entry["children"] = [child.to_dict() for child in self.children]
+        return entry
+
+
+class _NullSpan:
+    """Stands in for the current span outside any trace; attributes are discarded."""
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+_current = contextvars.ContextVar("agent_span", default=None)
+_trace_logger = get_logger("agent_core.trace")
+
+
+def current_span():
+    """The innermost open span of this task, or a no-op span."""
+    return _current.get() or NULL_SPAN
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Time a block as a child of the current span (or as a root span if there is none)."""
+    parent = _current.get()
+    current = Span(name, attrs)
+    if parent is not None:
+        parent.children.append(current)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        if current.status == "ok":
+            current.status = "cancelled" if isinstance(e, (asyncio.CancelledError, GeneratorExit)) else "error"
+        raise
+    finally:
+        _current.reset(token)
+        current.duration = time.perf_counter() - current.started
+        SPAN_SECONDS.observe(current.duration, span=name, status=current.status)
+        if parent is None and _trace_logger.isEnabledFor(logging.DEBUG):
+            _trace_logger.debug("trace %s %.2f ms", name, current.duration * 1000,
+                                extra={"trace": current.to_dict()})
+
+
+@contextlib.contextmanager
+def trace(name, **attrs):
+    """Open a root span for one request, or join the trace that is already open."""
+    parent = _current.get()
+    if parent is not None:
+        parent.set(**attrs)
+        yield parent
+        return
+    with span(name, **attrs) as root:
+        yield root
+
+
+def token_usage_callback(model):
+    """LangChain callback that adds a chat model's token usage to the current span and metrics."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TokenUsageCallback(BaseCallbackHandler):
+        # Run in the caller's context so current_span() is the step that made the call
+        run_inline = True
+
+        def on_llm_end(self, response, **kwargs):
+            prompt = completion = 0
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt += usage.get("input_tokens", 0)
+                    completion += usage.get("output_tokens", 0)
+            LLM_CALLS.inc(model=model)
+            LLM_TOKENS.inc(prompt, model=model, type="prompt")
+            LLM_TOKENS.inc(completion, model=model, type="completion")
+            current = current_span()
+            current.add("llm_calls")
+            current.add("prompt_tokens", prompt)
+            current.add("completion_tokens", completion)
+
+    return TokenUsageCallback()
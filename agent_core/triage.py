@@ -0,0 +1,71 @@
+"""Deterministic first-stage triage.
+
+A weighted keyword/regex scorer resolves clear-cut queries in microseconds; only
+queries where no label wins by a clear margin are escalated to the LLM, whose
+free-form answer is parsed strictly back onto the known labels.
+"""
+import re
+
+_WORD = re.compile(r"[a-z]+")
+
+
+class Classification(str):
+    """A triage label with its confidence and the labels still plausible for the query.
+
+    It is a ``str`` equal to the label, so payloads, caches and logs see the plain
+    category, while retrieval can filter on every label in ``candidates``.
+    An empty ``candidates`` means the category is unknown.
+    """
+
+    def __new__(cls, label, confidence=1.0, candidates=None):
+        value = super().__new__(cls, label)
+        value.confidence = confidence
+        value.candidates = tuple(candidates) if candidates is not None else (label,)
+        return value
+
+    def __reduce__(self):
+        return Classification, (str(self), self.confidence, self.candidates)
+
+
+def parse_labels(text, labels):
+    """The ``labels`` named in ``text`` as whole words, in order of appearance (case-insensitive)."""
+    allowed = set(labels)
+    return list(dict.fromkeys(word for word in _WORD.findall(text.lower()) if word in allowed))
+
+
+class RuleClassifier:
+    """Scores each label by the summed weights of its matching patterns.
+
+    ``rules`` maps a label to a list of ``(pattern, weight)`` pairs; patterns are
+    case-insensitive regexes matched against the query.
+    """
+
+    def __init__(self, rules, min_score=1.0, min_margin=1.0):
+        self.rules = {
+            label: [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in patterns]
+            for label, patterns in rules.items()
+        }
+        self.min_score = min_score
+        self.min_margin = min_margin
+
+    def scores(self, query):
+        return {
+            label: sum(weight for pattern, weight in patterns if pattern.search(query))
+            for label, patterns in self.rules.items()
+        }
+
+    def plausible(self, query):
+        """Labels with any matching pattern, best score first."""
+        ranked = sorted(self.scores(query).items(), key=lambda item: item[1], reverse=True)
+        return [label for label, score in ranked if score > 0]
+
+    def classify(self, query):
+        """Return ``(label, confidence)`` for a confident match, or None to escalate."""
+        ranked = sorted(self.scores(query).items(), key=lambda item: item[1], reverse=True)
+        if not ranked:
+            return None
+        best_label, best = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        if best < self.min_score or best - runner_up < self.min_margin:
+            return None
+        return best_label, round(best / (best + runner_up), 3)
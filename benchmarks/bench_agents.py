@@ -0,0 +1,337 @@
+"""End-to-end ingestion and query benchmark, fully offline.
+
+Starts a fake OpenAI server (``agent_core.fakes.FakeOpenAIServer``) with
+configurable latency in a separate process and points both agents at it with
+the local vector backend. It then:
+
+* generates synthetic corpora of ``--scale`` rows from ``order_data.csv`` and
+  ``health_data.csv``, and measures ingestion docs/sec through the real
+  parse -> embed -> upsert path;
+* replays ``questions.txt`` and ``eg_questions`` through each agent's pipeline
+  at fixed concurrency levels, reporting p50/p95/p99 latency, throughput and
+  per-step timings.
+
+The report is JSON, so two commits can be compared directly::
+
+    python benchmarks/bench_agents.py --scale 5000 --output before.json
+    python benchmarks/bench_agents.py --scale 5000 --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+from agent_core.telemetry import configure_logging, get_logger
+
+logger = get_logger("benchmarks.bench_agents")
+
+ORDER_CSV = os.path.join(ROOT, "order_support_agent", "order_data.csv")
+HEALTH_CSV = os.path.join(ROOT, "health_wellness_agent", "health_data.csv")
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(values_ms):
+    return {
+        "p50_ms": round(_percentile(values_ms, 50), 2),
+        "p95_ms": round(_percentile(values_ms, 95), 2),
+        "p99_ms": round(_percentile(values_ms, 99), 2),
+        "mean_ms": round(sum(values_ms) / len(values_ms), 2) if values_ms else 0.0,
+        "max_ms": round(max(values_ms), 2) if values_ms else 0.0,
+    }
+
+
+def read_questions(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip().strip('"') for line in f if line.strip()]
+
+
+# Synthetic corpora
+
+def write_order_corpus(path, rows):
+    """``rows`` order rows cycling through the sample file, each with its own order number."""
+    from agent_core.records import iter_order_rows
+
+    base = list(iter_order_rows(ORDER_CSV))
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "text", "metadata"])
+        for i in range(rows):
+            row = base[i % len(base)]
+            # The first pass keeps the real order numbers so the sample questions still hit
+            text = row["text"] if i < len(base) else re.sub(r"#\d+", f"#{10000 + i}", row["text"])
+            writer.writerow([i + 1, text, json.dumps(row["metadata"])])
+
+
+def write_health_corpus(path, rows):
+    with open(HEALTH_CSV, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        # Unquoted commas spill into extra fields; fold them back into the content
+        base = [(fields[0], ",".join(fields[1:])) for fields in reader if len(fields) >= 2]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for i in range(rows):
+            category, content = base[i % len(base)]
+            writer.writerow([category, content if i < len(base) else f"{content} (variant {i})"])
+
+
+# Fake OpenAI server process
+
+def _serve(conn, options):
+    from agent_core.fakes import FakeOpenAIServer
+
+    async def run():
+        server = FakeOpenAIServer(**options)
+        conn.send(await server.start())
+        # Block in a thread until the parent asks for the counters
+        await asyncio.to_thread(conn.recv)
+        conn.send(server.requests)
+        await server.stop()
+
+    asyncio.run(run())
+
+
+class FakeServerProcess:
+    """Runs the fake server in its own process so it never competes with the client's event loop."""
+
+    def __init__(self, **options):
+        parent, child = multiprocessing.get_context("spawn").Pipe()
+        self.conn = parent
+        self.process = multiprocessing.get_context("spawn").Process(
+            target=_serve, args=(child, options), daemon=True)
+
+    def start(self):
+        self.process.start()
+        return self.conn.recv()
+
+    def stop(self):
+        self.conn.send("stop")
+        requests = self.conn.recv()
+        self.process.join(timeout=5)
+        return requests
+
+
+# Benchmarks
+
+async def bench_ingest(name, path, chunksize, workers):
+    """Ingest one corpus from scratch and return docs/sec plus the sync summary."""
+    from agent_core.domains import get_registry
+    from agent_core.ingest import read_records, sync_records
+    from agent_core.sync import prepare_index
+
+    config = get_registry().configs[name]
+    manifest = prepare_index(config.index_name, os.environ["INGEST_MANIFEST_PATH"], rebuild=True)
+
+    async def records():
+        # Same chunked cleaning and vector IDs as the ingesters
+        async for chunk in read_records(config, path, chunksize, workers):
+            for record in chunk:
+                yield record
+
+    started = time.perf_counter()
+    summary = await sync_records(config, records(), manifest)
+    elapsed = time.perf_counter() - started
+    return {
+        "docs": summary["embedded"],
+        "failed": summary["failed"],
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_sec": round(summary["embedded"] / elapsed, 2) if elapsed > 0 else 0.0,
+        "stages": summary.get("stats", {}).get("stages", {}),
+    }
+
+
+async def bench_queries(pipeline, questions, concurrency, requests):
+    """Run ``requests`` queries with at most ``concurrency`` in flight."""
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+    steps = {}
+    errors = 0
+
+    async def one(query):
+        nonlocal errors
+        async with slots:
+            start = time.perf_counter()
+            try:
+                run = await pipeline.run(query=query)
+            except Exception:
+                errors += 1
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+            for step, timing in getattr(run, "timings", {}).items():
+                steps.setdefault(step, []).append(timing["duration_ms"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(query) for query in itertools.islice(itertools.cycle(questions), requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_qps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        **latency_summary(latencies),
+        "steps": {step: latency_summary(values) for step, values in steps.items()},
+    }
+
+
+async def run_benchmarks(args, corpora):
+    from agent_core.clients import close_clients, pool_stats
+    from agent_core.domains import get_registry
+
+    report = {"ingest": {}, "query": {}}
+    try:
+        for name in args.agents:
+            logger.info("Ingesting %d synthetic %s rows", args.scale, name)
+            report["ingest"][name] = await bench_ingest(name, corpora[name], args.chunk_size, args.workers)
+
+        for name in args.agents:
+            domain = get_registry().get(name)
+            pipeline = domain.create_pipeline()
+            questions = read_questions(domain.config.questions_path)
+            # Warm-up: first-use imports, connections and the local index load
+            for query in questions:
+                await pipeline.run(query=query)
+            report["query"][name] = []
+            for concurrency in args.concurrency:
+                logger.info("%s queries at concurrency %d", name, concurrency)
+                report["query"][name].append(await bench_queries(pipeline, questions, concurrency, args.requests))
+        report["http_pool"] = pool_stats()
+    finally:
+        await close_clients()
+    return report
+
+
+# Regression comparison
+
+def _change(before, after):
+    return round((after - before) / before * 100, 1) if before else None
+
+
+def compare(baseline, report):
+    """Percent change per metric; positive is better for throughput, worse for latency."""
+    changes = {"ingest": {}, "query": {}}
+    for name, result in report["ingest"].items():
+        if name in baseline.get("ingest", {}):
+            changes["ingest"][name] = {
+                "docs_per_sec_pct": _change(baseline["ingest"][name]["docs_per_sec"], result["docs_per_sec"])}
+    for name, results in report["query"].items():
+        before = {r["concurrency"]: r for r in baseline.get("query", {}).get(name, [])}
+        for result in results:
+            old = before.get(result["concurrency"])
+            if old is None:
+                continue
+            changes["query"].setdefault(name, {})[f"c{result['concurrency']}"] = {
+                f"{metric}_pct": _change(old[metric], result[metric])
+                for metric in ("throughput_qps", "p50_ms", "p95_ms", "p99_ms")
+            }
+    return changes
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", default="order,health", help="Comma-separated agents to benchmark")
+    parser.add_argument("--scale", type=int, default=1000, help="Rows per synthetic corpus")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="Queries per concurrency level")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="Seconds per embeddings request")
+    parser.add_argument("--chat-latency", type=float, default=0.2, help="Seconds before the first chat token")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Seconds between chat tokens")
+    parser.add_argument("--response-tokens", type=int, default=40)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="CSV rows per ingestion chunk")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Ingestion worker processes")
+    parser.add_argument("--response-cache", action="store_true", help="Leave the agents' response cache on")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", help="Baseline report to compute percent changes against")
+    args = parser.parse_args()
+    configure_logging()
+    args.agents = [name.strip() for name in args.agents.split(",") if name.strip()]
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+    # Synthetic corpora exist for these two domains' CSV schemas
+    unknown = [name for name in args.agents if name not in ("order", "health")]
+    if unknown:
+        parser.error(f"unknown agents: {', '.join(unknown)}")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    server = FakeServerProcess(embed_latency=args.embed_latency, chat_latency=args.chat_latency,
+                               token_latency=args.token_latency, response_tokens=args.response_tokens)
+    base_url = server.start()
+    with tempfile.TemporaryDirectory(prefix="bench_agents_") as workdir:
+        corpora = {"order": os.path.join(workdir, "order_data.csv"),
+                   "health": os.path.join(workdir, "health_data.csv")}
+        write_order_corpus(corpora["order"], args.scale)
+        write_health_corpus(corpora["health"], args.scale)
+        # Configure everything before agent_core reads its settings
+        os.environ.update({
+            "OPENAI_API_KEY": "fake",
+            "OPENAI_BASE_URL": base_url,
+            "OPENAI_API_BASE": base_url,
+            "EMBEDDING_CTX_CHECK": "0",
+            "VECTOR_BACKEND": "local",
+            "LOCAL_INDEX_DIR": os.path.join(workdir, "index"),
+            "LEXICAL_INDEX_DIR": os.path.join(workdir, "lexical"),
+            "INGEST_MANIFEST_PATH": os.path.join(workdir, "manifest.json"),
+            "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embeddings.sqlite"),
+            "CORPUS_VERSION_PATH": os.path.join(workdir, "corpus_version.json"),
+            "ORDER_DATA_PATH": corpora["order"],
+            # Fake embeddings are unrelated to the text, so keep every hit rather than score-filter them all away
+            "CONTEXT_MIN_SCORE": "-1",
+        })
+        if not args.response_cache:
+            os.environ["RESPONSE_CACHE_TTL"] = "0"
+        try:
+            report = asyncio.run(run_benchmarks(args, corpora))
+        finally:
+            report_server = server.stop()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "args": vars(args),
+        },
+        **report,
+        "fake_server": report_server,
+    }
+    if baseline is not None:
+        report["compare"] = {"baseline_commit": baseline["meta"].get("commit"), **compare(baseline, report)}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Recall and latency of the local ANN engine against exact search, fully offline.
+
+Builds one local index from ``order_data.csv`` and ``health_data.csv`` scaled
+to ``--scale`` rows (the same synthetic corpora as ``bench_agents.py``, with
+``type`` and ``category`` metadata). Embeddings are derived from the texts, as
+in ``agent_core.fakes``, but with the clustered structure of real embeddings:
+each row's vector is its source row's vector plus a component shared by a
+family of variants and one of its own. The row's own component outweighs the
+family's, so a query's nearest neighbours are spread over many families and
+inverted lists rather than sitting in one tight cluster (which any ``nprobe``
+finds). Queries are perturbed copies of random rows, half of them filtered on
+the row's ``type``/``category``.
+
+Exact search (:class:`LocalVectorIndex`) gives the ground truth and baseline
+latency. Then, for each ``--quantization``, the index is trained and every
+``--nprobe`` and ``--rerank`` setting is run, reporting recall@k, p50/p95
+latency, build time and bytes scanned per vector. Like the other benchmarks the report is JSON::
+
+    python benchmarks/bench_ann.py --scale 200000 --output before.json
+    python benchmarks/bench_ann.py --scale 200000 --output after.json --compare before.json
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+
+from bench_agents import HEALTH_CSV, ORDER_CSV, _change, _git_commit, latency_summary, write_health_corpus, write_order_corpus
+
+from agent_core.ann_index import IVFVectorIndex
+from agent_core.fakes import fake_vector_array
+from agent_core.local_index import LocalVectorIndex
+from agent_core.records import iter_order_rows
+
+# Default weights of the family and per-row components relative to the source row's vector, and of query noise
+FAMILY_SPREAD = 0.7
+ROW_SPREAD = 1.0
+QUERY_NOISE = 0.25
+
+
+def read_corpus(workdir, scale):
+    """``(text, metadata, source)`` per row of the scaled order and health corpora (half each)."""
+    order_path = os.path.join(workdir, "order_data.csv")
+    health_path = os.path.join(workdir, "health_data.csv")
+    write_order_corpus(order_path, scale // 2)
+    write_health_corpus(health_path, scale - scale // 2)
+    # Synthetic rows cycle through the sample rows, so a row's source is its position modulo their count
+    order_sources = sum(1 for _ in iter_order_rows(ORDER_CSV))
+    rows = [(row["text"], row["metadata"], f"order:{i % order_sources}")
+            for i, row in enumerate(iter_order_rows(order_path))]
+    with open(HEALTH_CSV, encoding="utf-8", newline="") as f:
+        health_sources = sum(1 for fields in list(csv.reader(f))[1:] if len(fields) >= 2)
+    with open(health_path, encoding="utf-8", newline="") as f:
+        health_rows = list(csv.reader(f))[1:]
+    rows += [(content, {"category": category}, f"health:{i % health_sources}")
+             for i, (category, content) in enumerate(health_rows)]
+    return rows
+
+
+def embed_corpus(rows, dimension, families, family_spread=FAMILY_SPREAD, row_spread=ROW_SPREAD):
+    """Clustered unit vectors for ``rows``: source + family + row components (see the module docstring)."""
+    counts = {}
+    vectors = np.empty((len(rows), dimension), dtype=np.float32)
+    for i, (text, _, source) in enumerate(rows):
+        n = counts[source] = counts.get(source, -1) + 1
+        vector = (fake_vector_array(source, dimension)
+                  + family_spread * fake_vector_array(f"{source}|{n % families}", dimension)
+                  + row_spread * fake_vector_array(f"{i}|{text}", dimension))
+        vectors[i] = vector / np.linalg.norm(vector)
+    return vectors
+
+
+def make_queries(rows, vectors, count, noise_weight=QUERY_NOISE, seed=0):
+    """``(vector, filter)`` pairs near random rows; every other one filters on the row's type or category."""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for n, i in enumerate(rng.choice(len(rows), count, replace=False)):
+        noise = rng.standard_normal(vectors.shape[1]).astype(np.float32)
+        vector = vectors[i] + noise_weight * noise / np.linalg.norm(noise)
+        metadata = rows[i][1]
+        field = "type" if "type" in metadata else "category"
+        queries.append((vector, {field: metadata[field]} if n % 2 else None))
+    return queries
+
+
+def run_queries(index, queries, top_k, **kwargs):
+    latencies, results = [], []
+    for vector, filter in queries:
+        started = time.perf_counter()
+        matches = index.query(vector, top_k=top_k, filter=filter, **kwargs)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append([match[0] for match in matches])
+    return results, latencies
+
+
+def recall(results, truth, top_k):
+    return round(float(np.mean([len(set(got) & set(want)) / min(top_k, len(want) or 1)
+                                for got, want in zip(results, truth)])), 4)
+
+
+def _size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def bench(args, workdir):
+    path = os.path.join(workdir, "index")
+    started = time.perf_counter()
+    rows = read_corpus(workdir, args.scale)
+    vectors = embed_corpus(rows, args.dimension, args.families, args.family_spread, args.row_spread)
+    index = LocalVectorIndex(path, dimension=args.dimension)
+    index.upsert({"id": str(i), "values": vector, "metadata": {"text": text, **metadata}}
+                 for i, (vector, (text, metadata, _)) in enumerate(zip(vectors, rows)))
+    index.save()
+    corpus_s = time.perf_counter() - started
+    queries = make_queries(rows, vectors, args.queries, args.query_noise)
+    del vectors, index
+
+    exact = LocalVectorIndex(path, dimension=args.dimension)
+    truth, latencies = run_queries(exact, queries, args.top_k)
+    report = {
+        "corpus": {"rows": len(rows), "dimension": args.dimension, "build_s": round(corpus_s, 2),
+                   "vectors_bytes": _size(os.path.join(path, "vectors.npy"))},
+        "exact": latency_summary(latencies),
+        "ann": {},
+    }
+    del exact
+
+    for quantization in args.quantization.split(","):
+        writer = IVFVectorIndex(path, dimension=args.dimension, nlist=args.nlist, quantization=quantization,
+                                pq_subvectors=args.pq_subvectors, min_rows=0)
+        started = time.perf_counter()
+        writer.train()
+        writer.save()
+        build_s = time.perf_counter() - started
+        nlist = len(writer.centroids)
+        del writer
+
+        reader = IVFVectorIndex(path, dimension=args.dimension)
+        results = []
+        for rerank in (int(n) for n in args.rerank.split(",")):
+            for nprobe in (int(n) for n in args.nprobe.split(",")):
+                found, latencies = run_queries(reader, queries, args.top_k, nprobe=nprobe, rerank=rerank)
+                results.append({"nprobe": nprobe, "rerank": rerank,
+                                f"recall@{args.top_k}": recall(found, truth, args.top_k), **latency_summary(latencies)})
+        report["ann"][quantization] = {
+            "nlist": nlist,
+            "build_s": round(build_s, 2),
+            "code_bytes_per_vector": reader.quantizer.code_size,
+            "codes_bytes": _size(os.path.join(path, "codes.npy")),
+            "results": results,
+        }
+    return report
+
+
+def compare(baseline, report):
+    """Percent change in p50 latency and absolute change in recall per quantization, nprobe and rerank."""
+    changes = {"exact_p50_ms_pct": _change(baseline["exact"]["p50_ms"], report["exact"]["p50_ms"])}
+    for quantization, result in report["ann"].items():
+        before = {(r["nprobe"], r.get("rerank")): r
+                  for r in baseline.get("ann", {}).get(quantization, {}).get("results", [])}
+        changes[quantization] = []
+        for row in result["results"]:
+            old = before.get((row["nprobe"], row["rerank"]))
+            if old is None:
+                continue
+            recall_key = next(key for key in row if key.startswith("recall@"))
+            changes[quantization].append({
+                "nprobe": row["nprobe"],
+                "rerank": row["rerank"],
+                "p50_ms_pct": _change(old["p50_ms"], row["p50_ms"]),
+                "recall_delta": round(row[recall_key] - old.get(recall_key, 0.0), 4),
+            })
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=100000, help="Rows in the synthetic corpus")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--families", type=int, default=2000, help="Variant families per source row")
+    parser.add_argument("--family-spread", type=float, default=FAMILY_SPREAD, help="Weight of the family component")
+    parser.add_argument("--row-spread", type=float, default=ROW_SPREAD, help="Weight of each row's own component")
+    parser.add_argument("--query-noise", type=float, default=QUERY_NOISE, help="Weight of the noise added to queries")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--quantization", default="int8,pq", help="Comma-separated quantizations to build")
+    parser.add_argument("--nprobe", default="1,4,16,64", help="Comma-separated lists probed per query")
+    parser.add_argument("--nlist", type=int, default=0, help="Inverted lists (0: 4 * sqrt(rows))")
+    parser.add_argument("--rerank", default="100,400", help="Comma-separated candidates re-scored exactly")
+    parser.add_argument("--pq-subvectors", type=int, default=96)
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", help="Baseline report to compute changes against")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory(prefix="bench_ann_") as workdir:
+        report = bench(args, workdir)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "args": vars(args),
+        },
+        **report,
+    }
+    if baseline is not None:
+        report["compare"] = {"baseline_commit": baseline["meta"].get("commit"), **compare(baseline, report)}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
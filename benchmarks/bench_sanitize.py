@@ -0,0 +1,126 @@
+"""Throughput and equivalence check for agent_core.sanitize.
+
+Compares the shared sanitizer against the per-character functions it replaced
+(kept verbatim below as the reference) on a generated Unicode corpus, fails if
+any output differs, and prints rows/sec for each implementation.
+
+    python benchmarks/bench_sanitize.py --rows 200000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import unicodedata
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from agent_core.sanitize import ascii_only, sanitize, sanitize_header_value, sanitize_series
+
+
+def legacy_clean_text(text):
+    """The original ``clean_text`` from ingest_order_data.py."""
+    if not isinstance(text, str):
+        return str(text)
+    replacements = {
+        '\u2014': '--', '\u2013': '-', '\u2019': "'", '\u2018': "'", '\u201c': '"', '\u201d': '"',
+        '\u2026': '...', '\u00a0': ' ', '\u00b7': '*', '\u2022': '*', '\u2010': '-', '\u2011': '-',
+        '\u2012': '-', '\u2015': '--',
+    }
+    for old, new in replacements.items():
+        text = text.replace(old, new)
+    text = unicodedata.normalize('NFC', text)
+    text = ''.join(char for char in text if unicodedata.category(char)[0] != 'C' or char in '\t\n\r')
+    text = text.encode('ascii', errors='ignore').decode('ascii')
+    return text.strip()
+
+
+def legacy_ascii_only(text):
+    return ''.join(c for c in text if ord(c) < 128)
+
+
+def legacy_header_value(value):
+    """The original body of the patched ``_normalize_header_value``."""
+    if isinstance(value, str):
+        value = value.replace('\u2014', '--')
+        value = value.replace('\u2013', '-')
+        value = value.replace('\u2019', "'")
+        value = value.replace('\u201c', '"')
+        value = value.replace('\u201d', '"')
+        value = ''.join(c for c in value if ord(c) < 128)
+    return value
+
+
+# Building blocks for the corpus: plain ASCII, every replaced character, combining
+# marks (with and without a precomposed form), controls, format characters,
+# surrogate-free astral characters and NFD sequences that compose under NFC
+ASCII_WORDS = ["Order", "#1234", "shipped", "tracking:", "XYZ", "return", "policy", "30", "days", "item"]
+SPECIAL = [
+    "\u2014", "\u2013", "\u2019", "\u2018", "\u201c", "\u201d", "\u2026", "\u00a0", "\u00b7", "\u2022",
+    "\u2010", "\u2011", "\u2012", "\u2015", "\u0301", "\u0308", "\u0327", "e\u0301", "A\u030a", "\x00",
+    "\x07", "\x0b", "\x1f", "\x7f", "\x85", "\u200b", "\u200d", "\ufeff", "\u00e9", "\u00fc", "\u4e2d",
+    "\u6587", "\U0001f600", "\U0001f44d\U0001f3fd", "\u2028", "\t", "\n", "\r", " ", "\u3000", "\ufb01",
+    "\u212b", "A\x00\u030a", ".\u0301", "-\u0308", "\u1100\u1161",
+]
+
+
+def make_corpus(rows, seed=0):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(rows):
+        parts = []
+        for _ in range(rng.randint(4, 40)):
+            parts.append(rng.choice(SPECIAL) if rng.random() < 0.15 else rng.choice(ASCII_WORDS))
+            parts.append(rng.choice((" ", " ", "", "\u00a0")))
+        corpus.append("".join(parts))
+    # Plain ASCII rows dominate real exports; keep a share of them for the fast path
+    corpus.extend(" ".join(rng.choice(ASCII_WORDS) for _ in range(20)) for _ in range(rows // 2))
+    rng.shuffle(corpus)
+    return corpus
+
+
+def timed(fn, corpus):
+    start = time.perf_counter()
+    result = fn(corpus)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.rows, args.seed)
+    series = pd.Series(corpus + [None, 42, 3.5], dtype=object)
+
+    cases = [
+        ("clean_text", lambda c: [legacy_clean_text(t) for t in c], lambda c: [sanitize(t) for t in c]),
+        ("clean_text[series]", lambda s: s.map(legacy_clean_text), sanitize_series),
+        ("ascii_only", lambda c: [legacy_ascii_only(t) for t in c], lambda c: [ascii_only(t) for t in c]),
+        ("header_value", lambda c: [legacy_header_value(t) for t in c],
+         lambda c: [sanitize_header_value(t) for t in c]),
+    ]
+    report = {"rows": len(corpus)}
+    for name, legacy, current in cases:
+        data = series if name.endswith("[series]") else corpus
+        expected, legacy_seconds = timed(legacy, data)
+        actual, current_seconds = timed(current, data)
+        expected, actual = list(expected), list(actual)
+        mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+        if mismatches or len(expected) != len(actual):
+            i = mismatches[0] if mismatches else min(len(expected), len(actual))
+            print(f"{name}: output differs at row {i}: {data[i]!r}", file=sys.stderr)
+            sys.exit(1)
+        report[name] = {
+            "legacy_rows_per_sec": round(len(data) / legacy_seconds),
+            "rows_per_sec": round(len(data) / current_seconds),
+            "speedup": round(legacy_seconds / current_seconds, 1),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Cold-start benchmark: import time, time to first answer and server readiness.
+
+Every measurement runs in a fresh interpreter, offline, against a fake OpenAI
+server (``agent_core.fakes.FakeOpenAIServer``) and the local vector backend:
+
+* ``imports``: how long importing each entry point takes, and which heavy
+  libraries (LangChain, numpy, pandas, ...) that import pulled in;
+* ``first_query``: what an agent script does on start: import it, build its
+  domain (clients, index handles), then answer one question;
+* ``server``: from launching ``python -m agent_core.server`` until ``/health``
+  answers, then the latency of the first query sent ``--server-idle`` seconds
+  later (a container usually passes its health check before taking traffic).
+
+Each is repeated ``--runs`` times and the median reported. Like
+``bench_agents.py`` the report is JSON, so two commits can be compared::
+
+    python benchmarks/bench_startup.py --output before.json
+    python benchmarks/bench_startup.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from bench_agents import ROOT, FakeServerProcess, _change, _git_commit, write_order_corpus
+
+ORDER_SCRIPT = os.path.join(ROOT, "order_support_agent", "order_support_agent.py")
+ORDER_CONFIG = os.path.join(ROOT, "order_support_agent", "domain.json")
+
+ENTRY_POINTS = {
+    "agent_core.agents": "import agent_core.agents",
+    "agent_core.server": "import agent_core.server",
+    "agent_core.batch": "import agent_core.batch",
+    "agent_core.ingest": "import agent_core.ingest",
+    "order_support_agent.py": f"import runpy; runpy.run_path({ORDER_SCRIPT!r}, run_name='bench')",
+}
+
+HEAVY_MODULES = ("langchain_core", "langchain_openai", "langchain_pinecone", "openai", "pinecone", "numpy",
+                 "pandas", "tiktoken", "aiohttp")
+
+IMPORT_CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+QUERY_CHILD = """
+import asyncio, json, runpy, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+runpy.run_path({script!r}, run_name="bench")
+from agent_core.agents import Domain
+from agent_core.domains import DomainConfig
+imported = time.perf_counter()
+domain = Domain(DomainConfig.from_file({config!r}))
+pipeline = domain.create_pipeline()
+built = time.perf_counter()
+asyncio.run(pipeline.run(query={query!r}))
+answered = time.perf_counter()
+print(json.dumps({{"import_ms": (imported - started) * 1000, "build_ms": (built - imported) * 1000,
+                  "query_ms": (answered - built) * 1000, "total_ms": (answered - started) * 1000}}))
+"""
+
+
+def _child(code, env):
+    result = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, capture_output=True, text=True,
+                            check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _median(samples, key):
+    return round(statistics.median(sample[key] for sample in samples), 2)
+
+
+def bench_imports(env, runs):
+    report = {}
+    for name, statement in ENTRY_POINTS.items():
+        code = IMPORT_CHILD.format(root=ROOT, statement=statement, heavy=HEAVY_MODULES)
+        samples = [_child(code, env) for _ in range(runs)]
+        report[name] = {"import_ms": _median(samples, "ms"), "loaded": samples[-1]["loaded"]}
+    return report
+
+
+def bench_first_query(env, runs, query):
+    code = QUERY_CHILD.format(root=ROOT, script=ORDER_SCRIPT, config=ORDER_CONFIG, query=query)
+    samples = [_child(code, env) for _ in range(runs)]
+    return {key: _median(samples, key) for key in ("import_ms", "build_ms", "query_ms", "total_ms")}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _request(url, body=None, timeout=30):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=timeout) as response:
+        return response.status
+
+
+def bench_server(env, runs, query, idle=0.0, timeout=60):
+    samples = []
+    for _ in range(runs):
+        port = _free_port()
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "-m", "agent_core.server", "--port", str(port),
+                                    "--agents", "order"], env=env, cwd=ROOT,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            base = f"http://127.0.0.1:{port}"
+            while True:
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError("server did not become ready")
+                try:
+                    if _request(f"{base}/health", timeout=1) == 200:
+                        break
+                except (urllib.error.URLError, ConnectionError):
+                    time.sleep(0.01)
+            ready = time.perf_counter()
+            time.sleep(idle)
+            sent = time.perf_counter()
+            _request(f"{base}/agents/order/query", {"query": query})
+            answered = time.perf_counter()
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+        samples.append({"ready_ms": (ready - started) * 1000, "first_query_ms": (answered - sent) * 1000})
+    return {key: _median(samples, key) for key in ("ready_ms", "first_query_ms")}
+
+
+def compare(baseline, report):
+    """Percent change per latency (negative is faster)."""
+    changes = {"imports": {}}
+    for name, result in report["imports"].items():
+        if name in baseline.get("imports", {}):
+            changes["imports"][name] = _change(baseline["imports"][name]["import_ms"], result["import_ms"])
+    for section in ("first_query", "server"):
+        if section in baseline:
+            changes[section] = {key: _change(baseline[section][key], value)
+                                for key, value in report[section].items() if key in baseline[section]}
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import, first-query and server start-up latency.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--query", default="Where is the package with tracking XYZ?")
+    parser.add_argument("--server-idle", type=float, default=0.0,
+                        help="Seconds between the server's first healthy response and its first query")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", help="Baseline report to compute percent changes against")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    server = FakeServerProcess()
+    base_url = server.start()
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as workdir:
+        corpus = os.path.join(workdir, "order_data.csv")
+        write_order_corpus(corpus, 200)
+        env = {
+            **os.environ,
+            "OPENAI_API_KEY": "fake",
+            "OPENAI_BASE_URL": base_url,
+            "OPENAI_API_BASE": base_url,
+            "EMBEDDING_CTX_CHECK": "0",
+            "VECTOR_BACKEND": "local",
+            "LOCAL_INDEX_DIR": os.path.join(workdir, "index"),
+            "LEXICAL_INDEX_DIR": os.path.join(workdir, "lexical"),
+            "INGEST_MANIFEST_PATH": os.path.join(workdir, "manifest.json"),
+            "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embeddings.sqlite"),
+            "CORPUS_VERSION_PATH": os.path.join(workdir, "corpus_version.json"),
+            "ORDER_DATA_PATH": corpus,
+            "RESPONSE_CACHE_TTL": "0",
+            "LOG_LEVEL": "WARNING",
+        }
+        try:
+            subprocess.run([sys.executable, "-m", "agent_core.ingest", "--domain", "order"], env=env, cwd=ROOT,
+                           check=True, capture_output=True)
+            report = {
+                "imports": bench_imports(env, args.runs),
+                "first_query": bench_first_query(env, args.runs, args.query),
+                "server": bench_server(env, args.runs, args.query, args.server_idle),
+            }
+        finally:
+            server.stop()
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "args": vars(args),
+        },
+        **report,
+    }
+    if baseline is not None:
+        report["compare"] = {"baseline_commit": baseline["meta"].get("commit"), **compare(baseline, report)}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,97 +1,26 @@
-import asyncio
-import platform
-from langchain_pinecone import PineconeVectorStore
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Monkey-patch httpx to handle encoding issues in headers
-import httpx._models
-original_normalize = httpx._models._normalize_header_value
-
-def patched_normalize_header_value(value, encoding=None):
-    """Patched version that handles Unicode characters gracefully."""
-    if isinstance(value, str):
-        # Replace problematic Unicode characters
-        value = value.replace('\u2014', '--')  # em dash
-        value = value.replace('\u2013', '-')   # en dash
-        value = value.replace('\u2019', "'")   # right single quotation mark
-        value = value.replace('\u201c', '"')   # left double quotation mark
-        value = value.replace('\u201d', '"')   # right double quotation mark
-        # Remove any remaining non-ASCII characters
-        value = ''.join(c for c in value if ord(c) < 128)
-    return original_normalize(value, encoding)
-
-httpx._models._normalize_header_value = patched_normalize_header_value
-
-# Initialize components
-embeddings = OpenAIEmbeddings(api_key=os.environ["OPENAI_API_KEY"])
-vectorstore = PineconeVectorStore.from_existing_index(index_name="support-data", embedding=embeddings)
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, api_key=os.environ["OPENAI_API_KEY"])
-
-
-# Agents
-class TriageAgent:
-    def __init__(self, llm):
-        self.llm = llm
+"""Order support agent: answers order-status and return questions over the ``support-data`` index.
 
-    async def classify(self, query):
-        prompt = ChatPromptTemplate.from_template("Classify this query into 'order' or 'return': {query}")
-        chain = prompt | self.llm | StrOutputParser()
-        return await chain.ainvoke({"query": query})
-
-
-class RetrievalAgent:
-    def __init__(self, vectorstore):
-        self.vectorstore = vectorstore
-
-    async def retrieve(self, query):
-        embedded_query = await self.vectorstore._embedding.aembed_query(query)
-        # Dynamic filter based on query keywords
-        query_type = "order" if any(
-            word in query.lower() for word in ["order", "shipped", "delivered", "tracking"]) else "return"
-        results = self.vectorstore.similarity_search(query, k=5, filter={"type": query_type})
-        if not results:
-            results = self.vectorstore.similarity_search(query, k=5)  # Fallback
-        return results
-
-
-class ResponseAgent:
-    def __init__(self, llm):
-        self.llm = llm
-
-    async def generate(self, query, context):
-        context_text = "\n".join([doc.page_content for doc in context])
-        prompt = ChatPromptTemplate.from_template("Respond to: {query} using context: {context}")
-        chain = prompt | self.llm | StrOutputParser()
-        return await chain.ainvoke({"query": query, "context": context_text or "No specific data available"})
+The domain (index, triage labels and rules, filter field, prompts, CSV schema) is
+declared in ``domain.json`` next to this script; the agents themselves are the
+shared ones in ``agent_core.agents``. Run with an optional query and ``--stream``.
+"""
+import os
+import sys
 
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "domain.json")
 
-# Main function
-async def main():
-    triage_agent = TriageAgent(llm)
-    retrieval_agent = RetrievalAgent(vectorstore)
-    response_agent = ResponseAgent(llm)
 
-    # Example query (replace with user input as needed)
-    query = "Where is my order #1234?"
+def main():
+    from dotenv import load_dotenv
 
-    category = await triage_agent.classify(query)
-    context = await retrieval_agent.retrieve(query)
-    response = await response_agent.generate(query, context)
+    # Load environment variables
+    load_dotenv()
+    # Make the shared agent_core package importable when run from this folder
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from agent_core.agents import main as run
 
-    print(f"Category: {category}")
-    print(f"Context: {context}")
-    print(f"Response: {response}")
+    run(CONFIG_PATH)
 
 
-if platform.system() == "Emscripten":
-    asyncio.ensure_future(main())
-else:
-    if __name__ == "__main__":
-        asyncio.run(main())
\ No newline at end of file
+if __name__ == "__main__":
+    main()
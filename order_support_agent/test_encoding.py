@@ -12,42 +12,24 @@ os.environ.update({
     'LANG': 'C.UTF-8',
 })
 
-import openai
+import asyncio
+import json
 from dotenv import load_dotenv
 
-load_dotenv()
-
-# Monkey-patch httpx to handle encoding issues
-import httpx._models
-original_normalize = httpx._models._normalize_header_value
+# Make the shared agent_core package importable when run from this folder
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from agent_core.clients import close_clients, get_openai, pool_stats
+from agent_core.sanitize import ascii_only, install_httpx_header_patch
 
-def patched_normalize_header_value(value, encoding=None):
-    """Patched version that handles Unicode characters gracefully."""
-    if isinstance(value, str):
-        # Replace problematic Unicode characters
-        value = value.replace('\u2014', '--')  # em dash
-        value = value.replace('\u2013', '-')   # en dash
-        # Remove any remaining non-ASCII characters
-        value = ''.join(c for c in value if ord(c) < 128)
-    return original_normalize(value, encoding)
+load_dotenv()
 
-httpx._models._normalize_header_value = patched_normalize_header_value
+# Monkey-patch httpx to handle encoding issues in headers
+install_httpx_header_patch()
 
-def test_openai_encoding():
+async def test_openai_encoding():
     """Test OpenAI API with minimal ASCII text."""
-    import httpx
-    
-    # Create a custom HTTP client with ASCII-safe headers
-    http_client = httpx.Client(
-        headers={
-            "User-Agent": "python-openai/1.0.0"  # Simple ASCII user agent
-        }
-    )
-    
-    client = openai.OpenAI(
-        api_key=os.environ["OPENAI_API_KEY"],
-        http_client=http_client
-    )
+    # Shared async client with ASCII-safe headers (the same pool the agents and ingesters use)
+    client = get_openai()
     
     # Test with absolutely minimal ASCII text
     test_texts = [
@@ -62,11 +44,11 @@ def test_openai_encoding():
             print(f"Testing text {i+1}: '{text}'")
             
             # Ensure absolutely ASCII-only
-            ascii_text = ''.join(c for c in text if ord(c) < 128)
+            ascii_text = ascii_only(text)
             print(f"ASCII-only version: '{ascii_text}'")
             
             # Test embedding creation
-            response = client.embeddings.create(
+            response = await client.embeddings.create(
                 input=ascii_text,
                 model="text-embedding-ada-002"
             )
@@ -78,6 +60,15 @@ def test_openai_encoding():
             print(f"✗ Failed for text {i+1}: {e}")
             import traceback
             traceback.print_exc()
+    
+    # All requests should have reused one pooled connection
+    print(f"HTTP pool: {json.dumps(pool_stats())}")
+
+async def main():
+    try:
+        await test_openai_encoding()
+    finally:
+        await close_clients()
 
 if __name__ == "__main__":
-    test_openai_encoding()
+    asyncio.run(main())
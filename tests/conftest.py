@@ -0,0 +1,5 @@
+"""Make the shared ``agent_core`` package importable when pytest runs from the repository root."""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
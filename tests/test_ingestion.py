@@ -0,0 +1,49 @@
+"""Retry behaviour of :class:`agent_core.ingestion.BatchIngestor`."""
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from agent_core.ingestion import BatchIngestor, IngestStats, is_retryable
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+
+
+@pytest.mark.parametrize("error", [
+    openai.APIConnectionError(request=REQUEST),
+    openai.APITimeoutError(request=REQUEST),
+    httpx.ReadTimeout("read timed out", request=REQUEST),
+    httpx.ConnectError("connection refused", request=REQUEST),
+])
+def test_transport_errors_are_retried(error):
+    assert is_retryable(error)
+    calls = []
+
+    async def flaky(payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            raise error
+        return payload
+
+    ingestor = BatchIngestor(flaky, flaky, base_delay=0.0)
+    stats = IngestStats()
+    assert asyncio.run(ingestor._call("embed", flaky, ["text"], stats)) == ["text"]
+    assert len(calls) == 2
+    assert stats.retries == 1
+
+
+def test_client_errors_are_not_retried():
+    response = httpx.Response(400, request=REQUEST)
+    error = openai.BadRequestError("bad request", response=response, body=None)
+    assert not is_retryable(error)
+    calls = []
+
+    async def failing(payload):
+        calls.append(payload)
+        raise error
+
+    ingestor = BatchIngestor(failing, failing, base_delay=0.0)
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(ingestor._call("upsert", failing, [], IngestStats()))
+    assert len(calls) == 1
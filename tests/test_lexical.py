@@ -0,0 +1,55 @@
+"""BM25 index (:class:`agent_core.lexical.LexicalIndex`): search and reloads under concurrent searches."""
+import os
+import threading
+
+from agent_core.lexical import LexicalIndex
+
+
+def records(version, count=200):
+    return [{"id": f"v{version}-{i}", "text": f"Order #{1000 + i} shipped, tracking XYZ{i} version {version}",
+             "metadata": {"type": "order"}} for i in range(count)]
+
+
+def test_exact_and_search(tmp_path):
+    index = LexicalIndex(str(tmp_path / "index.json"))
+    index.upsert(records(0, 10))
+    assert [hit[0] for hit in index.exact(["xyz3"])] == ["v0-3"]
+    assert index.search("tracking XYZ7", top_k=1)[0][0] == "v0-7"
+    assert index.search("shipped", filter={"type": "return"}) == []
+    index.delete(["v0-3"])
+    assert index.exact(["xyz3"]) == []
+    assert len(index) == 9
+
+
+def test_searches_during_reloads_never_mix_versions(tmp_path):
+    path = str(tmp_path / "index.json")
+    writer = LexicalIndex(path)
+    reader = LexicalIndex(path)
+    errors = []
+    stop = threading.Event()
+
+    def search():
+        while not stop.is_set():
+            try:
+                for doc_id, *_ in reader.search("order shipped tracking", top_k=50):
+                    assert doc_id.startswith("v")
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=search) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    try:
+        for version in range(1, 30):
+            writer.clear()
+            writer.upsert(records(version))
+            writer.save()
+            # Distinct modification times, so every save is picked up
+            os.utime(path, ns=(version * 10**9, version * 10**9))
+            reader.refresh()
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert errors == []
+    assert reader.exact(["xyz5"])[0][0] == "v29-5"
@@ -0,0 +1,73 @@
+"""Optional steps of :class:`agent_core.pipeline.Pipeline` and the batch runner's retries through them."""
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from agent_core.batch import BatchRunner
+from agent_core.ingestion import is_retryable
+from agent_core.pipeline import Pipeline, Step
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def rate_limit_error():
+    response = httpx.Response(429, request=REQUEST)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def triage_pipeline(triage, reraise=None):
+    async def respond(run):
+        return f"label={run.results['triage']}"
+
+    return Pipeline([
+        Step("triage", triage, optional=True, default="unknown"),
+        Step("respond", respond, after=["triage"]),
+    ], reraise=reraise)
+
+
+def test_optional_step_failure_resolves_to_default():
+    async def triage(run):
+        raise rate_limit_error()
+
+    run = asyncio.run(triage_pipeline(triage).run(query="q"))
+    assert run.results["respond"] == "label=unknown"
+    assert run.timings["triage"]["status"] == "error"
+
+
+def test_reraise_fails_the_run_from_an_optional_step():
+    async def triage(run):
+        raise rate_limit_error()
+
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(triage_pipeline(triage, reraise=is_retryable).run(query="q"))
+
+
+def test_reraise_keeps_the_default_for_timeouts_and_other_errors():
+    async def slow(run):
+        await asyncio.sleep(1)
+
+    async def broken(run):
+        raise ValueError("unparseable")
+
+    pipeline = Pipeline([Step("triage", slow, timeout=0.01, optional=True, default="unknown")], reraise=is_retryable)
+    assert asyncio.run(pipeline.run(query="q")).results["triage"] == "unknown"
+    pipeline = Pipeline([Step("triage", broken, optional=True, default="unknown")], reraise=is_retryable)
+    assert asyncio.run(pipeline.run(query="q")).results["triage"] == "unknown"
+
+
+def test_batch_runner_retries_rate_limited_triage():
+    calls = []
+
+    async def triage(run):
+        calls.append(run.inputs["query"])
+        if len(calls) == 1:
+            raise rate_limit_error()
+        return "shipping"
+
+    runner = BatchRunner(triage_pipeline(triage, reraise=is_retryable), "order", concurrency=4, base_delay=0.0)
+    run = asyncio.run(runner._answer("where is my order?"))
+    assert run.results["respond"] == "label=shipping"
+    assert runner.stats["retries"] == 1
+    assert runner.limiter.limit == 2
@@ -0,0 +1,28 @@
+"""Partitioning of :class:`agent_core.response_cache.ResponseCache`."""
+import asyncio
+
+from agent_core.response_cache import ResponseCache, identifier_key
+
+
+async def same_vector(query):
+    # Near-identical questions embed (almost) identically; model the worst case
+    return [1.0, 0.0, 0.0]
+
+
+def test_identifier_key():
+    assert identifier_key("Where is tracking XYZ123?") == "xyz123"
+    assert identifier_key("order #1234 with tracking ABC987") == identifier_key("ABC987 for #1234")
+    assert identifier_key("how do I return an item?") is None
+
+
+def test_queries_differing_only_in_a_tracking_code_do_not_share_a_hit():
+    cache = ResponseCache(same_vector, threshold=0.95, partition_fn=identifier_key)
+
+    async def scenario():
+        await cache.store("where is tracking XYZ123", {"response": "XYZ123 is in transit"})
+        return (await cache.lookup("where is tracking ABC987"),
+                await cache.lookup("Where is tracking XYZ123?"))
+
+    other, same = asyncio.run(scenario())
+    assert other is None
+    assert same is not None and same[0] == {"response": "XYZ123 is in transit"}
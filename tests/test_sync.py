@@ -0,0 +1,58 @@
+"""Incremental sync (:func:`agent_core.sync.incremental_sync`) against an in-memory index."""
+import asyncio
+
+import pytest
+
+from agent_core import sync
+from agent_core.sync import IngestManifest, content_hash, incremental_sync
+
+
+@pytest.fixture(autouse=True)
+def corpus_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(sync, "CORPUS_VERSION_PATH", str(tmp_path / "versions.json"))
+
+
+class SlowFirstIndex:
+    """Dict-backed index whose first upsert finishes after the later ones, as concurrent batches can."""
+
+    def __init__(self):
+        self.vectors = {}
+        self.upserts = 0
+
+    async def embed(self, texts):
+        return [[float(len(text))] for text in texts]
+
+    async def upsert(self, vectors):
+        self.upserts += 1
+        if self.upserts == 1:
+            await asyncio.sleep(0.05)
+        for vector in vectors:
+            self.vectors[vector["id"]] = vector["metadata"]["text"]
+
+    async def delete(self, ids):
+        for vector_id in ids:
+            self.vectors.pop(vector_id, None)
+
+
+def sync_rows(rows, manifest, index):
+    records = [{"id": vector_id, "text": text, "metadata": {}} for vector_id, text in rows]
+    return asyncio.run(incremental_sync(records, manifest, index.embed, index.upsert, index.delete,
+                                        embed_batch_size=1, upsert_batch_size=1, upsert_concurrency=4))
+
+
+def test_repeated_id_keeps_its_last_row(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"), "test")
+    index = SlowFirstIndex()
+    summary = sync_rows([("1", "first"), ("2", "other"), ("1", "last")], manifest, index)
+    assert index.vectors == {"1": "last", "2": "other"}
+    assert manifest.entries["1"] == content_hash("last")
+    assert summary["failed"] == 0
+
+
+def test_repeated_id_matching_the_manifest_still_wins(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"), "test")
+    index = SlowFirstIndex()
+    sync_rows([("1", "last")], manifest, index)
+    sync_rows([("1", "first"), ("1", "last")], manifest, index)
+    assert index.vectors == {"1": "last"}
+    assert manifest.entries["1"] == content_hash("last")